@@ -0,0 +1,261 @@
+"""
+Benchmarks for the connector and client hot paths against FakeTimsServer.
+
+    python benchmarks/bench_client.py --output results.json
+    python benchmarks/bench_client.py --quick --compare results.json
+
+The stand-in server runs in a child process so that its work shows up
+neither in the client's GIL time nor in the measured peak memory.
+Results are written as JSON; --compare prints the change of every
+metric against a previous result file.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tcpwave_client import Connector  # noqa: E402
+from tcpwave_client import ConnectorPool  # noqa: E402
+from tcpwave_client import TimsClient  # noqa: E402
+from tcpwave_client import payloads  # noqa: E402
+from tcpwave_client.fake_server import FakeTimsServer  # noqa: E402
+
+ORG = 'Bench'
+NETWORK = '10.0.0.0/8'
+ALLOC_SUBNET = '10.255.0.0/16'
+
+
+def _serve(pipe, server_args):
+    with FakeTimsServer(**server_args) as server:
+        server.state.add_network(ORG, NETWORK)
+        server.state.add_subnet(ORG, ALLOC_SUBNET, router_address='10.255.0.1')
+        pipe.send(server.provider)
+        while True:
+            command, args = pipe.recv()
+            if command == 'stop':
+                return
+            if command == 'seed':
+                pipe.send(len(server.state.seed_subnets(ORG, *args)))
+            elif command == 'counts':
+                pipe.send(dict(('%s %s' % key, count) for key, count in server.request_counts.items()))
+
+
+class ServerProcess(object):
+    """
+    FakeTimsServer running in a child process
+    """
+    def __init__(self, **server_args):
+        self._pipe, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve, args=(child, server_args), daemon=True)
+        self._process.start()
+        self.provider = self._pipe.recv()
+
+    def seed(self, network_address, prefixlen, count):
+        self._pipe.send(('seed', (network_address, prefixlen, count)))
+        return self._pipe.recv()
+
+    def close(self):
+        self._pipe.send(('stop', None))
+        self._process.join(5)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+
+    def pick(q):
+        return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+    return {
+        'count': len(samples),
+        'mean': statistics.mean(samples),
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': samples[-1]
+    }
+
+
+def timed_calls(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_latency(provider, pool, iterations):
+    """
+    Single-call latency of a pooled client against a Connector built per call
+    """
+    client = TimsClient.from_provider(provider, pool=pool)
+    detail = {'organization_name': ORG, 'network_address': NETWORK}
+    client.get_network_detail(detail)
+    payload = payloads.network_details_by_ip(detail)
+
+    def fresh_connector():
+        conn = Connector(cert=provider['cert'], key=provider['key'], verify=provider['verify'],
+                         host=provider['host'], port=provider['port'])
+        try:
+            conn.get_object(payload=payload)
+        finally:
+            conn.close()
+
+    return {
+        'pooled_connector': timed_calls(lambda: client.get_network_detail(detail), iterations),
+        'connector_per_call': timed_calls(fresh_connector, max(1, iterations // 4))
+    }
+
+
+def bench_throughput(provider, pool, concurrency_levels, duration):
+    """
+    Sustained detail lookups per second with n threads sharing one client
+    """
+    client = TimsClient.from_provider(provider, pool=pool)
+    detail = {'organization_name': ORG, 'subnet_address': ALLOC_SUBNET}
+    res = {}
+    for concurrency in concurrency_levels:
+        counts = [0] * concurrency
+        stop_at = time.perf_counter() + duration
+
+        def work(n):
+            while time.perf_counter() < stop_at:
+                client.get_subnet_detail(detail)
+                counts[n] += 1
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        res[str(concurrency)] = {'ops': sum(counts), 'elapsed': elapsed, 'ops_per_sec': sum(counts) / elapsed}
+    return res
+
+
+def bench_listing(server, pool, record_counts, page_size, concurrency):
+    """
+    list_all_subnets and iter_subnets against the number of records, with peak memory
+    """
+    client = TimsClient.from_provider(server.provider, pool=pool, page_size=page_size, page_concurrency=concurrency)
+    res = {}
+    for i, count in enumerate(record_counts):
+        network = '100.%d.0.0/14' % (64 + 4 * i)
+        server.seed(network, 30, count)
+        query = {'organization_name': ORG, 'network_address': network}
+        row = {}
+        for name, run in (('list_all_subnets', lambda: client.list_all_subnets(query)),
+                          ('iter_subnets', lambda: sum(1 for _ in client.iter_subnets(query)))):
+            tracemalloc.start()
+            start = time.perf_counter()
+            records = run()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            fetched = records if isinstance(records, int) else len(records)
+            assert fetched == count, (name, fetched, count)
+            del records
+            row[name] = {'elapsed': elapsed, 'records_per_sec': count / elapsed, 'peak_memory_bytes': peak}
+        res[str(count)] = row
+    return res
+
+
+def bench_allocation(provider, pool, allocations, concurrency):
+    """
+    IP allocation rate through IPAllocator and create_ips
+    """
+    client = TimsClient.from_provider(provider, pool=pool, bulk_concurrency=concurrency)
+    allocator = client.ip_allocator(ALLOC_SUBNET, ORG)
+    start = time.perf_counter()
+    addresses = [allocator.allocate(name='bench-%d' % i, domain_name='bench.local')[0] for i in range(allocations)]
+    allocator_elapsed = time.perf_counter() - start
+    client.release_ips(addresses, ORG)
+
+    ip_objs = [{'organization_name': ORG, 'subnet_address': ALLOC_SUBNET, 'ip_address': '10.255.1.%d' % (i % 250 + 2),
+                'name': 'bulk-%d' % i, 'domain_name': 'bench.local'} for i in range(min(allocations, 250))]
+    result = client.create_ips(ip_objs)
+    client.release_ips([ip_obj['ip_address'] for ip_obj in ip_objs], ORG)
+    return {
+        'ip_allocator': {'allocations': allocations, 'elapsed': allocator_elapsed,
+                         'ops_per_sec': allocations / allocator_elapsed},
+        'create_ips': {'items': result.total, 'failed': result.failed, 'elapsed': result.elapsed,
+                       'ops_per_sec': result.ops_per_sec, 'mean_latency': result.mean_latency}
+    }
+
+
+def flatten(results, prefix=''):
+    for key, value in results.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            for item in flatten(value, name + '.'):
+                yield item
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(baseline, current):
+    """
+    Print every metric present in both results with its relative change
+    """
+    old = dict(flatten(baseline['results']))
+    for name, value in flatten(current['results']):
+        if name in old and old[name]:
+            print("%-70s %14.6g %14.6g %+8.1f%%" % (name, old[name], value, 100.0 * (value - old[name]) / old[name]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', default='benchmark-results.json', help='file the JSON results are written to')
+    parser.add_argument('--compare', help='previous results file to compare with')
+    parser.add_argument('--quick', action='store_true', help='small iteration counts for a smoke run')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of latency added by the server')
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--page-concurrency', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    iterations = 50 if args.quick else 500
+    duration = 0.5 if args.quick else 3.0
+    concurrency_levels = [1, 4] if args.quick else [1, 2, 4, 8, 16]
+    record_counts = [100, 500] if args.quick else [100, 1000, 5000, 20000]
+    allocations = 20 if args.quick else 200
+
+    server = ServerProcess(latency=args.latency)
+    try:
+        with ConnectorPool(pool_maxsize=max(concurrency_levels + [args.page_concurrency])) as pool:
+            results = {
+                'latency': bench_latency(server.provider, pool, iterations),
+                'throughput': bench_throughput(server.provider, pool, concurrency_levels, duration),
+                'listing': bench_listing(server, pool, record_counts, args.page_size, args.page_concurrency),
+                'allocation': bench_allocation(server.provider, pool, allocations, max(concurrency_levels))
+            }
+    finally:
+        server.close()
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args)
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print("results written to %s" % args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -35,7 +35,16 @@ setup(
     ],
     package_dir={'tcpwave-client': 'tcpwave_client'},
     include_package_data=True,
+    python_requires='>=3.7',
     install_requires=requirements,
+    extras_require={
+        'async': ['aiohttp>=3.6'],
+        'orjson': ['orjson>=3'],
+        'ujson': ['ujson'],
+        'numpy': ['numpy>=1.23; python_version>="3.8"'],
+        'fast': ['orjson>=3', 'numpy>=1.23; python_version>="3.8"'],
+        'all': ['aiohttp>=3.6', 'orjson>=3', 'numpy>=1.23; python_version>="3.8"'],
+    },
     zip_safe=False,
     keywords=['tcpwave-client', 'ipam-client', 'tcpwave'],
     classifiers=[
@@ -46,8 +55,6 @@ setup(
         # "Programming Language :: Python :: 2",
         # 'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
     ],
@@ -1,5 +1,27 @@
 from tcpwave_client.exceptions import IPAMException
 from tcpwave_client.exceptions import APICallFailedException
 from tcpwave_client.exceptions import UnsupportedMethodException
+from tcpwave_client.exceptions import CircuitOpenException
+from tcpwave_client.exceptions import DeadlineExceededException
+from tcpwave_client.deadlines import deadline
+from tcpwave_client.retry import RetryPolicy
+from tcpwave_client.throttle import RateLimiter
+from tcpwave_client.throttle import AdaptiveConcurrency
+from tcpwave_client.breaker import CircuitBreaker
+from tcpwave_client.singleflight import SingleFlight
+from tcpwave_client.hooks import RequestHook
+from tcpwave_client.hooks import HistogramCollector
 from tcpwave_client.connector import Connector
+from tcpwave_client.pool import ConnectorPool
+from tcpwave_client.cache import TTLCache
+from tcpwave_client.prefix_index import PrefixIndex
+from tcpwave_client.freespace import FreeSpace
+from tcpwave_client.allocator import IPAllocator
+from tcpwave_client.allocator import SubnetAllocator
+from tcpwave_client.mirror import InventoryMirror
+from tcpwave_client.reconcile import Reconciler
+from tcpwave_client.client import TimsClient
 from tcpwave_client.networks import NetworkManager
+from tcpwave_client.async_connector import AsyncConnector
+from tcpwave_client.async_client import AsyncTimsClient
+from tcpwave_client.async_networks import AsyncNetworkManager
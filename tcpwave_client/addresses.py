@@ -0,0 +1,175 @@
+import ipaddress
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from tcpwave_client.exceptions import IPAMException
+
+# numpy.loadtxt got its C parser in 1.23, older versions are slower than the integer path
+if numpy is not None and tuple(int(part) for part in re.findall(r'\d+', numpy.__version__)[:2]) < (1, 23):
+    numpy = None
+
+# dotted quad without leading zeros and an optional prefix length, anything else goes through ipaddress
+_IPV4 = re.compile(r'((0|[1-9]\d{0,2})\.(0|[1-9]\d{0,2})\.(0|[1-9]\d{0,2})\.(0|[1-9]\d{0,2}))(?:/(\d{1,2}))?\Z',
+                   re.ASCII)
+_SHIFTS = (24, 16, 8, 0)
+# below this many rows the array setup costs more than it saves
+NUMPY_MIN_ROWS = 64
+
+
+class Prefixes(object):
+    """
+    A batch of normalized prefixes, one entry per input row. Rows that are
+    not valid addresses or prefixes are None in every column and have
+    their ValueError in errors, so a whole import can be checked at once.
+    """
+    def __init__(self, total):
+        self.versions = [None] * total
+        self.networks = [None] * total
+        self.prefixlens = [None] * total
+        self.addresses = [None] * total
+        self.octets = [None] * total
+        self.errors = {}
+
+    def __len__(self):
+        return len(self.versions)
+
+    def __repr__(self):
+        return "Prefixes(total=%d, invalid=%d)" % (len(self), len(self.errors))
+
+    def fields(self, i):
+        """
+        Payload fields of one row
+        :param i: row
+        :return: (network address, tuple of the four octets as strings or None for IPv6, prefix length)
+        """
+        if i in self.errors:
+            raise self.errors[i]
+        return self.addresses[i], self.octets[i], self.prefixlens[i]
+
+    def prefix(self, i):
+        """
+        Normalized 'address/length' of one row
+        :param i: row
+        :return:
+        """
+        address, _, prefixlen = self.fields(i)
+        return "%s/%d" % (address, prefixlen)
+
+    def check(self):
+        """
+        Raise one IPAMException listing every invalid row
+        :return:
+        """
+        if self.errors:
+            rows = sorted(self.errors)
+            raise IPAMException("%d invalid rows: %s" % (
+                len(rows), "; ".join("row %d: %s" % (i, self.errors[i]) for i in rows)))
+        return self
+
+
+def _parse_one(res, i, value, strict):
+    try:
+        network = ipaddress.ip_network(value, strict=strict)
+    except (ValueError, TypeError) as ex:
+        res.errors[i] = ex if isinstance(ex, ValueError) else ValueError("%r is not an address" % (value,))
+        return
+    address = str(network.network_address)
+    res.versions[i] = network.version
+    res.networks[i] = int(network.network_address)
+    res.prefixlens[i] = network.prefixlen
+    res.addresses[i] = address
+    res.octets[i] = tuple(address.split('.')) if network.version == 4 else None
+
+
+def _set_ipv4(res, i, network, prefixlen, groups, address=None):
+    # without host bits the network address is the input text, only masked rows are formatted
+    res.versions[i] = 4
+    res.networks[i] = network
+    res.prefixlens[i] = prefixlen
+    if address is None:
+        res.addresses[i] = groups[0]
+        res.octets[i] = groups[1:5]
+    else:
+        res.addresses[i] = address
+        res.octets[i] = tuple(address.split('.'))
+
+
+def _normalize_ints(res, rows, parts, values, strict):
+    for i, groups in zip(rows, parts):
+        octets = [int(part) for part in groups[1:5]]
+        prefixlen = int(groups[5])
+        if prefixlen > 32 or max(octets) > 255:
+            _parse_one(res, i, values[i], strict)
+            continue
+        value = octets[0] << 24 | octets[1] << 16 | octets[2] << 8 | octets[3]
+        network = value & (0xFFFFFFFF << (32 - prefixlen)) & 0xFFFFFFFF
+        if network == value:
+            _set_ipv4(res, i, network, prefixlen, groups)
+        elif strict:
+            _parse_one(res, i, values[i], strict)
+        else:
+            _set_ipv4(res, i, network, prefixlen, groups,
+                      '%d.%d.%d.%d' % tuple(network >> shift & 255 for shift in _SHIFTS))
+
+
+def _normalize_arrays(res, rows, parts, values, strict):
+    # one C level parse of all rows as 'a.b.c.d.len', the regex already checked the syntax
+    table = numpy.loadtxt(['.'.join(groups[1:6]) for groups in parts], dtype=numpy.int64, delimiter='.', ndmin=2)
+    octets, prefixlens = table[:, :4], table[:, 4]
+    invalid = (octets > 255).any(axis=1) | (prefixlens > 32)
+    value = octets[:, 0] << 24 | octets[:, 1] << 16 | octets[:, 2] << 8 | octets[:, 3]
+    network = value & (0xFFFFFFFF << (32 - numpy.minimum(prefixlens, 32))) & 0xFFFFFFFF
+    masked = network != value
+    if strict:
+        invalid |= masked
+    masked_rows = numpy.flatnonzero(masked & ~invalid)
+    network_octets = (network[masked_rows, None] >> numpy.array(_SHIFTS)) & 255
+    formatted = dict(zip(masked_rows.tolist(), ['%d.%d.%d.%d' % tuple(row) for row in network_octets.tolist()]))
+    for row, (i, groups, bad, net, prefixlen) in enumerate(zip(rows, parts, invalid.tolist(), network.tolist(),
+                                                               prefixlens.tolist())):
+        if bad:
+            _parse_one(res, i, values[i], strict)
+        else:
+            _set_ipv4(res, i, net, prefixlen, groups, formatted.get(row))
+
+
+def normalize_prefixes(values, strict=False):
+    """
+    Parse and validate many addresses or prefixes at once, like
+    ipaddress.ip_network on each of them. Plain IPv4 rows are handled with
+    integer arithmetic, on NumPy arrays when it is installed; IPv6 and other
+    notations (e.g. netmasks) fall back to ipaddress row by row.
+    :param values: iterable of 'a.b.c.d', 'a.b.c.d/len', IPv6 strings or ipaddress objects
+    :param strict: reject prefixes with host bits set
+    :return: Prefixes
+    """
+    values = list(values)
+    res = Prefixes(len(values))
+    rows = []
+    parts = []
+    for i, value in enumerate(values):
+        match = _IPV4.match(value) if isinstance(value, str) else None
+        if match is None:
+            _parse_one(res, i, value, strict)
+            continue
+        rows.append(i)
+        parts.append(match.groups('32'))
+    if numpy is not None and len(rows) >= NUMPY_MIN_ROWS:
+        _normalize_arrays(res, rows, parts, values, strict)
+    elif rows:
+        _normalize_ints(res, rows, parts, values, strict)
+    return res
+
+
+def normalize_prefix(value, strict=False):
+    """
+    Payload fields of a single address or prefix
+    :param value:
+    :param strict: reject prefixes with host bits set
+    :return: (network address, octets or None for IPv6, prefix length)
+    """
+    return normalize_prefixes([value], strict=strict).fields(0)
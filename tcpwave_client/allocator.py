@@ -0,0 +1,337 @@
+import collections
+import ipaddress
+import threading
+import time
+
+from tcpwave_client.bulk import BulkResult
+from tcpwave_client.bulk import run_bulk
+from tcpwave_client.deadlines import deadline
+from tcpwave_client.exceptions import IPAMException
+from tcpwave_client.freespace import FreeSpace
+from tcpwave_client.operations import rejected
+
+
+class IPAllocator(object):
+    """
+    Hands out addresses of one subnet from a local pool of candidates.
+    The pool is seeded with the address returned by /object/getNextFreeIP
+    and the addresses following it, so most allocations cost a single
+    /object/add call. The following addresses are only guesses: in a
+    fragmented subnet they may be in use, so the first rejected guess drops
+    the rest of the guessed run and the server is asked again. Every address
+    is claimed with create_ip before it is returned; when the claim is
+    rejected (e.g. another client took the address) the next candidate is
+    tried. Addresses whose claim fails for other reasons go back to the pool.
+    The pool is refilled in the background once it drops to low_water
+    candidates; a failed background refill is raised by the next allocation
+    that finds the pool empty.
+    """
+    def __init__(self, client, subnet_address, organization_name, batch_size=16, low_water=4, max_attempts=5,
+                 background=True):
+        """
+        :param client: TimsClient
+        :param subnet_address: subnet to allocate from
+        :param organization_name:
+        :param batch_size: number of candidates fetched per refill
+        :param low_water: refill when this many candidates are left
+        :param max_attempts: number of addresses returned by the server tried per allocation, rejected
+                             guesses are not counted but are limited to as many guessed runs
+        :param background: refill in a background thread instead of on the caller's thread
+        """
+        self.client = client
+        self.subnet = ipaddress.ip_network(subnet_address, strict=False)
+        self.organization_name = organization_name
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.max_attempts = max_attempts
+        self.background = background
+        self.allocated = 0
+        self.conflicts = 0
+        self.refills = 0
+        self._candidates = collections.deque()
+        self._guessed = set()
+        self._pending = set()
+        self._used = set()
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._refilling = False
+        self._refill_error = None
+        if self.subnet.num_addresses > 2:
+            self._first_host = self.subnet.network_address + 1
+            self._last_host = self.subnet.broadcast_address - 1
+        else:
+            self._first_host = self.subnet.network_address
+            self._last_host = self.subnet.broadcast_address
+
+    def __len__(self):
+        return len(self._candidates)
+
+    def _next_free(self):
+        rsp = self.client.get_next_available_ip(subnet_address=str(self.subnet),
+                                                organization_name=self.organization_name)
+        return ipaddress.ip_address(rsp.strip().strip('"'))
+
+    def refill(self):
+        """
+        Fetch fresh candidates from the server unless the pool is already above low_water.
+        Only the address returned by the server is known to be free, the ones after it are guesses.
+        :return: number of candidates added, None when the pool was above low_water
+        """
+        with self._refill_lock:
+            if len(self._candidates) > self.low_water:
+                return None
+            free = self._next_free()
+            address = max(free, self._first_host)
+            with self._lock:
+                self.refills += 1
+                known = self._pending | self._used | set(self._candidates)
+                added = 0
+                while added < self.batch_size and address <= self._last_host:
+                    if address not in known:
+                        self._candidates.append(address)
+                        if address != free:
+                            self._guessed.add(address)
+                        added += 1
+                    address += 1
+            return added
+
+    def _drop_guesses(self):
+        # called with self._lock held
+        self._candidates = collections.deque(a for a in self._candidates if a not in self._guessed)
+        self._guessed.clear()
+
+    def _refill_in_background(self):
+        with self._lock:
+            if self._refilling:
+                return
+            self._refilling = True
+
+        def run():
+            try:
+                self.refill()
+            except Exception as ex:
+                with self._lock:
+                    self._refill_error = ex
+            finally:
+                with self._lock:
+                    self._refilling = False
+
+        thread = threading.Thread(target=run, name="ip-allocator-refill")
+        thread.daemon = True
+        thread.start()
+
+    def _take(self):
+        while True:
+            with self._lock:
+                if self._candidates:
+                    address = self._candidates.popleft()
+                    guessed = address in self._guessed
+                    self._guessed.discard(address)
+                    self._pending.add(address)
+                    low = len(self._candidates) <= self.low_water
+                    break
+                error, self._refill_error = self._refill_error, None
+            if error is not None:
+                raise error
+            if self.refill() == 0:
+                raise IPAMException("No free address left in subnet %s" % self.subnet)
+        if low:
+            if self.background:
+                self._refill_in_background()
+            else:
+                self.refill()
+        return address, guessed
+
+    def allocate(self, ip_obj=None, **fields):
+        """
+        Take the next free address and create the ip object for it.
+        :param ip_obj: fields passed to create_ip, ip_address and subnet_address are filled in
+        :return: (ip address, create_ip response)
+        """
+        obj = dict(ip_obj or {}, **fields)
+        obj['subnet_address'] = str(self.subnet)
+        obj.setdefault('organization_name', self.organization_name)
+        last_error = None
+        attempts = guesses = 0
+        while attempts < self.max_attempts and guesses <= self.max_attempts:
+            address, guessed = self._take()
+            obj['ip_address'] = str(address)
+            try:
+                rsp = self.client.create_ip(obj)
+            except Exception as ex:
+                with self._lock:
+                    self._pending.discard(address)
+                    if not rejected(ex):
+                        self._candidates.appendleft(address)
+                        if guessed:
+                            self._guessed.add(address)
+                        raise
+                    self._used.add(address)
+                    self.conflicts += 1
+                    if guessed:
+                        self._drop_guesses()
+                if guessed:
+                    guesses += 1
+                else:
+                    attempts += 1
+                last_error = ex
+                continue
+            with self._lock:
+                self._pending.discard(address)
+                self._used.add(address)
+                self.allocated += 1
+            return str(address), rsp
+        raise last_error
+
+    def release(self, address):
+        """
+        Release an address handed out by this allocator.
+        :param address:
+        :return:
+        """
+        rsp = self.client.release_ip(ip_address=str(address), organization_name=self.organization_name)
+        with self._lock:
+            self._used.discard(ipaddress.ip_address(address))
+        return rsp
+
+
+class SubnetAllocator(object):
+    """
+    Carves new subnets out of one network. The subnets of the network are
+    listed once into a FreeSpace map, free prefixes of the requested length
+    are found locally (first fit, or best fit to keep large blocks whole) and
+    claimed with create_subnet. When the claim is rejected (e.g. another
+    client created an overlapping subnet meanwhile) the block stays marked as
+    used and the next free block is tried. Blocks whose create fails for
+    other reasons are returned to the map.
+    """
+    def __init__(self, client, network_address, organization_name, best_fit=False, max_attempts=5):
+        """
+        :param client: TimsClient
+        :param network_address: network to carve subnets from
+        :param organization_name:
+        :param best_fit: take blocks from the smallest free block that holds them instead of the lowest one
+        :param max_attempts: number of blocks tried per subnet
+        """
+        self.client = client
+        self.network = ipaddress.ip_network(network_address, strict=False)
+        self.organization_name = organization_name
+        self.best_fit = best_fit
+        self.max_attempts = max_attempts
+        self.allocated = 0
+        self.conflicts = 0
+        self.listings = 0
+        self.free = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        List the subnets of the network and rebuild the free-block map.
+        Blocks being claimed right now are listed once their create succeeded.
+        :return:
+        """
+        records = self.client.list_all_subnets(organization_name=self.organization_name,
+                                               network_address=str(self.network))
+        free = FreeSpace.from_records(self.network, records)
+        with self._lock:
+            self.free = free
+            self.listings += 1
+
+    def _take(self, prefixlen):
+        if self.free is None:
+            self.refresh()
+        with self._lock:
+            block = self.free.take(prefixlen, self.best_fit)
+        if block is None:
+            raise IPAMException("No free /%s left in network %s" % (prefixlen, self.network))
+        return block
+
+    def _release(self, block):
+        with self._lock:
+            self.free.release(block)
+
+    def _subnet_obj(self, block, subnet_obj):
+        obj = dict(subnet_obj)
+        obj['network_address'] = str(block)
+        obj.setdefault('organization_name', self.organization_name)
+        obj.setdefault('name', str(block))
+        obj.setdefault('router_address', str(block.network_address + 1 if block.num_addresses > 2
+                                             else block.network_address))
+        return obj
+
+    def allocate(self, prefixlen, subnet_obj=None, **fields):
+        """
+        Take the next free prefix of the given length and create the subnet for it.
+        :param prefixlen: prefix length of the new subnet
+        :param subnet_obj: fields passed to create_subnet, network_address is filled in and
+                           name and router_address default to the prefix and its first host
+        :return: (subnet prefix, create_subnet response)
+        """
+        obj = dict(subnet_obj or {}, **fields)
+        last_error = None
+        for _ in range(self.max_attempts):
+            block = self._take(prefixlen)
+            try:
+                rsp = self.client.create_subnet(self._subnet_obj(block, obj))
+            except Exception as ex:
+                if not rejected(ex):
+                    self._release(block)
+                    raise
+                with self._lock:
+                    self.conflicts += 1
+                last_error = ex
+                continue
+            with self._lock:
+                self.allocated += 1
+            return str(block), rsp
+        raise last_error
+
+    def allocate_many(self, prefixlens, subnet_obj=None, concurrency=None, timeout=None, **fields):
+        """
+        Carve many subnets from a single listing. Blocks are taken for all
+        subnets up front, longest prefixes last so the small ones fill the
+        gaps, and created concurrently. Rejected blocks are replaced by fresh
+        ones for up to max_attempts rounds.
+        :param prefixlens: prefix length of every new subnet
+        :param subnet_obj: fields shared by all subnets, see allocate
+        :param concurrency: overrides the client bulk concurrency
+        :param timeout: seconds allowed for the whole batch
+        :return: BulkResult keyed by the position in prefixlens, results hold (subnet prefix, response)
+        """
+        prefixlens = list(prefixlens)
+        obj = dict(subnet_obj or {}, **fields)
+        concurrency = concurrency or self.client.bulk_concurrency
+        result = BulkResult(len(prefixlens), concurrency)
+        pending = sorted(range(len(prefixlens)), key=lambda i: prefixlens[i])
+        start = time.monotonic()
+        with deadline(timeout):
+            for _ in range(self.max_attempts):
+                if not pending:
+                    break
+                blocks = {}
+                for i in pending:
+                    try:
+                        blocks[i] = self._take(prefixlens[i])
+                    except IPAMException as ex:
+                        result.errors[i] = ex
+                prepared = [(i, self._subnet_obj(block, obj)) for i, block in blocks.items()]
+                rnd = run_bulk(self.client.create_subnet, prepared, len(prefixlens), concurrency=concurrency)
+                result.requests += rnd.requests
+                result.busy_time += rnd.busy_time
+                pending = []
+                for i, block in blocks.items():
+                    if i in rnd.results:
+                        result.results[i] = str(block), rnd.results[i]
+                        result.errors.pop(i, None)
+                        continue
+                    ex = rnd.errors[i]
+                    result.errors[i] = ex
+                    if rejected(ex):
+                        pending.append(i)
+                    else:
+                        self._release(block)
+                with self._lock:
+                    self.allocated += len(blocks) - len(rnd.errors)
+                    self.conflicts += len(pending)
+        result.elapsed = time.monotonic() - start
+        return result
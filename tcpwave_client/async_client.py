@@ -0,0 +1,435 @@
+import asyncio
+
+from tcpwave_client import payloads
+from tcpwave_client.async_connector import AsyncConnector
+from tcpwave_client.async_connector import aiohttp
+from tcpwave_client.bulk import run_bulk_async
+from tcpwave_client.bulk import send_split_async
+from tcpwave_client.bulk import spread
+from tcpwave_client.deadlines import check_deadline
+from tcpwave_client.deadlines import deadline
+from tcpwave_client.endpoints import get_endpoint
+from tcpwave_client.exceptions import APICallFailedException
+from tcpwave_client.exceptions import DeadlineExceededException
+from tcpwave_client.exceptions import IPAMException
+from tcpwave_client.operations import SUCCESS
+from tcpwave_client.operations import added_addresses
+from tcpwave_client.operations import create_ip_request
+from tcpwave_client.operations import create_network_request
+from tcpwave_client.operations import create_subnet_request
+from tcpwave_client.operations import created
+from tcpwave_client.operations import delete_network_lookups
+from tcpwave_client.operations import delete_subnet_lookups
+from tcpwave_client.operations import merge
+from tcpwave_client.operations import missing
+from tcpwave_client.operations import next_free_address
+from tcpwave_client.operations import not_added
+from tcpwave_client.operations import prepare_ips
+from tcpwave_client.operations import rejected
+from tcpwave_client.operations import release_chunks
+from tcpwave_client.operations import release_payload
+from tcpwave_client.operations import released_addresses
+from tcpwave_client.paging import page_payload
+
+_MISSING = object()
+
+
+async def fetch_page_async(conn, payload, start, retries=2):
+    """
+    Fetch one page, retrying it on failure without touching the other pages.
+    :param conn:
+    :param payload:
+    :param start:
+    :param retries: number of additional attempts for the page
+    :return:
+    """
+    attempt = 0
+    while True:
+        try:
+            return await conn.get_object(payload=page_payload(payload, start))
+        except DeadlineExceededException:
+            raise
+        except (IPAMException, aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt >= retries:
+                raise
+            check_deadline()
+            attempt += 1
+
+
+async def fetch_all_pages_async(conn, payload, concurrency=4, retries=2, timeout=None):
+    """
+    asyncio counterpart of paging.fetch_all_pages
+    :param conn:
+    :param payload:
+    :param concurrency: maximum number of pages in flight
+    :param retries: number of additional attempts per page
+    :param timeout: seconds allowed for the whole listing
+    :return:
+    """
+    with deadline(timeout):
+        return await _fetch_all_pages_async(conn, payload, concurrency, retries)
+
+
+async def _fetch_all_pages_async(conn, payload, concurrency, retries):
+    page_size = payload["params"]["length"]
+    first_start = payload["params"].get("start") or 0
+    rsp = await fetch_page_async(conn, payload, first_start, retries)
+    total = rsp.get("recordsTotal")
+    res = list()
+    res.extend(rsp.get("data"))
+    starts = range(first_start + page_size, total, page_size)
+    if not starts:
+        return res
+
+    semaphore = asyncio.Semaphore(max(concurrency or 1, 1))
+
+    async def fetch(start):
+        async with semaphore:
+            return await fetch_page_async(conn, payload, start, retries)
+
+    tasks = [asyncio.ensure_future(fetch(start)) for start in starts]
+    try:
+        for task in tasks:
+            res.extend((await task).get("data"))
+    finally:
+        for task in tasks:
+            task.cancel()
+    return res
+
+
+async def iter_records_async(conn, payload, start=0, retries=2):
+    """
+    asyncio counterpart of paging.iter_records, the next page is fetched
+    while the current one is consumed.
+    :param conn:
+    :param payload:
+    :param start: offset of the first record, use it to resume a listing
+    :param retries: number of additional attempts per page
+    :return:
+    """
+    page_size = payload["params"]["length"]
+    task = None
+    try:
+        rsp = await fetch_page_async(conn, payload, start, retries)
+        while True:
+            data = rsp.get("data") or []
+            start += page_size
+            has_next = bool(data) and start < rsp.get("recordsTotal")
+            if has_next:
+                task = asyncio.ensure_future(fetch_page_async(conn, payload, start, retries))
+            for record in data:
+                yield record
+            if not has_next:
+                return
+            rsp, task = await task, None
+    finally:
+        if task is not None:
+            task.cancel()
+
+
+class AsyncTimsClient(object):
+    """
+    asyncio counterpart of TimsClient. Operations are coroutines sharing one
+    AsyncConnector, so many calls can be in flight on a single event loop.
+    """
+    def __init__(self, host, cert, key, verify=False, port=7443, connector=None, page_size=100, page_concurrency=4,
+                 page_retries=2, bulk_concurrency=8, release_chunk_size=100, cache=None, **connector_args):
+        """
+        :param host: IPAM host
+        :param cert: client certificate file
+        :param key: client key file
+        :param verify:
+        :param port: IPAM rest port
+        :param connector: AsyncConnector to use, a new one is created when not given
+        :param page_size: page size used by list operations
+        :param page_concurrency: maximum number of pages fetched in parallel by list operations
+        :param page_retries: number of additional attempts for a failed page
+        :param bulk_concurrency: maximum number of requests in flight for bulk operations
+        :param release_chunk_size: number of addresses sent in one /object/reclaimObjects call
+        :param cache: optional TTLCache for network and subnet detail lookups
+        :param connector_args: passed to AsyncConnector (limit, max_concurrency, timeout, ...)
+        """
+        self.host = host
+        self.page_size = page_size
+        self.page_concurrency = page_concurrency
+        self.page_retries = page_retries
+        self.bulk_concurrency = bulk_concurrency
+        self.release_chunk_size = release_chunk_size
+        self.cache = cache
+        self.connector = connector or AsyncConnector(cert=cert, key=key, verify=verify, host=host, port=port,
+                                                     **connector_args)
+
+    @classmethod
+    def from_provider(cls, provider, **kwargs):
+        """
+        Create client from a provider dict as used by NetworkManager
+        :param provider:
+        :param kwargs:
+        :return:
+        """
+        return cls(provider['host'], provider.get('cert'), provider.get('key'),
+                   verify=provider.get('verify', False), port=provider.get('port', 7443), **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        await self.connector.close()
+
+    def _invalidate(self, networks):
+        if self.cache is not None:
+            self.cache.invalidate(self.host, networks)
+
+    async def _cached_get(self, key, payload):
+        rsp = self.cache.get(key, _MISSING)
+        if rsp is _MISSING:
+            generation = self.cache.generation(key[0])
+            rsp = await self.connector.get_object(payload=payload)
+            self.cache.set(key, rsp, generation)
+        return rsp
+
+    async def _read(self, endpoint, obj, raw=False):
+        payload = endpoint.build(obj)
+        if raw or self.cache is None or endpoint.cache is None:
+            return await self.connector.get_object(payload=payload, raw=raw)
+        return await self._cached_get(endpoint.cache_key(self.host, obj), payload)
+
+    async def _write(self, endpoint, obj, payload=None, write_check=None):
+        if payload is None:
+            payload = endpoint.build(obj)
+        send = self.connector.delete_object if endpoint.delete else self.connector.create_object
+        kwargs = {'idempotent': True} if endpoint.idempotent else {}
+        if write_check is not None:
+            kwargs['write_check'] = write_check
+        try:
+            return await send(payload=payload, **kwargs)
+        finally:
+            self._invalidate(endpoint.invalidated(obj))
+
+    async def call(self, endpoint, obj=None, page_size=None, concurrency=None, timeout=None, **fields):
+        """
+        Call any registered endpoint the way its spec describes, see TimsClient.call
+        :param endpoint: endpoint name, see endpoints.ENDPOINTS
+        :param obj: input fields
+        :param page_size: overrides the client page size of paged endpoints
+        :param concurrency: overrides the client page concurrency of paged endpoints
+        :param timeout: seconds allowed for a paged listing
+        :return:
+        """
+        endpoint = get_endpoint(endpoint)
+        obj = merge(obj, fields)
+        if endpoint.paged:
+            return await fetch_all_pages_async(self.connector, endpoint.build(obj, page_size or self.page_size),
+                                               concurrency=concurrency or self.page_concurrency,
+                                               retries=self.page_retries, timeout=timeout)
+        if endpoint.method == "GET":
+            return await self._read(endpoint, obj)
+        return await self._write(endpoint, obj)
+
+    async def _lookup(self, payload):
+        try:
+            return await self.connector.get_object(payload=payload)
+        except APICallFailedException as ex:
+            if missing(ex):
+                return None
+            raise
+
+    def _created_check(self, payload, name):
+        async def check():
+            return created(await self._lookup(payload), name)
+        return check
+
+    def _added_check(self, payload, address):
+        async def check():
+            return not_added(await self.connector.get_object(payload=payload), address)
+        return check
+
+    def _deleted_check(self, lookup_payloads):
+        async def check():
+            for payload in lookup_payloads:
+                if await self._lookup(payload) is not None:
+                    return None
+            return SUCCESS
+        return check
+
+    async def create_network(self, network=None, **fields):
+        """
+        Create network with the given ip.
+        :param network:
+        :return:
+        """
+        network = merge(network, fields)
+        payload, lookup, name = create_network_request(network)
+        return await self._write(payloads.NETWORK_ADD, network, payload, self._created_check(lookup, name))
+
+    async def get_network_detail(self, network=None, raw=False, **fields):
+        """
+        Given a network ip get all the details.
+        :param network:
+        :param raw: return the undecoded response body, bypassing the cache
+        :return:
+        """
+        return await self._read(payloads.NETWORK_DETAILS_BY_IP, merge(network, fields), raw)
+
+    async def list_all_networks(self, network=None, page_size=None, concurrency=None, timeout=None, **fields):
+        """
+        List all networks visible to the user.
+        :param network:
+        :param page_size: overrides the client page size
+        :param concurrency: overrides the client page concurrency
+        :param timeout: seconds allowed for the whole listing including retries
+        :return:
+        """
+        payload = payloads.network_paged(merge(network, fields), page_size or self.page_size)
+        return await fetch_all_pages_async(self.connector, payload, concurrency=concurrency or self.page_concurrency,
+                                           retries=self.page_retries, timeout=timeout)
+
+    def iter_networks(self, network=None, start=0, page_size=None, **fields):
+        """
+        Asynchronously yield networks page by page, prefetching the next page.
+        :param network:
+        :param start: offset to resume the listing from
+        :param page_size: overrides the client page size
+        :return:
+        """
+        payload = payloads.network_paged(merge(network, fields), page_size or self.page_size)
+        return iter_records_async(self.connector, payload, start=start, retries=self.page_retries)
+
+    async def delete_network(self, network=None, **fields):
+        """
+        Deletes the given network
+        :param network:
+        :return:
+        """
+        network = merge(network, fields)
+        check = self._deleted_check(delete_network_lookups(network))
+        return await self._write(payloads.NETWORK_DELETE, network, write_check=check)
+
+    async def create_subnet(self, subnet=None, **fields):
+        """
+        Creates the given subnet in the given network
+        :param subnet:
+        :return:
+        """
+        subnet = merge(subnet, fields)
+        payload, lookup, name = create_subnet_request(subnet)
+        return await self._write(payloads.SUBNET_ADD, subnet, payload, self._created_check(lookup, name))
+
+    async def get_subnet_detail(self, subnet=None, raw=False, **fields):
+        """
+        Given a subnet ip get all the details.
+        :param subnet:
+        :param raw: return the undecoded response body, bypassing the cache
+        :return:
+        """
+        return await self._read(payloads.SUBNET_DATA, merge(subnet, fields), raw)
+
+    async def list_all_subnets(self, subnet=None, page_size=None, concurrency=None, timeout=None, **fields):
+        """
+        List all Subnets of the given network visible to the user.
+        :param subnet:
+        :param page_size: overrides the client page size
+        :param concurrency: overrides the client page concurrency
+        :param timeout: seconds allowed for the whole listing including retries
+        :return:
+        """
+        payload = payloads.subnet_paged(merge(subnet, fields), page_size or self.page_size)
+        return await fetch_all_pages_async(self.connector, payload, concurrency=concurrency or self.page_concurrency,
+                                           retries=self.page_retries, timeout=timeout)
+
+    def iter_subnets(self, subnet=None, start=0, page_size=None, **fields):
+        """
+        Asynchronously yield subnets of the given network page by page, prefetching the next page.
+        :param subnet:
+        :param start: offset to resume the listing from
+        :param page_size: overrides the client page size
+        :return:
+        """
+        payload = payloads.subnet_paged(merge(subnet, fields), page_size or self.page_size)
+        return iter_records_async(self.connector, payload, start=start, retries=self.page_retries)
+
+    async def delete_subnet(self, subnet=None, **fields):
+        """
+        Deletes the given subnet
+        :param subnet:
+        :return:
+        """
+        subnet = merge(subnet, fields)
+        check = self._deleted_check(delete_subnet_lookups(subnet))
+        return await self._write(payloads.SUBNET_DELETE, subnet, write_check=check)
+
+    async def get_next_available_ip(self, subnet=None, **fields):
+        """
+        Return next free ip in given subnet.
+        :param subnet:
+        :return:
+        """
+        return next_free_address(await self._read(payloads.NEXT_FREE_IP, merge(subnet, fields)))
+
+    async def release_ip(self, ip_obj=None, **fields):
+        """
+        Deletes the ip object.
+        :param ip_obj:
+        :return:
+        """
+        return await self._write(payloads.RECLAIM_OBJECTS, merge(ip_obj, fields))
+
+    async def create_ip(self, ip_obj=None, **fields):
+        """
+        Creates the ip object. The API cannot look up ip objects, so an
+        ambiguous failure (e.g. 504) is only retried when the address is still
+        the next free one of its subnet, otherwise it is raised.
+        :param ip_obj:
+        :return:
+        """
+        ip_obj = merge(ip_obj, fields)
+        payload, lookup, address = create_ip_request(ip_obj)
+        return await self._write(payloads.OBJECT_ADD, ip_obj, payload, self._added_check(lookup, address))
+
+    async def create_ips(self, ip_objs, concurrency=None, timeout=None, **defaults):
+        """
+        Creates many ip objects concurrently, see TimsClient.create_ips
+        :param ip_objs: iterable of dicts as accepted by create_ip
+        :param concurrency: overrides the client bulk concurrency
+        :param timeout: seconds allowed for the whole batch
+        :param defaults: fields shared by all objects
+        :return: BulkResult keyed by the position of each object
+        """
+        total, prepared, errors = prepare_ips(ip_objs, defaults)
+        try:
+            return await run_bulk_async(lambda payload: self.connector.create_object(payload=payload), prepared,
+                                        total, concurrency=concurrency or self.bulk_concurrency, errors=errors,
+                                        timeout=timeout)
+        finally:
+            self._invalidate(added_addresses(prepared))
+
+    async def release_ips(self, addresses, organization_name, chunk_size=None, concurrency=None, timeout=None):
+        """
+        Deletes many ip objects in concurrent addressArray chunks, splitting rejected chunks,
+        see TimsClient.release_ips
+        :param addresses: list of ip addresses
+        :param organization_name:
+        :param chunk_size: overrides the client release chunk size
+        :param concurrency: overrides the client bulk concurrency
+        :param timeout: seconds allowed for the whole batch
+        :return: BulkResult keyed by the position of each address
+        """
+        addresses = list(addresses)
+        prepared, chunk_positions, errors = release_chunks(addresses, organization_name,
+                                                           chunk_size or self.release_chunk_size)
+
+        def release(payload):
+            return send_split_async(lambda part: self.connector.delete_object(payload=part),
+                                    lambda part: release_payload(part, organization_name),
+                                    payload['body']['addressArray'], rejected)
+        try:
+            result = await run_bulk_async(release, prepared, len(prepared),
+                                          concurrency=concurrency or self.bulk_concurrency, timeout=timeout)
+        finally:
+            self._invalidate(released_addresses(prepared))
+        result = spread(result, chunk_positions, len(addresses))
+        result.errors.update(errors)
+        return result
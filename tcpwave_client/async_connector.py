@@ -0,0 +1,264 @@
+import asyncio
+import ssl
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from tcpwave_client import (IPAMException, APICallFailedException, DeadlineExceededException,
+                            UnsupportedMethodException)
+from tcpwave_client.deadlines import bounded
+from tcpwave_client.deadlines import check_deadline
+from tcpwave_client.deadlines import current_deadline
+from tcpwave_client.retry import call_with_retry_async
+from tcpwave_client.serializer import as_serializer
+from tcpwave_client.singleflight import request_key
+from tcpwave_client.throttle import OVERLOAD_STATUSES
+
+
+def _ssl_context(cert, key, verify):
+    if verify is False:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif isinstance(verify, str):
+        context = ssl.create_default_context(cafile=verify)
+    else:
+        context = ssl.create_default_context()
+    context.load_cert_chain(cert, key)
+    return context
+
+
+def _params(params):
+    if not params:
+        return None
+    return {k: str(v) for k, v in params.items() if v is not None}
+
+
+class AsyncConnector(object):
+    """
+        asyncio counterpart of Connector. All requests share one pool of
+        keep-alive HTTP/1.1 connections authenticated with the client certificate.
+        Requires aiohttp.
+    """
+    def __init__(self, cert=None, key=None, verify=False, host=None, limit=100, limit_per_host=0,
+                 max_concurrency=None, timeout=None, connect_timeout=10.0, port=7443, retry=None,
+                 limiter=None, concurrency=None, breaker=None, read_timeout=120.0, single_flight=None,
+                 serializer=None):
+        """
+        :param cert:
+        :param key:
+        :param verify:
+        :param host: IPAM host, when not given it is taken from payload['provider']['host']
+        :param limit: maximum number of open connections
+        :param limit_per_host: maximum number of open connections per host, 0 for no limit
+        :param max_concurrency: maximum number of requests in flight, defaults to limit
+        :param timeout: total seconds allowed for one request, None for no limit
+        :param connect_timeout: seconds allowed for acquiring a connection, None waits forever
+        :param port: IPAM rest port
+        :param retry: RetryPolicy applied to every call
+        :param limiter: RateLimiter every request waits for, can be shared with other connectors and threads
+        :param concurrency: AdaptiveConcurrency limiting the requests in flight per host below max_concurrency
+        :param breaker: CircuitBreaker failing calls at once while the host is down
+        :param read_timeout: seconds allowed between two reads of the response, None waits forever
+        :param single_flight: SingleFlight letting concurrent identical GETs share one request
+        :param serializer: json serializer or backend name (orjson, ujson, json), default: fastest installed
+        """
+        if aiohttp is None:
+            raise IPAMException("aiohttp is required for AsyncConnector, install tcpwave-client[async]")
+        if cert is None and key is None:
+            raise Exception("Missing certificates")
+        self.cert = cert
+        self.key = key
+        self.verify = verify
+        self.host = host
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.max_concurrency = max_concurrency or limit
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout, sock_read=read_timeout)
+        self.url = "https://%s:" + str(port) + "/tims/rest%s"
+        self.retry = retry
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.breaker = breaker
+        self.single_flight = single_flight
+        self.serializer = as_serializer(serializer)
+        self.closed = False
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the session and all of its keep-alive connections.
+        :return:
+        """
+        self.closed = True
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def __construct_url(self, payload):
+        return self.url % (self.host or payload['provider']['host'], payload['rel_url'])
+
+    def __get_session(self):
+        if self._session is None:
+            if self.closed:
+                raise IPAMException("AsyncConnector is closed")
+            connector = aiohttp.TCPConnector(ssl=_ssl_context(self.cert, self.key, self.verify),
+                                             limit=self.limit, limit_per_host=self.limit_per_host)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def __request(self, method, payload, data=None):
+        if self.breaker is None and self.limiter is None and self.concurrency is None:
+            return await self.__send(method, payload, data)
+        host = self.host or payload['provider']['host']
+        breaker = self.breaker
+        if breaker is None:
+            return await self.__send_throttled(host, method, payload, data)
+        check_deadline()
+        breaker.before(host)
+        try:
+            rsp = await self.__send_throttled(host, method, payload, data)
+        except DeadlineExceededException:
+            breaker.release(host)
+            raise
+        except Exception:
+            breaker.record_failure(host)
+            raise
+        breaker.record(host, rsp[0])
+        return rsp
+
+    async def __send_throttled(self, host, method, payload, data):
+        if self.limiter is not None and not await self.limiter.acquire_async(host, method, bounded(None)):
+            raise DeadlineExceededException("Deadline exceeded waiting for the rate limit of %s" % host)
+        concurrency = self.concurrency
+        if concurrency is None:
+            return await self.__send(method, payload, data)
+        try:
+            await asyncio.wait_for(concurrency.acquire_async(host), bounded(None))
+        except asyncio.TimeoutError:
+            raise DeadlineExceededException("Deadline exceeded waiting for a request slot of %s" % host)
+        latency = None
+        overloaded = True
+        try:
+            start = time.perf_counter()
+            rsp = await self.__send(method, payload, data)
+            latency = time.perf_counter() - start
+            overloaded = rsp[0] in OVERLOAD_STATUSES
+            return rsp
+        except DeadlineExceededException:
+            overloaded = False
+            raise
+        finally:
+            concurrency.release(host, latency, overloaded)
+
+    async def __send(self, method, payload, data=None):
+        session = self.__get_session()
+        async with self._semaphore:
+            timeout = self.timeout
+            if current_deadline() is not None:
+                timeout = aiohttp.ClientTimeout(total=bounded(timeout.total), connect=timeout.connect,
+                                                sock_read=timeout.sock_read)
+            try:
+                async with session.request(method, self.__construct_url(payload), headers=payload.get('headers'),
+                                           params=_params(payload.get('params')), data=data,
+                                           timeout=timeout) as rsp:
+                    return rsp.status, rsp.headers, await rsp.read()
+            except asyncio.TimeoutError:
+                check_deadline()
+                raise
+
+    async def __call(self, method, payload, data, accepted, decode, idempotent=True, write_check=None):
+        async def attempt():
+            status_code, headers, content = await self.__request(method, payload, data)
+            if status_code in accepted:
+                return decode(content)
+            raise APICallFailedException("API call failed. Msg :: "+str(content.decode("utf-8")),
+                                         status_code=status_code, headers=headers)
+
+        if self.retry is None:
+            return await attempt()
+        current = current_deadline()
+        return await call_with_retry_async(self.retry, attempt, idempotent=idempotent, write_check=write_check,
+                                           deadline=current.expires if current is not None else None)
+
+    def __decode_get(self, content):
+        if len(content):
+            try:
+                data = self.serializer.loads(content)
+            except Exception:
+                data = content
+            return data
+
+    def __decode_write(self, content):
+        if len(content):
+            return self.serializer.loads(content)
+        else:
+            return '{"msg": "Successful"}'
+
+    @staticmethod
+    def __decode_raw(content):
+        return content
+
+    async def get_object(self, payload, raw=False):
+        """
+        Make GET call
+        :param payload:
+        :param raw: return the response body as bytes without decoding it
+        :return:
+        """
+        decode = self.__decode_raw if raw else self.__decode_get
+        single_flight = self.single_flight
+        if single_flight is None:
+            return await self.__call("GET", payload, None, (200,), decode)
+        key = (request_key((self.cert, self.key), self.__construct_url(payload), _params(payload.get('params'))), raw)
+        return await single_flight.do_async(key, lambda: self.__call("GET", payload, None, (200,), decode))
+
+    async def __write(self, method, payload, accepted, idempotent, write_check):
+        try:
+            return await self.__call(method, payload, self.serializer.dumps(payload.get('body')), accepted,
+                                     self.__decode_write, idempotent, write_check)
+        finally:
+            if self.single_flight is not None:
+                self.single_flight.forget()
+
+    async def create_object(self, payload, idempotent=None, write_check=None):
+        """
+        Make PUT/POST call to create/update object
+        :param payload:
+        :param idempotent: whether the call may be repeated, defaults to True for PUT only
+        :param write_check: coroutine function run when a non-idempotent call failed ambiguously,
+                            returning the call result when the write already happened, else None
+        :return:
+        """
+        method = payload['method']
+        if method not in ["PUT", "POST"]:
+            raise UnsupportedMethodException("method %s not supported" % method)
+        if idempotent is None:
+            idempotent = method == "PUT"
+        return await self.__write(method, payload, (200, 201), idempotent, write_check)
+
+    async def delete_object(self, payload, idempotent=None, write_check=None):
+        """
+        Make DELETE call to remove object.
+        :param payload:
+        :param idempotent: whether the call may be repeated, defaults to True for DELETE only
+        :param write_check: see create_object
+        :return:
+        """
+        method = payload['method']
+        if method not in ["POST", "DELETE"]:
+            raise UnsupportedMethodException("method %s not supported" % method)
+        if idempotent is None:
+            idempotent = method == "DELETE"
+        return await self.__write(method, payload, (200,), idempotent, write_check)
@@ -0,0 +1,214 @@
+import asyncio
+import weakref
+
+from tcpwave_client import serializer
+from tcpwave_client.async_client import AsyncTimsClient
+from tcpwave_client.async_connector import AsyncConnector
+
+# AsyncConnectors are bound to the event loop that created their session,
+# so connectors are kept per loop and per (host, cert, key, verify, port).
+_loop_connectors = weakref.WeakKeyDictionary()
+
+
+class AsyncNetworkManager(object):
+    """
+    asyncio counterpart of NetworkManager. Operations take the same json
+    strings and share one AsyncConnector per provider and event loop.
+    """
+    @classmethod
+    def _client(cls, obj):
+        provider = obj['provider']
+        conn_key = (provider['host'], provider.get('cert'), provider.get('key'), provider.get('verify', False),
+                    provider.get('port', 7443))
+        connectors = _loop_connectors.setdefault(asyncio.get_event_loop(), {})
+        conn = connectors.get(conn_key)
+        if conn is None or conn.closed:
+            conn = connectors[conn_key] = AsyncConnector(cert=conn_key[1], key=conn_key[2], verify=conn_key[3],
+                                                         host=conn_key[0], port=conn_key[4])
+        return AsyncTimsClient.from_provider(provider, connector=conn)
+
+    @classmethod
+    async def close(cls):
+        """
+        Close connectors created for the running event loop.
+        :return:
+        """
+        connectors = _loop_connectors.pop(asyncio.get_event_loop(), {})
+        for conn in connectors.values():
+            await conn.close()
+
+    @classmethod
+    async def call(cls, payload):
+        """
+        Call the registered endpoint named by the 'endpoint' key, see AsyncTimsClient.call.
+        Optional 'page_size' and 'concurrency' keys tune the paging.
+        :param payload:
+        :return:
+        """
+        obj = serializer.loads(payload)
+        return await cls._client(obj).call(obj['endpoint'], obj, page_size=obj.get('page_size'),
+                                           concurrency=obj.get('concurrency'))
+
+    @classmethod
+    async def create_network(cls, network):
+        """
+        Create network with the given ip.
+        :param network:
+        :return:
+        """
+        network_obj = serializer.loads(network)
+        return await cls._client(network_obj).create_network(network_obj)
+
+    @classmethod
+    async def get_network_detail(cls, network):
+        """
+        Given a network ip get all the details.
+        :param network:
+        :return:
+        """
+        network_obj = serializer.loads(network)
+        return await cls._client(network_obj).get_network_detail(network_obj)
+
+    @classmethod
+    async def list_all_networks(cls, network):
+        """
+        List all networks visible to the user.
+        Optional 'page_size' and 'concurrency' keys tune the paging.
+        :return:
+        """
+        network_obj = serializer.loads(network)
+        return await cls._client(network_obj).list_all_networks(network_obj, page_size=network_obj.get('page_size'),
+                                                                concurrency=network_obj.get('concurrency'))
+
+    @classmethod
+    def iter_networks(cls, network):
+        """
+        Asynchronously yield networks visible to the user page by page.
+        Optional 'start' and 'page_size' keys control the paging.
+        :param network:
+        :return:
+        """
+        network_obj = serializer.loads(network)
+        return cls._client(network_obj).iter_networks(network_obj, start=network_obj.get('start') or 0,
+                                                      page_size=network_obj.get('page_size'))
+
+    @classmethod
+    async def delete_network(cls, network):
+        """
+        Deletes the given network
+        :param network:
+        :return:
+        """
+        network_obj = serializer.loads(network)
+        return await cls._client(network_obj).delete_network(network_obj)
+
+    @classmethod
+    async def create_subnet(cls, subnet):
+        """
+        Creates the given subnet in the given network
+        :param subnet:
+        :return:
+        """
+        subnet_obj = serializer.loads(subnet)
+        return await cls._client(subnet_obj).create_subnet(subnet_obj)
+
+    @classmethod
+    async def get_subnet_detail(cls, subnet):
+        """
+        Given a subnet ip get all the details.
+        :param subnet
+        :return:
+        """
+        subnet_obj = serializer.loads(subnet)
+        return await cls._client(subnet_obj).get_subnet_detail(subnet_obj)
+
+    @classmethod
+    async def list_all_subnets(cls, subnet):
+        """
+        List all Subnets visible to the user.
+        Optional 'page_size' and 'concurrency' keys tune the paging.
+        :param subnet
+        :return:
+        """
+        subnet_obj = serializer.loads(subnet)
+        return await cls._client(subnet_obj).list_all_subnets(subnet_obj, page_size=subnet_obj.get('page_size'),
+                                                              concurrency=subnet_obj.get('concurrency'))
+
+    @classmethod
+    def iter_subnets(cls, subnet):
+        """
+        Asynchronously yield subnets visible to the user page by page.
+        Optional 'start' and 'page_size' keys control the paging.
+        :param subnet:
+        :return:
+        """
+        subnet_obj = serializer.loads(subnet)
+        return cls._client(subnet_obj).iter_subnets(subnet_obj, start=subnet_obj.get('start') or 0,
+                                                    page_size=subnet_obj.get('page_size'))
+
+    @classmethod
+    async def delete_subnet(cls, subnet):
+        """
+        Deletes the given subnet
+        :param subnet:
+        :return:
+        """
+        subnet_obj = serializer.loads(subnet)
+        return await cls._client(subnet_obj).delete_subnet(subnet_obj)
+
+    @classmethod
+    async def get_next_available_ip(cls, subnet):
+        """
+        Return next free ip in given network and subnet.
+        :param subnet:
+        :return:
+        """
+        subnet_obj = serializer.loads(subnet)
+        return await cls._client(subnet_obj).get_next_available_ip(subnet_obj)
+
+    @classmethod
+    async def release_ip(cls, ip_payload):
+        """
+        Deletes the ip object.
+        :param ip_payload:
+        :return:
+        """
+        ip_obj = serializer.loads(ip_payload)
+        return await cls._client(ip_obj).release_ip(ip_obj)
+
+    @classmethod
+    async def create_ip(cls, ip_payload):
+        """
+        Creates the ip object.
+        :param ip_payload:
+        :return:
+        """
+        ip_obj = serializer.loads(ip_payload)
+        return await cls._client(ip_obj).create_ip(ip_obj)
+
+    @classmethod
+    async def create_ips(cls, ip_payload):
+        """
+        Creates many ip objects concurrently.
+        'ip_objects' holds the objects, other keys besides 'provider' and
+        'concurrency' are used as defaults for every object.
+        :param ip_payload:
+        :return: BulkResult
+        """
+        ip_obj = serializer.loads(ip_payload)
+        defaults = dict((k, v) for k, v in ip_obj.items() if k not in ('provider', 'ip_objects', 'concurrency'))
+        client = cls._client(ip_obj)
+        return await client.create_ips(ip_obj['ip_objects'], concurrency=ip_obj.get('concurrency'), **defaults)
+
+    @classmethod
+    async def release_ips(cls, ip_payload):
+        """
+        Deletes many ip objects listed in 'address_list' using batched
+        /object/reclaimObjects calls. Optional keys: 'chunk_size', 'concurrency'.
+        :param ip_payload:
+        :return: BulkResult
+        """
+        ip_obj = serializer.loads(ip_payload)
+        client = cls._client(ip_obj)
+        return await client.release_ips(ip_obj['address_list'], ip_obj['organization_name'],
+                                        chunk_size=ip_obj.get('chunk_size'), concurrency=ip_obj.get('concurrency'))
@@ -0,0 +1,174 @@
+import threading
+import time
+
+from tcpwave_client.exceptions import CircuitOpenException
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class _Circuit(object):
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.successes = 0
+        self.opened_at = None
+        self.probes = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker per IPAM host. After failure_threshold consecutive
+    failures (connection errors, timeouts or 5xx/429 responses) the circuit
+    opens and calls to the host fail at once with CircuitOpenException
+    instead of waiting for timeouts. After recovery_timeout seconds up to
+    half_open_probes requests are let through; success_threshold successful
+    probes close the circuit, a failed probe opens it again.
+    """
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, half_open_probes=1, success_threshold=1,
+                 failure_statuses=(429, 500, 502, 503, 504), timer=time.monotonic):
+        """
+        :param failure_threshold: consecutive failures opening the circuit
+        :param recovery_timeout: seconds the circuit stays open before probing
+        :param half_open_probes: requests allowed concurrently while half open
+        :param success_threshold: successful probes closing the circuit
+        :param failure_statuses: response statuses counted as failures
+        :param timer:
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self.success_threshold = success_threshold
+        self.failure_statuses = frozenset(failure_statuses)
+        self.timer = timer
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _get(self, host):
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            circuit = self._circuits.setdefault(host, _Circuit())
+        return circuit
+
+    def _open(self, circuit):
+        circuit.state = OPEN
+        circuit.opened_at = self.timer()
+        circuit.successes = 0
+        circuit.times_opened += 1
+
+    def before(self, host):
+        """
+        Admit a request to the host or raise CircuitOpenException
+        :param host:
+        :return:
+        """
+        with self._lock:
+            circuit = self._get(host)
+            if circuit.state == CLOSED:
+                return
+            if circuit.state == OPEN:
+                retry_in = circuit.opened_at + self.recovery_timeout - self.timer()
+                if retry_in > 0:
+                    circuit.rejected += 1
+                    raise CircuitOpenException("Circuit to %s is open, retry in %.1fs" % (host, retry_in),
+                                               host=host, retry_in=retry_in)
+                circuit.state = HALF_OPEN
+                circuit.probes = 0
+            if circuit.probes >= self.half_open_probes:
+                circuit.rejected += 1
+                raise CircuitOpenException("Circuit to %s is half open, probe in progress" % host, host=host)
+            circuit.probes += 1
+
+    def record(self, host, status_code):
+        """
+        Record the response status of an admitted request
+        :param host:
+        :param status_code:
+        :return:
+        """
+        if status_code in self.failure_statuses:
+            self.record_failure(host)
+        else:
+            self.record_success(host)
+
+    def record_success(self, host):
+        with self._lock:
+            circuit = self._get(host)
+            circuit.failures = 0
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(circuit.probes - 1, 0)
+                circuit.successes += 1
+                if circuit.successes >= self.success_threshold:
+                    circuit.state = CLOSED
+                    circuit.opened_at = None
+
+    def record_failure(self, host):
+        with self._lock:
+            circuit = self._get(host)
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(circuit.probes - 1, 0)
+                self._open(circuit)
+            elif circuit.state == CLOSED and circuit.failures >= self.failure_threshold:
+                self._open(circuit)
+
+    def release(self, host):
+        """
+        Give back the admission of a request that ended without telling
+        anything about the host, e.g. because the caller's deadline passed
+        :param host:
+        :return:
+        """
+        with self._lock:
+            circuit = self._get(host)
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(circuit.probes - 1, 0)
+
+    def state(self, host):
+        """
+        CLOSED, OPEN or HALF_OPEN, an open circuit past its recovery timeout reports HALF_OPEN
+        :param host:
+        :return:
+        """
+        with self._lock:
+            circuit = self._get(host)
+            if circuit.state == OPEN and self.timer() >= circuit.opened_at + self.recovery_timeout:
+                return HALF_OPEN
+            return circuit.state
+
+    def reset(self, host):
+        """
+        Close the circuit of the host, e.g. after maintenance
+        :param host:
+        :return:
+        """
+        with self._lock:
+            self._circuits[host] = _Circuit()
+
+    def stats(self):
+        """
+        State of every known host for monitoring
+        :return: dict of host -> dict
+        """
+        now = self.timer()
+        with self._lock:
+            res = {}
+            for host, circuit in self._circuits.items():
+                state = circuit.state
+                retry_in = None
+                if state == OPEN:
+                    retry_in = max(circuit.opened_at + self.recovery_timeout - now, 0.0)
+                    if not retry_in:
+                        state = HALF_OPEN
+                res[host] = {
+                    'state': state,
+                    'consecutive_failures': circuit.failures,
+                    'times_opened': circuit.times_opened,
+                    'rejected': circuit.rejected,
+                    'retry_in': retry_in
+                }
+            return res
@@ -0,0 +1,303 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import as_completed
+
+from tcpwave_client.addresses import normalize_prefixes
+from tcpwave_client.deadlines import check_deadline
+from tcpwave_client.deadlines import deadline
+from tcpwave_client.deadlines import submit
+from tcpwave_client.deadlines import time_left
+from tcpwave_client.exceptions import DeadlineExceededException
+
+
+class BulkResult(object):
+    """
+    Outcome of a bulk operation. results and errors are keyed by the
+    position of the item in the input, so every item can be traced back.
+    """
+    def __init__(self, total, concurrency):
+        self.total = total
+        self.concurrency = concurrency
+        self.results = {}
+        self.errors = {}
+        self.requests = 0
+        self.elapsed = 0.0
+        self.busy_time = 0.0
+
+    def __repr__(self):
+        return "BulkResult(total=%d, succeeded=%d, failed=%d, requests=%d, elapsed=%.3fs, ops_per_sec=%.1f)" % (
+            self.total, self.succeeded, self.failed, self.requests, self.elapsed, self.ops_per_sec)
+
+    @property
+    def succeeded(self):
+        return len(self.results)
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+    @property
+    def ops_per_sec(self):
+        """
+        Completed requests per second of wall clock time
+        :return:
+        """
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mean_latency(self):
+        """
+        Average seconds spent in one request
+        :return:
+        """
+        return self.busy_time / self.requests if self.requests else 0.0
+
+    def failed_items(self, items):
+        """
+        Items of the original input that failed, in input order
+        :param items:
+        :return:
+        """
+        return [items[i] for i in sorted(self.errors)]
+
+
+def prepare(items, build, prefix_fields=()):
+    """
+    Build payloads for all items up front. Items that fail validation are
+    recorded as errors and are not sent. The address fields named in
+    prefix_fields are normalized for all items in one batch and passed to
+    build as keyword arguments of the same name.
+    :param items: list of items
+    :param build: callable turning one item into a payload
+    :param prefix_fields: names of the address or prefix fields of the items
+    :return: (list of (index, payload), errors by index)
+    """
+    prepared = []
+    errors = {}
+    columns = {}
+    for field in prefix_fields:
+        values = []
+        for i, item in enumerate(items):
+            try:
+                values.append(item[field])
+            except KeyError as ex:
+                errors.setdefault(i, ex)
+                values.append(None)
+        columns[field] = normalize_prefixes(values)
+        for i, ex in columns[field].errors.items():
+            errors.setdefault(i, ex)
+    for i, item in enumerate(items):
+        if i in errors:
+            continue
+        try:
+            prepared.append((i, build(item, **dict((field, columns[field].fields(i)) for field in prefix_fields))))
+        except (KeyError, ValueError, TypeError) as ex:
+            errors[i] = ex
+    return prepared, errors
+
+
+def chunks(items, size):
+    """
+    Split a list into consecutive chunks of at most size items
+    :param items:
+    :param size:
+    :return:
+    """
+    size = max(size or 1, 1)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class ChunkOutcome(object):
+    """
+    Outcome of a chunk sent by send_split, one (ok, response or error) per
+    item of the chunk and the number of requests it took.
+    """
+    def __init__(self, size):
+        self.items = [None] * size
+        self.requests = 0
+
+    def _set(self, lo, hi, ok, value):
+        for k in range(lo, hi):
+            self.items[k] = ok, value
+
+
+def _halves(lo, hi):
+    mid = (lo + hi) // 2
+    return [(mid, hi), (lo, mid)]
+
+
+def send_split(send, build, items, rejected):
+    """
+    Send a chunk of items in one request. When the appliance rejects the
+    whole chunk, e.g. because one of the objects it names does not exist,
+    the chunk is split in halves and resent until the rejected items are
+    isolated, so only they fail. Other errors fail every item of the part
+    that was being sent.
+    :param send: callable sending one payload
+    :param build: callable turning a list of items into a payload
+    :param items: list of items
+    :param rejected: callable telling whether an error means the payload was refused without being applied
+    :return: ChunkOutcome
+    """
+    outcome = ChunkOutcome(len(items))
+    parts = [(0, len(items))]
+    while parts:
+        lo, hi = parts.pop()
+        outcome.requests += 1
+        try:
+            rsp = send(build(items[lo:hi]))
+        except Exception as ex:
+            if hi - lo > 1 and rejected(ex):
+                parts.extend(_halves(lo, hi))
+            else:
+                outcome._set(lo, hi, False, ex)
+            continue
+        outcome._set(lo, hi, True, rsp)
+    return outcome
+
+
+async def send_split_async(send, build, items, rejected):
+    """
+    asyncio counterpart of send_split, send is a coroutine function.
+    :param send:
+    :param build:
+    :param items:
+    :param rejected:
+    :return: ChunkOutcome
+    """
+    outcome = ChunkOutcome(len(items))
+    parts = [(0, len(items))]
+    while parts:
+        lo, hi = parts.pop()
+        outcome.requests += 1
+        try:
+            rsp = await send(build(items[lo:hi]))
+        except Exception as ex:
+            if hi - lo > 1 and rejected(ex):
+                parts.extend(_halves(lo, hi))
+            else:
+                outcome._set(lo, hi, False, ex)
+            continue
+        outcome._set(lo, hi, True, rsp)
+    return outcome
+
+
+def spread(result, chunk_positions, total):
+    """
+    Turn a result keyed by chunk into one keyed by item. Items of a chunk
+    sent by send_split get their own outcome, the others share the outcome
+    of the request that carried them.
+    :param result: BulkResult keyed by chunk index
+    :param chunk_positions: list of item positions per chunk
+    :param total: number of input items
+    :return: BulkResult keyed by item position
+    """
+    item_result = BulkResult(total, result.concurrency)
+    item_result.requests = result.requests
+    item_result.elapsed = result.elapsed
+    item_result.busy_time = result.busy_time
+    for i, positions in enumerate(chunk_positions):
+        outcome = result.results.get(i)
+        if isinstance(outcome, ChunkOutcome):
+            item_result.requests += outcome.requests - 1
+            for position, (ok, value) in zip(positions, outcome.items):
+                (item_result.results if ok else item_result.errors)[position] = value
+            continue
+        for position in positions:
+            if i in result.results:
+                item_result.results[position] = result.results[i]
+            elif i in result.errors:
+                item_result.errors[position] = result.errors[i]
+    return item_result
+
+
+def _timed(func, payload):
+    start = time.monotonic()
+    try:
+        return True, func(payload), time.monotonic() - start
+    except Exception as ex:
+        return False, ex, time.monotonic() - start
+
+
+def _collect(result, i, future):
+    ok, value, elapsed = future.result()
+    if ok:
+        result.results[i] = value
+    else:
+        result.errors[i] = value
+    result.requests += 1
+    result.busy_time += elapsed
+
+
+def run_bulk(func, prepared, total, concurrency=8, errors=None, timeout=None):
+    """
+    Send prepared payloads with at most concurrency requests in flight.
+    A failing item never stops the others. Once the deadline passed items
+    not sent yet fail with DeadlineExceededException.
+    :param func: callable sending one payload
+    :param prepared: list of (index, payload)
+    :param total: number of input items
+    :param concurrency:
+    :param errors: validation errors by index
+    :param timeout: seconds allowed for the whole batch, see deadlines.deadline
+    :return: BulkResult
+    """
+    concurrency = max(concurrency or 1, 1)
+    result = BulkResult(total, concurrency)
+    result.errors.update(errors or {})
+    if not prepared:
+        return result
+    start = time.monotonic()
+    with deadline(timeout), ThreadPoolExecutor(max_workers=min(concurrency, len(prepared))) as executor:
+        futures = dict((submit(executor, _timed, func, payload), i) for i, payload in prepared)
+        try:
+            for future in as_completed(futures, time_left()):
+                _collect(result, futures[future], future)
+        except FutureTimeoutError:
+            pending = [future for future in futures if not future.done()]
+            for future in pending:
+                if future.cancel():
+                    result.errors[futures[future]] = DeadlineExceededException("Deadline exceeded before sending")
+            # requests in flight are bounded by the deadline as well and end shortly
+            for future in pending:
+                if not future.cancelled():
+                    _collect(result, futures[future], future)
+    result.elapsed = time.monotonic() - start
+    return result
+
+
+async def run_bulk_async(func, prepared, total, concurrency=8, errors=None, timeout=None):
+    """
+    asyncio counterpart of run_bulk, func is a coroutine function.
+    :param func:
+    :param prepared:
+    :param total:
+    :param concurrency:
+    :param errors:
+    :param timeout: seconds allowed for the whole batch
+    :return: BulkResult
+    """
+    concurrency = max(concurrency or 1, 1)
+    result = BulkResult(total, concurrency)
+    result.errors.update(errors or {})
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i, payload):
+        async with semaphore:
+            begin = time.monotonic()
+            try:
+                check_deadline()
+                result.results[i] = await func(payload)
+            except Exception as ex:
+                result.errors[i] = ex
+            result.busy_time += time.monotonic() - begin
+            result.requests += 1
+
+    start = time.monotonic()
+    with deadline(timeout):
+        # tasks are created inside the block and inherit its deadline
+        await asyncio.gather(*[send(i, payload) for i, payload in prepared])
+    result.elapsed = time.monotonic() - start
+    return result
@@ -0,0 +1,181 @@
+import bisect
+import collections
+import ipaddress
+import threading
+import time
+
+NETWORK = 'network'
+SUBNET = 'subnet'
+
+_MISSING = object()
+
+
+def _range(network):
+    return ((network.version, int(network.network_address)),
+            (network.version, int(network.broadcast_address)))
+
+
+def overlap_checker(networks):
+    """
+    Return a callable telling whether a network overlaps any of the given
+    networks in O(log n).
+    :param networks: iterable of ipaddress networks
+    :return:
+    """
+    ranges = sorted(_range(network) for network in networks)
+    starts = [start for start, _ in ranges]
+    max_ends = []
+    for _, end in ranges:
+        max_ends.append(max(end, max_ends[-1]) if max_ends else end)
+
+    def overlaps(network):
+        start, end = _range(network)
+        i = bisect.bisect_right(starts, end)
+        return i > 0 and max_ends[i - 1] >= start
+
+    return overlaps
+
+
+def cache_key(host, kind, organization_name, address):
+    """
+    Key of a detail lookup: (host, kind, org, normalized prefix)
+    :param host:
+    :param kind: NETWORK or SUBNET
+    :param organization_name:
+    :param address: address or prefix, host bits are ignored
+    :return:
+    """
+    return host, kind, organization_name, ipaddress.ip_network(address, strict=False)
+
+
+class TTLCache(object):
+    """
+    Thread-safe read-through cache for network and subnet detail lookups.
+    Entries expire ttl seconds after they were stored and the least
+    recently used entry is evicted once maxsize entries are held.
+    Cached responses are shared between callers and must not be modified.
+    Every invalidation bumps a generation counter of the host; a load that
+    started before it is not stored, as it may have read the old record.
+    """
+    def __init__(self, maxsize=1024, ttl=60, timer=time.monotonic):
+        """
+        :param maxsize: maximum number of entries
+        :param ttl: seconds an entry stays valid
+        :param timer:
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._data = collections.OrderedDict()
+        self._generations = {}
+        self._clears = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """
+        Return the cached value or default, counting hits and misses
+        :param key:
+        :param default:
+        :return:
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > self.timer():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def generation(self, host):
+        """
+        Token to pass to set() for a value loaded from now on
+        :param host:
+        :return:
+        """
+        with self._lock:
+            return self._clears, self._generations.get(host, 0)
+
+    def set(self, key, value, generation=None):
+        """
+        Store a value
+        :param key:
+        :param value:
+        :param generation: generation(host) taken before the value was loaded, the value is dropped when the
+                           host was invalidated since
+        :return: whether the value was stored
+        """
+        with self._lock:
+            if generation is not None and generation != (self._clears, self._generations.get(key[0], 0)):
+                return False
+            self._data[key] = (self.timer() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def get_or_load(self, key, load):
+        """
+        Return the cached value, calling load() and storing its result on a miss
+        :param key:
+        :param load:
+        :return:
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self.generation(key[0])
+            value = load()
+            self.set(key, value, generation)
+        return value
+
+    def invalidate(self, host, networks, kinds=(NETWORK, SUBNET)):
+        """
+        Drop entries of the host whose prefix overlaps any of the given networks
+        :param host:
+        :param networks: iterable of addresses or prefixes
+        :param kinds: entry kinds to drop
+        :return: number of dropped entries
+        """
+        networks = [ipaddress.ip_network(network, strict=False) for network in networks]
+        if not networks:
+            return 0
+        overlaps = overlap_checker(networks)
+        with self._lock:
+            self._generations[host] = self._generations.get(host, 0) + 1
+            stale = [key for key in self._data if key[0] == host and key[1] in kinds and overlaps(key[3])]
+            for key in stale:
+                del self._data[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._clears += 1
+            self._data.clear()
+
+    def stats(self):
+        """
+        Counters for sizing the cache
+        :return:
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
@@ -0,0 +1,414 @@
+from tcpwave_client import payloads
+from tcpwave_client.allocator import IPAllocator
+from tcpwave_client.allocator import SubnetAllocator
+from tcpwave_client.bulk import run_bulk
+from tcpwave_client.bulk import send_split
+from tcpwave_client.bulk import spread
+from tcpwave_client.endpoints import get_endpoint
+from tcpwave_client.exceptions import APICallFailedException
+from tcpwave_client.hosts import PRIMARY
+from tcpwave_client.hosts import parse_hosts
+from tcpwave_client.mirror import InventoryMirror
+from tcpwave_client.operations import SUCCESS
+from tcpwave_client.operations import added_addresses
+from tcpwave_client.operations import create_ip_request
+from tcpwave_client.operations import create_network_request
+from tcpwave_client.operations import create_subnet_request
+from tcpwave_client.operations import created
+from tcpwave_client.operations import delete_network_lookups
+from tcpwave_client.operations import delete_subnet_lookups
+from tcpwave_client.operations import merge
+from tcpwave_client.operations import missing
+from tcpwave_client.operations import next_free_address
+from tcpwave_client.operations import not_added
+from tcpwave_client.operations import prepare_ips
+from tcpwave_client.operations import rejected
+from tcpwave_client.operations import release_chunks
+from tcpwave_client.operations import release_payload
+from tcpwave_client.operations import released_addresses
+from tcpwave_client.reconcile import Reconciler
+from tcpwave_client.paging import fetch_all_pages
+from tcpwave_client.paging import iter_records
+from tcpwave_client.pool import get_default_pool
+
+
+class TimsClient(object):
+    """
+    Client bound to an IPAM host, or to a group of appliances when hosts is
+    given. Provider details are resolved once and every operation takes
+    plain python values instead of json strings.
+    Each operation accepts a dict with the same keys NetworkManager expects
+    (without 'provider'), keyword arguments, or both.
+    """
+    def __init__(self, host, cert, key, verify=False, port=7443, pool=None, page_size=100, page_concurrency=4,
+                 page_retries=2, bulk_concurrency=8, release_chunk_size=100, cache=None, hosts=None,
+                 probe_interval=None):
+        """
+        :param host: IPAM host, may be None when hosts is given
+        :param cert: client certificate file
+        :param key: client key file
+        :param verify:
+        :param port: IPAM rest port
+        :param pool: ConnectorPool to take the connector from, defaults to the process-wide pool
+        :param page_size: page size used by list operations
+        :param page_concurrency: maximum number of pages fetched in parallel by list operations,
+                                 keep it within the pool_maxsize of the connector pool
+        :param page_retries: number of additional attempts for a failed page
+        :param bulk_concurrency: maximum number of requests in flight for bulk operations
+        :param release_chunk_size: number of addresses sent in one /object/reclaimObjects call
+        :param cache: optional TTLCache for network and subnet detail lookups, writes made through
+                      the client invalidate the affected entries
+        :param hosts: several appliances as host names or dicts with host, role ('primary'/'replica'),
+                      weight and port; reads are balanced over them and writes go to the primary
+        :param probe_interval: seconds between active health probes of the hosts, None disables probing
+        """
+        if hosts:
+            hosts = parse_hosts(hosts, port)
+            host = host or next(entry['host'] for entry in hosts if entry['role'] == PRIMARY)
+        self.host = host
+        self.cert = cert
+        self.key = key
+        self.verify = verify
+        self.port = port
+        self.pool = pool
+        self.page_size = page_size
+        self.page_concurrency = page_concurrency
+        self.page_retries = page_retries
+        self.bulk_concurrency = bulk_concurrency
+        self.release_chunk_size = release_chunk_size
+        self.cache = cache
+        self.hosts = hosts
+        self.probe_interval = probe_interval
+        self._connector = None
+
+    @classmethod
+    def from_provider(cls, provider, **kwargs):
+        """
+        Create client from a provider dict as used by NetworkManager
+        :param provider:
+        :param kwargs:
+        :return:
+        """
+        kwargs.setdefault('hosts', provider.get('hosts'))
+        kwargs.setdefault('probe_interval', provider.get('probe_interval'))
+        return cls(provider.get('host'), provider.get('cert'), provider.get('key'),
+                   verify=provider.get('verify', False), port=provider.get('port', 7443), **kwargs)
+
+    @property
+    def connector(self):
+        conn = self._connector
+        if conn is None or conn.closed:
+            pool = self.pool if self.pool is not None else get_default_pool()
+            if self.hosts:
+                conn = pool.get_multi(self.hosts, self.cert, self.key, self.verify, self.port, self.probe_interval)
+            else:
+                conn = pool.get(self.host, self.cert, self.key, self.verify, self.port)
+            self._connector = conn
+        return conn
+
+    def _invalidate(self, networks):
+        if self.cache is not None:
+            self.cache.invalidate(self.host, networks)
+
+    def _list_all(self, payload, concurrency=None, timeout=None):
+        if concurrency is None:
+            concurrency = self.page_concurrency
+        return fetch_all_pages(self.connector, payload, concurrency=concurrency, retries=self.page_retries,
+                               timeout=timeout)
+
+    def _lookup(self, payload):
+        try:
+            return self.connector.get_object(payload=payload)
+        except APICallFailedException as ex:
+            if missing(ex):
+                return None
+            raise
+
+    def _read(self, endpoint, obj, raw=False):
+        payload = endpoint.build(obj)
+        if raw or self.cache is None or endpoint.cache is None:
+            return self.connector.get_object(payload=payload, raw=raw)
+        return self.cache.get_or_load(endpoint.cache_key(self.host, obj),
+                                      lambda: self.connector.get_object(payload=payload))
+
+    def _write(self, endpoint, obj, payload=None, write_check=None):
+        if payload is None:
+            payload = endpoint.build(obj)
+        send = self.connector.delete_object if endpoint.delete else self.connector.create_object
+        # connectors treat writes as not idempotent unless told otherwise
+        kwargs = {'idempotent': True} if endpoint.idempotent else {}
+        if write_check is not None:
+            kwargs['write_check'] = write_check
+        try:
+            return send(payload=payload, **kwargs)
+        finally:
+            self._invalidate(endpoint.invalidated(obj))
+
+    def call(self, endpoint, obj=None, page_size=None, concurrency=None, timeout=None, **fields):
+        """
+        Call any registered endpoint the way its spec describes: paged endpoints are
+        listed in full, cacheable lookups go through the cache, writes are retried only
+        when idempotent and invalidate the cached lookups they make stale.
+        :param endpoint: endpoint name, see endpoints.ENDPOINTS
+        :param obj: input fields
+        :param page_size: overrides the client page size of paged endpoints
+        :param concurrency: overrides the client page concurrency of paged endpoints
+        :param timeout: seconds allowed for a paged listing
+        :return:
+        """
+        endpoint = get_endpoint(endpoint)
+        obj = merge(obj, fields)
+        if endpoint.paged:
+            return self._list_all(endpoint.build(obj, page_size or self.page_size), concurrency, timeout)
+        if endpoint.method == "GET":
+            return self._read(endpoint, obj)
+        return self._write(endpoint, obj)
+
+    def _created_check(self, payload, name):
+        """
+        write_check for an add call: the detail record when an object of that name exists
+        """
+        def check():
+            return created(self._lookup(payload), name)
+        return check
+
+    def _added_check(self, payload, address):
+        """
+        write_check for /object/add: None when the address is still free, see operations.not_added
+        """
+        def check():
+            return not_added(self.connector.get_object(payload=payload), address)
+        return check
+
+    def _deleted_check(self, lookup_payloads):
+        """
+        write_check for a delete call: successful when none of the objects can be found any more
+        """
+        def check():
+            if all(self._lookup(payload) is None for payload in lookup_payloads):
+                return SUCCESS
+            return None
+        return check
+
+    def create_network(self, network=None, **fields):
+        """
+        Create network with the given ip.
+        :param network:
+        :return:
+        """
+        network = merge(network, fields)
+        payload, lookup, name = create_network_request(network)
+        return self._write(payloads.NETWORK_ADD, network, payload, self._created_check(lookup, name))
+
+    def get_network_detail(self, network=None, raw=False, **fields):
+        """
+        Given a network ip get all the details.
+        :param network:
+        :param raw: return the undecoded response body, bypassing the cache
+        :return:
+        """
+        return self._read(payloads.NETWORK_DETAILS_BY_IP, merge(network, fields), raw)
+
+    def list_all_networks(self, network=None, page_size=None, concurrency=None, timeout=None, **fields):
+        """
+        List all networks visible to the user.
+        :param network:
+        :param page_size: overrides the client page size
+        :param concurrency: overrides the client page concurrency
+        :param timeout: seconds allowed for the whole listing including retries, DeadlineExceededException
+                        is raised when it is not done by then
+        :return:
+        """
+        payload = payloads.network_paged(merge(network, fields), page_size or self.page_size)
+        return self._list_all(payload, concurrency, timeout)
+
+    def iter_networks(self, network=None, start=0, page_size=None, **fields):
+        """
+        Yield networks visible to the user page by page, prefetching the next page.
+        :param network:
+        :param start: offset to resume the listing from
+        :param page_size: overrides the client page size
+        :return:
+        """
+        payload = payloads.network_paged(merge(network, fields), page_size or self.page_size)
+        return iter_records(self.connector, payload, start=start, retries=self.page_retries)
+
+    def delete_network(self, network=None, **fields):
+        """
+        Deletes the given network
+        :param network:
+        :return:
+        """
+        network = merge(network, fields)
+        check = self._deleted_check(delete_network_lookups(network))
+        return self._write(payloads.NETWORK_DELETE, network, write_check=check)
+
+    def create_subnet(self, subnet=None, **fields):
+        """
+        Creates the given subnet in the given network
+        :param subnet:
+        :return:
+        """
+        subnet = merge(subnet, fields)
+        payload, lookup, name = create_subnet_request(subnet)
+        return self._write(payloads.SUBNET_ADD, subnet, payload, self._created_check(lookup, name))
+
+    def get_subnet_detail(self, subnet=None, raw=False, **fields):
+        """
+        Given a subnet ip get all the details.
+        :param subnet:
+        :param raw: return the undecoded response body, bypassing the cache
+        :return:
+        """
+        return self._read(payloads.SUBNET_DATA, merge(subnet, fields), raw)
+
+    def list_all_subnets(self, subnet=None, page_size=None, concurrency=None, timeout=None, **fields):
+        """
+        List all Subnets of the given network visible to the user.
+        :param subnet:
+        :param page_size: overrides the client page size
+        :param concurrency: overrides the client page concurrency
+        :param timeout: seconds allowed for the whole listing including retries, DeadlineExceededException
+                        is raised when it is not done by then
+        :return:
+        """
+        payload = payloads.subnet_paged(merge(subnet, fields), page_size or self.page_size)
+        return self._list_all(payload, concurrency, timeout)
+
+    def iter_subnets(self, subnet=None, start=0, page_size=None, **fields):
+        """
+        Yield subnets of the given network page by page, prefetching the next page.
+        :param subnet:
+        :param start: offset to resume the listing from
+        :param page_size: overrides the client page size
+        :return:
+        """
+        payload = payloads.subnet_paged(merge(subnet, fields), page_size or self.page_size)
+        return iter_records(self.connector, payload, start=start, retries=self.page_retries)
+
+    def delete_subnet(self, subnet=None, **fields):
+        """
+        Deletes the given subnet
+        :param subnet:
+        :return:
+        """
+        subnet = merge(subnet, fields)
+        check = self._deleted_check(delete_subnet_lookups(subnet))
+        return self._write(payloads.SUBNET_DELETE, subnet, write_check=check)
+
+    def get_next_available_ip(self, subnet=None, **fields):
+        """
+        Return next free ip in given subnet.
+        :param subnet:
+        :return:
+        """
+        return next_free_address(self._read(payloads.NEXT_FREE_IP, merge(subnet, fields)))
+
+    def release_ip(self, ip_obj=None, **fields):
+        """
+        Deletes the ip object.
+        :param ip_obj:
+        :return:
+        """
+        return self._write(payloads.RECLAIM_OBJECTS, merge(ip_obj, fields))
+
+    def create_ip(self, ip_obj=None, **fields):
+        """
+        Creates the ip object. The API cannot look up ip objects, so an
+        ambiguous failure (e.g. 504) is only retried when the address is still
+        the next free one of its subnet, otherwise it is raised.
+        :param ip_obj:
+        :return:
+        """
+        ip_obj = merge(ip_obj, fields)
+        payload, lookup, address = create_ip_request(ip_obj)
+        return self._write(payloads.OBJECT_ADD, ip_obj, payload, self._added_check(lookup, address))
+
+    def create_ips(self, ip_objs, concurrency=None, timeout=None, **defaults):
+        """
+        Creates many ip objects. The addresses of all objects are normalized in
+        one batch, then all /object/add bodies are validated and built before
+        the first request is sent, then submitted concurrently.
+        :param ip_objs: iterable of dicts as accepted by create_ip
+        :param concurrency: overrides the client bulk concurrency
+        :param timeout: seconds allowed for the whole batch, objects not created by then fail with
+                        DeadlineExceededException
+        :param defaults: fields shared by all objects, e.g. organization_name, subnet_address
+        :return: BulkResult keyed by the position of each object
+        """
+        total, prepared, errors = prepare_ips(ip_objs, defaults)
+        conn = self.connector
+        try:
+            return run_bulk(lambda payload: conn.create_object(payload=payload), prepared, total,
+                            concurrency=concurrency or self.bulk_concurrency, errors=errors, timeout=timeout)
+        finally:
+            self._invalidate(added_addresses(prepared))
+
+    def release_ips(self, addresses, organization_name, chunk_size=None, concurrency=None, timeout=None):
+        """
+        Deletes many ip objects. Addresses are grouped into addressArray chunks
+        of /object/reclaimObjects and the chunks are sent concurrently. A chunk
+        rejected with a 4xx status is split in halves and resent until the
+        addresses the appliance refuses are isolated, so only those fail.
+        :param addresses: list of ip addresses
+        :param organization_name:
+        :param chunk_size: overrides the client release chunk size
+        :param concurrency: overrides the client bulk concurrency
+        :param timeout: seconds allowed for the whole batch
+        :return: BulkResult keyed by the position of each address, use failed_items(addresses)
+                 to get the addresses that were not released
+        """
+        addresses = list(addresses)
+        prepared, chunk_positions, errors = release_chunks(addresses, organization_name,
+                                                           chunk_size or self.release_chunk_size)
+        conn = self.connector
+
+        def release(payload):
+            return send_split(lambda part: conn.delete_object(payload=part),
+                              lambda part: release_payload(part, organization_name),
+                              payload['body']['addressArray'], rejected)
+        try:
+            result = run_bulk(release, prepared, len(prepared), concurrency=concurrency or self.bulk_concurrency,
+                              timeout=timeout)
+        finally:
+            self._invalidate(released_addresses(prepared))
+        result = spread(result, chunk_positions, len(addresses))
+        result.errors.update(errors)
+        return result
+
+    def ip_allocator(self, subnet_address, organization_name, **kwargs):
+        """
+        Create an IPAllocator handing out addresses of the given subnet
+        :param subnet_address:
+        :param organization_name:
+        :param kwargs: passed to IPAllocator (batch_size, low_water, max_attempts, background)
+        :return:
+        """
+        return IPAllocator(self, subnet_address, organization_name, **kwargs)
+
+    def subnet_allocator(self, network_address, organization_name, **kwargs):
+        """
+        Create a SubnetAllocator carving new subnets out of the given network
+        :param network_address:
+        :param organization_name:
+        :param kwargs: passed to SubnetAllocator (best_fit, max_attempts)
+        :return:
+        """
+        return SubnetAllocator(self, network_address, organization_name, **kwargs)
+
+    def mirror(self, path=':memory:', **kwargs):
+        """
+        Create an InventoryMirror keeping a local SQLite copy of the networks and subnets
+        :param path: SQLite database file
+        :param kwargs: passed to InventoryMirror (page_size, concurrency)
+        :return:
+        """
+        return InventoryMirror(self, path, **kwargs)
+
+    def reconciler(self, **kwargs):
+        """
+        Create a Reconciler bringing the appliance to a declared state
+        :param kwargs: passed to Reconciler (concurrency, prune, current_ips)
+        :return:
+        """
+        return Reconciler(self, **kwargs)
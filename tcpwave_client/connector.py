@@ -1,15 +1,31 @@
-import requests
-import json
+import threading
+import time
 from requests.auth import HTTPBasicAuth
 from requests import Session
-from tcpwave_client import (APICallFailedException, UnsupportedMethodException)
+from requests.exceptions import RequestException
+from tcpwave_client import (APICallFailedException, DeadlineExceededException, UnsupportedMethodException)
+from tcpwave_client.deadlines import bounded
+from tcpwave_client.deadlines import check_deadline
+from tcpwave_client.deadlines import current_deadline
+from tcpwave_client.hooks import RequestInfo
+from tcpwave_client.hooks import TimedHTTPAdapter
+from tcpwave_client.hooks import connect_time
+from tcpwave_client.hooks import emit
+from tcpwave_client.hooks import reset_connect_time
+from tcpwave_client.retry import call_with_retry
+from tcpwave_client.serializer import as_serializer
+from tcpwave_client.singleflight import request_key
+from tcpwave_client.throttle import OVERLOAD_STATUSES
 
 
 class Connector(object):
     """
         Class to handle connection to Tcpwave's IPAM
     """
-    def __init__(self, cert=None, key=None, user=None, password=None, verify=False):
+    def __init__(self, cert=None, key=None, user=None, password=None, verify=False, host=None,
+                 pool_connections=10, pool_maxsize=10, max_retries=3, port=7443, hooks=(),
+                 retry=None, limiter=None, concurrency=None, breaker=None, connect_timeout=10.0,
+                 read_timeout=120.0, single_flight=None, serializer=None):
         """
         creates connector object either with client certificates or with client credentials
         :param cert:
@@ -17,6 +33,20 @@ class Connector(object):
         :param user:
         :param password:
         :param verify:
+        :param host: IPAM host, when not given it is taken from payload['provider']['host']
+        :param pool_connections: number of connection pools to cache
+        :param pool_maxsize: maximum number of keep-alive connections per pool
+        :param max_retries: immediate retries of failed connection attempts, not used when retry is given
+        :param port: IPAM rest port
+        :param hooks: RequestHook instances called around every request, see add_hook
+        :param retry: RetryPolicy applied to every call
+        :param limiter: RateLimiter every request waits for, share it to limit several connectors together
+        :param concurrency: AdaptiveConcurrency limiting the requests in flight per host
+        :param breaker: CircuitBreaker failing calls at once while the host is down
+        :param connect_timeout: seconds allowed for opening a connection, None waits forever
+        :param read_timeout: seconds allowed between two bytes of the response, None waits forever
+        :param single_flight: SingleFlight letting concurrent identical GETs share one request
+        :param serializer: json serializer or backend name (orjson, ujson, json), default: fastest installed
         """
         self.session = Session()
         if cert is not None or key is not None:
@@ -26,93 +56,253 @@ class Connector(object):
         else:
             raise Exception("Missing certificates or user credentials")
 
-        adapter = requests.adapters.HTTPAdapter(
-            pool_connections=10,
-            pool_maxsize=10,
-            max_retries=3
+        adapter = TimedHTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=max_retries if retry is None else 0
         )
         self.session.mount('http://', adapter)
         self.session.mount('https://', adapter)
         self.session.verify = verify
-        self.url = "https://%s:7443/tims/rest%s"
+        self.host = host
+        self.url = "https://%s:" + str(port) + "/tims/rest%s"
+        self.closed = False
+        self.last_used = time.monotonic()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.hooks = tuple(hooks)
+        self.retry = retry
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.breaker = breaker
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.single_flight = single_flight
+        self.serializer = as_serializer(serializer)
+        self._identity = (cert, key, user)
 
-    def __construct_url(self, server, rel_url):
-        self.url = str(self.url) % (server, rel_url)
+    def __enter__(self):
+        return self
 
-    def get_object(self, payload):
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the underlying session and all of its keep-alive connections.
+        :return:
+        """
+        self.closed = True
+        self.session.close()
+
+    @property
+    def in_flight(self):
+        """
+        Number of requests currently being made through this connector
+        :return:
+        """
+        return self._in_flight
+
+    def __construct_url(self, payload):
+        return self.url % (self.host or payload['provider']['host'], payload['rel_url'])
+
+    def __begin(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def __end(self):
+        with self._lock:
+            self._in_flight -= 1
+            self.last_used = time.monotonic()
+
+    def add_hook(self, hook):
+        """
+        Register a RequestHook called around every request made through this connector
+        :param hook:
+        :return:
+        """
+        with self._lock:
+            self.hooks = self.hooks + (hook,)
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self.hooks = tuple(h for h in self.hooks if h is not hook)
+
+    def __send(self, method, url, payload, data):
+        if self.breaker is None and self.limiter is None and self.concurrency is None:
+            return self.__request(method, url, payload, data)
+        host = self.host or payload['provider']['host']
+        breaker = self.breaker
+        if breaker is None:
+            return self.__send_throttled(host, method, url, payload, data)
+        check_deadline()
+        breaker.before(host)
+        try:
+            rsp = self.__send_throttled(host, method, url, payload, data)
+        except DeadlineExceededException:
+            breaker.release(host)
+            raise
+        except Exception:
+            breaker.record_failure(host)
+            raise
+        breaker.record(host, rsp.status_code)
+        return rsp
+
+    def __send_throttled(self, host, method, url, payload, data):
+        if self.limiter is not None and not self.limiter.acquire(host, method, bounded(None)):
+            raise DeadlineExceededException("Deadline exceeded waiting for the rate limit of %s" % host)
+        concurrency = self.concurrency
+        if concurrency is None:
+            return self.__request(method, url, payload, data)
+        if not concurrency.acquire(host, bounded(None)):
+            raise DeadlineExceededException("Deadline exceeded waiting for a request slot of %s" % host)
+        latency = None
+        overloaded = True
+        try:
+            start = time.perf_counter()
+            rsp = self.__request(method, url, payload, data)
+            latency = time.perf_counter() - start
+            overloaded = rsp.status_code in OVERLOAD_STATUSES
+            return rsp
+        except DeadlineExceededException:
+            overloaded = False
+            raise
+        finally:
+            concurrency.release(host, latency, overloaded)
+
+    def __request(self, method, url, payload, data):
+        # both timeouts are cut to what is left of the caller's deadline
+        timeout = (bounded(self.connect_timeout), bounded(self.read_timeout))
+        self.__begin()
+        try:
+            return self.session.request(method, url, headers=payload.get('headers'), params=payload.get('params'),
+                                        data=data, verify=self.session.verify, timeout=timeout)
+        except RequestException:
+            # a timeout cut short by the deadline is reported as such
+            check_deadline()
+            raise
+        finally:
+            self.__end()
+
+    def __call(self, method, payload, data, accepted, decode, idempotent=True, write_check=None):
+        url = self.__construct_url(payload)
+        if self.retry is None:
+            return self.__attempt(method, url, payload, data, accepted, decode)
+        current = current_deadline()
+        return call_with_retry(self.retry, lambda: self.__attempt(method, url, payload, data, accepted, decode),
+                               idempotent=idempotent, write_check=write_check,
+                               deadline=current.expires if current is not None else None)
+
+    def __attempt(self, method, url, payload, data, accepted, decode):
+        hooks = self.hooks
+        if not hooks:
+            rsp = self.__send(method, url, payload, data)
+            if rsp.status_code in accepted:
+                return decode(rsp)
+            raise self.__failure(rsp)
+        return self.__call_instrumented(hooks, method, url, payload, data, accepted, decode)
+
+    @staticmethod
+    def __failure(rsp):
+        return APICallFailedException("API call failed. Msg :: "+str(rsp.content.decode("utf-8")),
+                                      status_code=rsp.status_code, headers=rsp.headers)
+
+    def __call_instrumented(self, hooks, method, url, payload, data, accepted, decode):
+        info = RequestInfo(method, payload['rel_url'], url, len(data) if data else 0)
+        emit(hooks, 'before_request', info)
+        reset_connect_time()
+        timings = info.timings
+        try:
+            start = time.perf_counter()
+            rsp = self.__send(method, url, payload, data)
+            received = time.perf_counter()
+            info.status = rsp.status_code
+            info.response_bytes = len(rsp.content)
+            timings['connect'] = connect_time()
+            # rsp.elapsed covers sending the request up to parsing the response headers
+            timings['server'] = max(rsp.elapsed.total_seconds() - timings['connect'], 0.0)
+            timings['download'] = max(received - start - rsp.elapsed.total_seconds(), 0.0)
+            if rsp.status_code not in accepted:
+                raise self.__failure(rsp)
+            data = decode(rsp)
+            timings['decode'] = time.perf_counter() - received
+        except Exception as ex:
+            timings['total'] = time.perf_counter() - info.start
+            info.error = ex
+            emit(hooks, 'on_error', info, ex)
+            raise
+        timings['total'] = time.perf_counter() - info.start
+        emit(hooks, 'after_response', info)
+        return data
+
+    def __decode_get(self, rsp):
+        if len(rsp.content):
+            try:
+                data = self.serializer.loads(rsp.content)
+            except Exception:
+                data = rsp.content
+            return data
+
+    def __decode_write(self, rsp):
+        if len(rsp.content):
+            return self.serializer.loads(rsp.content)
+        else:
+            return '{"msg": "Successful"}'
+
+    @staticmethod
+    def __decode_raw(rsp):
+        return rsp.content
+
+    def get_object(self, payload, raw=False):
         """
         Make GET call
         :param payload:
+        :param raw: return the response body as bytes without decoding it
         :return:
         """
-        if '%s' in self.url:
-            self.__construct_url(payload['provider']['host'], payload['rel_url'])
-        rsp = self.session.get(url=self.url, headers=payload.get('headers'), params=payload.get('params'))
-        status_code = rsp.status_code
-        if status_code == 200:
-            if len(rsp.content):
-                try:
-                    data = rsp.json()
-                except Exception:
-                    data = rsp.content
-                return data
-        else:
-            raise APICallFailedException("API call failed. Msg :: "+str(rsp.content.decode("utf-8")))
+        decode = self.__decode_raw if raw else self.__decode_get
+        single_flight = self.single_flight
+        if single_flight is None:
+            return self.__call("GET", payload, None, (200,), decode)
+        key = (request_key(self._identity, self.__construct_url(payload), payload.get('params')), raw)
+        return single_flight.do(key, lambda: self.__call("GET", payload, None, (200,), decode))
 
-    def create_object(self, payload):
+    def __write(self, method, payload, accepted, idempotent, write_check):
+        try:
+            return self.__call(method, payload, self.serializer.dumps(payload.get('body')), accepted,
+                               self.__decode_write, idempotent, write_check)
+        finally:
+            if self.single_flight is not None:
+                # reads in flight may have missed the write, later reads must not join them
+                self.single_flight.forget()
+
+    def create_object(self, payload, idempotent=None, write_check=None):
         """
         Make PUT/POST call to create/update object
         :param payload:
+        :param idempotent: whether the call may be repeated, defaults to True for PUT only
+        :param write_check: callable run when a non-idempotent call failed ambiguously, returning
+                            the call result when the write already happened, else None
         :return:
         """
         method = payload['method']
         if method not in ["PUT", "POST"]:
             raise UnsupportedMethodException("method %s not supported" % method)
+        if idempotent is None:
+            idempotent = method == "PUT"
+        return self.__write(method, payload, (200, 201), idempotent, write_check)
 
-        if '%s' in self.url:
-            self.__construct_url(payload['provider']['host'], payload['rel_url'])
-
-        if method == "POST":
-            rsp = self.session.post(url=self.url, headers=payload.get('headers'), params=payload.get('params'),
-                                    data=json.dumps(payload.get('body')))
-        else:
-            rsp = self.session.put(url=self.url, headers=payload.get('headers'), params=payload.get('params'),
-                                   data=json.dumps(payload.get('body')))
-
-        status_code = rsp.status_code
-        if status_code == 200 or status_code == 201:
-            if len(rsp.content):
-                return rsp.json()
-            else:
-                return '{"msg": "Successful"}'
-        else:
-            raise APICallFailedException("API call failed. Msg :: "+str(rsp.content.decode("utf-8")))
-
-    def delete_object(self, payload):
+    def delete_object(self, payload, idempotent=None, write_check=None):
         """
         Make DELETE call to remove object.
         :param payload:
+        :param idempotent: whether the call may be repeated, defaults to True for DELETE only
+        :param write_check: see create_object
         :return:
         """
-        if '%s' in self.url:
-            self.__construct_url(payload['provider']['host'], payload['rel_url'])
-
         method = payload['method']
         if method not in ["POST", "DELETE"]:
             raise UnsupportedMethodException("method %s not supported" % method)
-
-        if method == "POST":
-            rsp = self.session.post(url=self.url, headers=payload.get('headers'), params=payload.get('params'),
-                                    data=json.dumps(payload.get('body')))
-        else:
-            rsp = self.session.delete(url=self.url, headers=payload.get('headers'), params=payload.get('params'),
-                                      data=json.dumps(payload.get('body')))
-
-        status_code = rsp.status_code
-        if status_code == 200:
-            if len(rsp.content):
-                return rsp.json()
-            else:
-                return '{"msg": "Successful"}'
-        else:
-            raise APICallFailedException("API call failed. Msg :: "+str(rsp.content.decode("utf-8")))
+        if idempotent is None:
+            idempotent = method == "DELETE"
+        return self.__write(method, payload, (200,), idempotent, write_check)
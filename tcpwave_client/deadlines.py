@@ -0,0 +1,118 @@
+import contextlib
+import contextvars
+import time
+
+from tcpwave_client.exceptions import DeadlineExceededException
+
+_current = contextvars.ContextVar('tims_deadline', default=None)
+
+
+class Deadline(object):
+    """
+    Point in time (time.monotonic()) by which a whole operation must be done,
+    including its retries, pages and bulk items.
+    """
+    __slots__ = ('expires',)
+
+    def __init__(self, seconds):
+        """
+        :param seconds: time allowed from now
+        """
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self):
+        """
+        Raise DeadlineExceededException once the deadline passed
+        :return: seconds remaining
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceededException("Deadline exceeded by %.3fs" % -remaining)
+        return remaining
+
+    def __repr__(self):
+        return "Deadline(remaining=%.3f)" % self.remaining()
+
+
+def current_deadline():
+    """
+    Deadline of the running operation, None when there is none
+    :return:
+    """
+    return _current.get()
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """
+    Bound every IPAM call made inside the block, e.g.
+    with deadline(30): client.list_all_subnets(...)
+    Request timeouts are capped at the remaining time, no retry is started
+    that would end after it and DeadlineExceededException is raised once it
+    passed. Nested deadlines never extend the outer one. The deadline follows
+    the call into the worker threads of paging and bulk operations and into
+    asyncio tasks. None disables the block.
+    :param seconds:
+    :return: the effective Deadline, or the outer one when seconds is None
+    """
+    outer = _current.get()
+    if seconds is None:
+        yield outer
+        return
+    inner = Deadline(seconds)
+    if outer is not None and outer.expires < inner.expires:
+        inner = outer
+    token = _current.set(inner)
+    try:
+        yield inner
+    finally:
+        _current.reset(token)
+
+
+def check_deadline():
+    """
+    Raise DeadlineExceededException when the current deadline passed
+    :return: seconds remaining, None without a deadline
+    """
+    current = _current.get()
+    if current is None:
+        return None
+    return current.check()
+
+
+def time_left():
+    """
+    Seconds left before the current deadline, at least 0, None without a deadline
+    :return:
+    """
+    current = _current.get()
+    if current is None:
+        return None
+    return max(current.remaining(), 0.0)
+
+
+def bounded(timeout):
+    """
+    timeout capped at the time left before the current deadline
+    :param timeout: seconds or None
+    :return:
+    """
+    remaining = check_deadline()
+    if remaining is None:
+        return timeout
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def submit(executor, func, *args):
+    """
+    executor.submit running func in a copy of the caller's context, so
+    worker threads see its deadline
+    """
+    return executor.submit(contextvars.copy_context().run, func, *args)
@@ -0,0 +1,189 @@
+from tcpwave_client.cache import cache_key
+from tcpwave_client.exceptions import IPAMException
+
+JSON_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept-Type": "application/json"
+}
+TEXT_HEADERS = {
+    "Content-Type": "text/plain",
+    "Accept-Type": "application/json"
+}
+
+_REQUIRED = 'required'
+_OPTIONAL = 'optional'
+_COMPUTED = 'computed'
+_CONSTANT = 'constant'
+
+
+def required(key, source=None):
+    """
+    Field copied from the input object, which must have it
+    :param key: payload key
+    :param source: input key, defaults to key
+    :return:
+    """
+    return _REQUIRED, key, source or key, None
+
+
+def optional(key, default, source=None):
+    """
+    Field copied from the input object, default when it is missing or empty
+    :param key: payload key
+    :param default:
+    :param source: input key, defaults to key
+    :return:
+    """
+    return _OPTIONAL, key, source or key, default
+
+
+def computed(key):
+    """
+    Field filled in by the compute function of the endpoint
+    :param key: payload key
+    :return:
+    """
+    return _COMPUTED, key, None, None
+
+
+def constant(key, value):
+    """
+    Field with the same value in every call
+    :param key: payload key
+    :param value:
+    :return:
+    """
+    return _CONSTANT, key, None, value
+
+
+class Endpoint(object):
+    """
+    Declarative description of a TIMS REST endpoint. The payload skeleton,
+    headers and defaults are compiled once into templates that build()
+    shallow-copies, so a call only fills in the fields that depend on its
+    input. Payloads share the header dict and must not be modified in place.
+    The remaining attributes describe how the client treats the endpoint:
+    paging, retries, caching, batching and cache invalidation.
+    """
+    def __init__(self, name, method, rel_url, fields=(), compute=None, paged=False, idempotent=None, delete=False,
+                 cache=None, cache_fields=None, batch=None, invalidates=()):
+        """
+        :param name: registry key and name of the payload builder
+        :param method: http method
+        :param rel_url:
+        :param fields: required/optional/computed/constant fields of the body, or of the params for GET,
+                       in payload order
+        :param compute: callable (obj, *args, **kwargs) returning the computed fields as a dict
+        :param paged: whether the endpoint is read page by page through start/length params
+        :param idempotent: whether a failed call may be repeated, None for the default of the method
+        :param delete: whether the call removes objects, otherwise writes create them
+        :param cache: cache kind (cache.NETWORK, cache.SUBNET) of a cacheable lookup
+        :param cache_fields: (organization field, address field) of the input identifying the cached record
+        :param batch: payload key of the address array when one call acts on many objects
+        :param invalidates: input fields holding the addresses or prefixes whose cached lookups a call makes stale
+        """
+        self.name = name
+        self.method = method
+        self.rel_url = rel_url
+        self.fields = tuple(fields)
+        self.compute = compute
+        self.paged = paged
+        self.idempotent = method in ("GET", "PUT", "DELETE") if idempotent is None else idempotent
+        self.delete = delete
+        self.cache = cache
+        self.cache_fields = cache_fields
+        self.batch = batch
+        self.invalidates = tuple(invalidates)
+        self.location = "params" if method == "GET" else "body"
+        self._payload = {
+            "method": method,
+            "rel_url": rel_url,
+            "headers": TEXT_HEADERS if method == "GET" else JSON_HEADERS
+        }
+        self._data = dict((key, default) for _, key, _, default in self.fields)
+        self._required = tuple((key, source) for kind, key, source, _ in self.fields if kind == _REQUIRED)
+        # optional fields are looked up from the keys the input has, usually far fewer than the defaults
+        self._optional = {}
+        for kind, key, source, _ in self.fields:
+            if kind == _OPTIONAL:
+                self._optional[source] = self._optional.get(source, ()) + (key,)
+        # mutable defaults are copied so payloads never share them
+        self._fresh = tuple((key, type(default)) for kind, key, _, default in self.fields
+                            if kind == _OPTIONAL and isinstance(default, (list, dict)))
+
+    def __repr__(self):
+        return "Endpoint(%s %s %s)" % (self.name, self.method, self.rel_url)
+
+    def build(self, obj, *args, **kwargs):
+        """
+        Build the payload of one call
+        :param obj: input fields
+        :param args: passed to compute
+        :param kwargs: passed to compute
+        :return:
+        """
+        data = self._data.copy()
+        for key, factory in self._fresh:
+            data[key] = factory()
+        for key, source in self._required:
+            data[key] = obj[source]
+        optional_keys = self._optional
+        for source, value in obj.items():
+            if value and source in optional_keys:
+                for key in optional_keys[source]:
+                    data[key] = value
+        if self.compute is not None:
+            data.update(self.compute(obj, *args, **kwargs))
+        payload = dict(self._payload)
+        payload[self.location] = data
+        return payload
+
+    def cache_key(self, host, obj):
+        """
+        Key of the cached response for the given input
+        :param host:
+        :param obj:
+        :return:
+        """
+        organization_field, address_field = self.cache_fields
+        return cache_key(host, self.cache, obj[organization_field], obj[address_field])
+
+    def invalidated(self, obj):
+        """
+        Addresses and prefixes whose cached lookups a call with the given input makes stale
+        :param obj:
+        :return:
+        """
+        res = []
+        for field in self.invalidates:
+            value = obj.get(field)
+            if isinstance(value, (list, tuple)):
+                res.extend(value)
+            elif value is not None:
+                res.append(value)
+        return res
+
+
+ENDPOINTS = {}
+
+
+def register(endpoint):
+    """
+    Add an endpoint to the registry, replacing one of the same name
+    :param endpoint:
+    :return: the endpoint
+    """
+    ENDPOINTS[endpoint.name] = endpoint
+    return endpoint
+
+
+def get_endpoint(name):
+    """
+    Registered endpoint of the given name
+    :param name:
+    :return:
+    """
+    try:
+        return ENDPOINTS[name]
+    except KeyError:
+        raise IPAMException("Unknown endpoint %s" % name)
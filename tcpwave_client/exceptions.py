@@ -7,9 +7,11 @@ class IPAMException(Exception):
 
 class APICallFailedException(IPAMException):
 
-    def __init__(self, msg):
+    def __init__(self, msg, status_code=None, headers=None):
         super(APICallFailedException, self).__init__(msg)
         self.msg = msg
+        self.status_code = status_code
+        self.headers = headers or {}
 
 
 class UnsupportedMethodException(IPAMException):
@@ -18,3 +20,18 @@ class UnsupportedMethodException(IPAMException):
         super(UnsupportedMethodException, self).__init__(msg)
         self.msg = msg
 
+
+class CircuitOpenException(IPAMException):
+
+    def __init__(self, msg, host=None, retry_in=None):
+        super(CircuitOpenException, self).__init__(msg)
+        self.msg = msg
+        self.host = host
+        self.retry_in = retry_in
+
+
+class DeadlineExceededException(IPAMException):
+
+    def __init__(self, msg):
+        super(DeadlineExceededException, self).__init__(msg)
+        self.msg = msg
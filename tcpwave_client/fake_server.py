@@ -0,0 +1,535 @@
+"""
+In-process stand-in for the TIMS rest api, for offline tests and benchmarks.
+
+    with FakeTimsServer(latency=0.005, error_rate=0.01) as server:
+        client = TimsClient.from_provider(server.provider)
+
+The server speaks HTTPS on an ephemeral port, requires a client certificate
+signed by its own generated CA and keeps networks, subnets and ip objects
+in memory. Certificates are generated with the openssl command line tool.
+"""
+import collections
+import ipaddress
+import json
+import os
+import random
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from tcpwave_client.exceptions import IPAMException
+
+REST_PREFIX = '/tims/rest'
+
+
+def _openssl(*args):
+    subprocess.check_call(('openssl',) + args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def generate_certificates(directory):
+    """
+    Generate a CA plus server and client certificates signed by it.
+    :param directory:
+    :return: dict of file paths: ca, server_cert, server_key, client_cert, client_key
+    """
+    if shutil.which('openssl') is None:
+        raise IPAMException("openssl is required to generate certificates for FakeTimsServer")
+    paths = dict((name, os.path.join(directory, name)) for name in (
+        'ca.crt', 'ca.key', 'server.crt', 'server.key', 'server.csr', 'client.crt', 'client.key', 'client.csr'))
+    _openssl('req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '2', '-subj', '/CN=Fake TIMS CA',
+             '-keyout', paths['ca.key'], '-out', paths['ca.crt'])
+    ext_file = os.path.join(directory, 'server.ext')
+    with open(ext_file, 'w') as ext:
+        ext.write("subjectAltName = IP:127.0.0.1, IP:::1, DNS:localhost\n")
+    for name, cn, extra in (('server', 'localhost', ('-extfile', ext_file)), ('client', 'tims-python-client', ())):
+        _openssl('req', '-newkey', 'rsa:2048', '-nodes', '-subj', '/CN=%s' % cn,
+                 '-keyout', paths[name + '.key'], '-out', paths[name + '.csr'])
+        _openssl('x509', '-req', '-days', '2', '-in', paths[name + '.csr'], '-CA', paths['ca.crt'],
+                 '-CAkey', paths['ca.key'], '-CAcreateserial', '-out', paths[name + '.crt'], *extra)
+    return {
+        'ca': paths['ca.crt'],
+        'server_cert': paths['server.crt'],
+        'server_key': paths['server.key'],
+        'client_cert': paths['client.crt'],
+        'client_key': paths['client.key']
+    }
+
+
+class ApiError(Exception):
+
+    def __init__(self, msg, status=400):
+        super(ApiError, self).__init__(msg)
+        self.msg = msg
+        self.status = status
+
+
+class FakeTimsState(object):
+    """
+    In-memory IPAM data behind FakeTimsServer. Methods mirror the rest
+    endpoints and raise ApiError where the appliance would reject a call.
+    """
+    def __init__(self):
+        self.networks = {}
+        self.subnets = {}
+        self.objects = {}
+        self.lock = threading.RLock()
+        self._listings = {}
+        self._by_address = {}
+
+    @staticmethod
+    def _network(address, mask=None):
+        if mask is not None:
+            address = "%s/%s" % (address, mask)
+        try:
+            return ipaddress.ip_network(address, strict=False)
+        except ValueError as ex:
+            raise ApiError(str(ex))
+
+    def _parent_network(self, org, network):
+        for (n_org, prefix), record in self.networks.items():
+            if n_org == org and network.subnet_of(prefix):
+                return prefix, record
+        return None, None
+
+    def add_network(self, org, address, mask=None, name=None, **extra):
+        network = self._network(address, mask)
+        with self.lock:
+            for (n_org, prefix) in self.networks:
+                if n_org == org and prefix.overlaps(network):
+                    raise ApiError("Network %s overlaps with existing network %s" % (network, prefix))
+            record = dict(extra)
+            record.update({
+                'name': name or str(network),
+                'address': str(network.network_address),
+                'mask_length': network.prefixlen,
+                'fullAddress': str(network),
+                'organization_name': org
+            })
+            self.networks[(org, network)] = record
+            return record
+
+    def network_details(self, org, address):
+        network = self._network(address)
+        with self.lock:
+            prefix, record = self._parent_network(org, network)
+            if record is None:
+                raise ApiError("Network with address %s does not exist" % address)
+            return record
+
+    def delete_network(self, org, address):
+        network = self._network(address)
+        with self.lock:
+            prefix, record = self._parent_network(org, network)
+            if record is None:
+                raise ApiError("Network with address %s does not exist" % address)
+            for (s_org, subnet) in self.subnets:
+                if s_org == org and subnet.subnet_of(prefix):
+                    raise ApiError("Network %s has subnets" % prefix)
+            del self.networks[(org, prefix)]
+
+    def list_networks(self):
+        with self.lock:
+            return sorted(self.networks.values(), key=lambda record: record['name'])
+
+    def add_subnet(self, org, address, mask=None, name=None, router_address=None, primary_domain=None, **extra):
+        subnet = self._network(address, mask)
+        with self.lock:
+            parent, _ = self._parent_network(org, subnet)
+            if parent is None:
+                raise ApiError("No network found for subnet %s" % subnet)
+            for (s_org, prefix) in self.subnets:
+                if s_org == org and prefix.overlaps(subnet):
+                    raise ApiError("Subnet %s overlaps with existing subnet %s" % (subnet, prefix))
+            record = dict(extra)
+            record.update({
+                'name': name or str(subnet),
+                'address': str(subnet.network_address),
+                'mask_length': subnet.prefixlen,
+                'fullAddress': str(subnet),
+                'network_address': str(parent),
+                'organization_name': org,
+                'routerAddress': router_address,
+                'primary_domain': primary_domain
+            })
+            self.subnets[(org, subnet)] = record
+            self._by_address[(org, subnet.network_address)] = subnet
+            self._listings.clear()
+            return record
+
+    def seed_subnets(self, org, network_address, prefixlen, count):
+        """
+        Fill a network with count consecutive subnets, creating the network
+        when needed. Skips the per-subnet overlap checks of add_subnet so large
+        listings can be prepared quickly.
+        :return: list of created subnet records
+        """
+        network = self._network(network_address)
+        with self.lock:
+            if self._parent_network(org, network)[0] is None:
+                self.add_network(org, str(network))
+            records = []
+            for i, subnet in enumerate(network.subnets(new_prefix=prefixlen)):
+                if i == count:
+                    break
+                if (org, subnet) in self.subnets:
+                    continue
+                record = {
+                    'name': 'Subnet %d' % i,
+                    'address': str(subnet.network_address),
+                    'mask_length': subnet.prefixlen,
+                    'fullAddress': str(subnet),
+                    'network_address': str(network),
+                    'organization_name': org,
+                    'routerAddress': str(subnet.network_address + 1),
+                    'primary_domain': None
+                }
+                self.subnets[(org, subnet)] = record
+                self._by_address[(org, subnet.network_address)] = subnet
+                records.append(record)
+            self._listings.clear()
+            return records
+
+    def _subnet_by_address(self, org, address):
+        prefix = self._by_address.get((org, self._network(address).network_address))
+        if prefix is not None:
+            return prefix, self.subnets[(org, prefix)]
+        raise ApiError("Subnet with address %s does not exist" % address)
+
+    def subnet_data(self, org, address):
+        with self.lock:
+            return self._subnet_by_address(org, address)[1]
+
+    def list_subnets(self, org, network_address):
+        with self.lock:
+            prefix, _ = self._parent_network(org, self._network(network_address))
+            if prefix is None:
+                raise ApiError("Network with address %s does not exist" % network_address)
+            # paged requests walk the same listing page by page, sort it once per change
+            records = self._listings.get((org, prefix))
+            if records is None:
+                subnets = [(subnet, record) for (s_org, subnet), record in self.subnets.items()
+                           if s_org == org and subnet.subnet_of(prefix)]
+                records = self._listings[(org, prefix)] = [record for _, record in sorted(subnets,
+                                                                                          key=lambda item: item[0])]
+            return records
+
+    def delete_subnets(self, org, address_list):
+        with self.lock:
+            found = [self._subnet_by_address(org, address)[0] for address in address_list]
+            for subnet in found:
+                del self.subnets[(org, subnet)]
+                del self._by_address[(org, subnet.network_address)]
+                self._listings.clear()
+                for key in [key for key in self.objects if key[0] == org and key[1] in subnet]:
+                    del self.objects[key]
+
+    def next_free_ip(self, org, subnet_address):
+        with self.lock:
+            subnet, record = self._subnet_by_address(org, subnet_address)
+            router = record.get('routerAddress')
+            for address in subnet.hosts():
+                if (org, address) not in self.objects and str(address) != router:
+                    return str(address)
+            raise ApiError("No free IP address in subnet %s" % subnet)
+
+    def add_object(self, org, address, subnet_address, name=None, **extra):
+        ip = self._network(address).network_address
+        with self.lock:
+            subnet, _ = self._subnet_by_address(org, subnet_address)
+            if ip not in subnet:
+                raise ApiError("Address %s is not in subnet %s" % (ip, subnet))
+            if (org, ip) in self.objects:
+                raise ApiError("Object with address %s already exists" % ip)
+            record = dict(extra)
+            record.update({'name': name, 'address': str(ip), 'subnet_address': str(subnet),
+                           'organization_name': org})
+            self.objects[(org, ip)] = record
+            return record
+
+    def reclaim_objects(self, org, address_array):
+        with self.lock:
+            keys = [(org, self._network(address).network_address) for address in address_array]
+            missing = [str(key[1]) for key in keys if key not in self.objects]
+            if missing:
+                raise ApiError("Objects do not exist: %s" % ", ".join(missing))
+            for key in keys:
+                del self.objects[key]
+
+
+def _one(params, name, default=None):
+    values = params.get(name)
+    return values[0] if values else default
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeTIMS/1.0'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, content, content_type='application/json', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _dispatch(self, method):
+        fake = self.server.fake
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        body = None
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            raw = self.rfile.read(length)
+            try:
+                body = json.loads(raw.decode('utf-8'))
+            except ValueError:
+                self._send(400, b'{"msg": "Malformed json body"}')
+                return
+        rel_url = url.path[len(REST_PREFIX):] if url.path.startswith(REST_PREFIX) else None
+        fake.record_request(method, rel_url)
+        delay = fake.delay()
+        if delay:
+            time.sleep(delay)
+        failure = fake.next_failure()
+        if failure is not None and not failure['after_processing']:
+            self._send(failure['status'], b'{"msg": "Service temporarily unavailable"}', headers=failure['headers'])
+            return
+        route = fake.routes.get((method, rel_url))
+        if route is None:
+            self._send(404, json.dumps({'msg': 'No such endpoint %s %s' % (method, url.path)}).encode('utf-8'))
+            return
+        try:
+            rsp = route(params, body or {})
+            if failure is not None:
+                self._send(failure['status'], b'{"msg": "Gateway timeout"}', headers=failure['headers'])
+                return
+        except ApiError as ex:
+            self._send(ex.status, json.dumps({'msg': ex.msg}).encode('utf-8'))
+            return
+        except (KeyError, TypeError, ValueError) as ex:
+            self._send(400, json.dumps({'msg': 'Invalid request: %s' % ex}).encode('utf-8'))
+            return
+        if isinstance(rsp, str):
+            self._send(200, rsp.encode('utf-8'), 'text/plain')
+        elif rsp is None:
+            self._send(200, b'')
+        else:
+            self._send(200, json.dumps(rsp).encode('utf-8'))
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+
+class FakeTimsServer(object):
+    """
+    HTTPS stand-in for a TIMS appliance implementing the endpoints used by
+    this client. Latency, error rate and the maximum page size are
+    configurable so client performance can be measured reproducibly.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, max_page_size=None, seed=None,
+                 cert_dir=None, certs=None):
+        """
+        :param host: address to bind
+        :param port: port to bind, 0 picks a free port
+        :param latency: seconds added to every request, or (min, max) for uniformly random latency
+        :param error_rate: fraction of requests answered with 503
+        :param max_page_size: cap applied to the length of paged requests
+        :param seed: seed for latency and error injection
+        :param cert_dir: directory for generated certificates, a temporary directory by default
+        :param certs: certificates of another server to reuse, so one client certificate works for both
+        """
+        self.host = host
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_page_size = max_page_size
+        self.state = FakeTimsState()
+        self.request_counts = {}
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._failures = collections.deque()
+        self._tmpdir = None
+        if certs is None:
+            if cert_dir is None:
+                cert_dir = self._tmpdir = tempfile.mkdtemp(prefix='fake-tims-')
+            certs = generate_certificates(cert_dir)
+        self.certs = certs
+        self.routes = {
+            ('POST', '/network/add'): self._network_add,
+            ('GET', '/network/paged'): self._network_paged,
+            ('GET', '/network/detailsByIP'): self._network_details,
+            ('POST', '/network/delete'): self._network_delete,
+            ('POST', '/subnet/add'): self._subnet_add,
+            ('GET', '/subnet/paged'): self._subnet_paged,
+            ('GET', '/subnet/getSubnetData'): self._subnet_data,
+            ('POST', '/subnet/delete'): self._subnet_delete,
+            ('GET', '/object/getNextFreeIP'): self._next_free_ip,
+            ('POST', '/object/add'): self._object_add,
+            ('POST', '/object/reclaimObjects'): self._reclaim_objects,
+        }
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH, cafile=self.certs['ca'])
+        context.load_cert_chain(self.certs['server_cert'], self.certs['server_key'])
+        context.verify_mode = ssl.CERT_REQUIRED
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+        self.httpd.fake = self
+        self.port = self.httpd.server_address[1]
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def provider(self):
+        """
+        Provider dict pointing NetworkManager/TimsClient at this server
+        :return:
+        """
+        return {
+            'host': self.host,
+            'port': self.port,
+            'cert': self.certs['client_cert'],
+            'key': self.certs['client_key'],
+            'verify': self.certs['ca']
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-tims-server')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def wait_ready(self, timeout=5):
+        """
+        Block until the server accepts tcp connections
+        :param timeout:
+        :return:
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                socket.create_connection((self.host, self.port), timeout=0.5).close()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+
+    def record_request(self, method, rel_url):
+        with self._random_lock:
+            key = (method, rel_url)
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    def delay(self):
+        if isinstance(self.latency, (tuple, list)):
+            with self._random_lock:
+                return self._random.uniform(*self.latency)
+        return self.latency
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._random_lock:
+            return self._random.random() < self.error_rate
+
+    def fail_next(self, count=1, status=503, retry_after=None, after_processing=False):
+        """
+        Answer the next count requests with the given status
+        :param count:
+        :param status:
+        :param retry_after: value of a Retry-After header to send
+        :param after_processing: process the request before failing, like a gateway timing out
+                                 after the appliance applied a write
+        :return:
+        """
+        headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+        with self._random_lock:
+            for _ in range(count):
+                self._failures.append({'status': status, 'headers': headers, 'after_processing': after_processing})
+
+    def next_failure(self):
+        with self._random_lock:
+            if self._failures:
+                return self._failures.popleft()
+        if self.should_fail():
+            return {'status': 503, 'headers': {}, 'after_processing': False}
+        return None
+
+    def _page(self, records, params):
+        start = int(_one(params, 'start', 0))
+        length = int(_one(params, 'length', 10))
+        if self.max_page_size:
+            length = min(length, self.max_page_size)
+        if _one(params, 'order') == 'desc':
+            records = records[::-1]
+        return {
+            'recordsTotal': len(records),
+            'recordsFiltered': len(records),
+            'data': records[start:start + length]
+        }
+
+    def _network_add(self, params, body):
+        return self.state.add_network(body.get('organization_name'), body['address'], body['mask_length'],
+                                      body['name'], description=body.get('description'))
+
+    def _network_paged(self, params, body):
+        return self._page(self.state.list_networks(), params)
+
+    def _network_details(self, params, body):
+        return self.state.network_details(_one(params, 'organizationName'), _one(params, 'address'))
+
+    def _network_delete(self, params, body):
+        self.state.delete_network(body['organization_name'], body['address'])
+
+    def _subnet_add(self, params, body):
+        return self.state.add_subnet(body.get('organization_name'), body['network_address'], body['mask_length'],
+                                     body['name'], router_address=body.get('routerAddress'),
+                                     primary_domain=body.get('primary_domain'))
+
+    def _subnet_paged(self, params, body):
+        return self._page(self.state.list_subnets(_one(params, 'org_name'), _one(params, 'network_address')),
+                          params)
+
+    def _subnet_data(self, params, body):
+        return self.state.subnet_data(_one(params, 'org_name'), _one(params, 'subnet_address'))
+
+    def _subnet_delete(self, params, body):
+        self.state.delete_subnets(body['organizationName'], body['addressList'])
+
+    def _next_free_ip(self, params, body):
+        return self.state.next_free_ip(_one(params, 'org_name'), _one(params, 'subnet_addr'))
+
+    def _object_add(self, params, body):
+        return self.state.add_object(body['organization_name'], body['address'], body['subnet_address'],
+                                     body.get('name'), domain_name=body.get('domain_name'), mac=body.get('mac'))
+
+    def _reclaim_objects(self, params, body):
+        self.state.reclaim_objects(body['organization_name'], body['addressArray'])
@@ -0,0 +1,199 @@
+import bisect
+import ipaddress
+
+from tcpwave_client.prefix_index import record_prefix
+
+
+def _blocks(start, end, bits):
+    """
+    Largest aligned blocks covering the integer address range start..end
+    :return: list of (start, prefixlen)
+    """
+    res = []
+    while start <= end:
+        size = start & -start if start else 1 << bits
+        while size > end - start + 1:
+            size >>= 1
+        res.append((start, bits - size.bit_length() + 1))
+        start += size
+    return res
+
+
+class FreeSpace(object):
+    """
+    Free-block map of one network. The unused space is kept as its largest
+    aligned blocks, one sorted list of start addresses per prefix length,
+    like a buddy allocator. Finding a free prefix of a given length looks at
+    the head of at most one list per shorter length, so first_fit and
+    best_fit cost O(address bits) whatever the number of subnets. take,
+    reserve and release locate blocks by bisect but insert into and delete
+    from plain lists, which is linear in the number of free blocks of that
+    prefix length (a memmove, cheap next to the create call it precedes).
+    """
+    def __init__(self, network_address, used=()):
+        """
+        :param network_address: prefix of the network
+        :param used: prefixes already taken, e.g. the subnets of the network; prefixes outside it are ignored
+        """
+        self.network = ipaddress.ip_network(network_address, strict=False)
+        self._bits = self.network.max_prefixlen
+        self._free = dict((k, []) for k in range(self.network.prefixlen, self._bits + 1))
+        first, last = int(self.network.network_address), int(self.network.broadcast_address)
+        taken = []
+        for prefix in used:
+            prefix = ipaddress.ip_network(prefix, strict=False)
+            if prefix.version != self.network.version:
+                continue
+            start, end = int(prefix.network_address), int(prefix.broadcast_address)
+            if start <= last and end >= first:
+                taken.append((max(start, first), min(end, last)))
+        cursor = first
+        for start, end in sorted(taken):
+            self._add_range(cursor, start - 1)
+            cursor = max(cursor, end + 1)
+        self._add_range(cursor, last)
+
+    @classmethod
+    def from_records(cls, network_address, records):
+        """
+        Build the map of a network from its listing, e.g. list_all_subnets()
+        :param network_address:
+        :param records: subnet records
+        :return:
+        """
+        return cls(network_address, (record_prefix(record) for record in records))
+
+    def _add_range(self, start, end):
+        # ranges are added in ascending order, so appending keeps the lists sorted
+        for block, prefixlen in _blocks(start, end, self._bits):
+            self._free[prefixlen].append(block)
+
+    def _size(self, prefixlen):
+        return 1 << (self._bits - prefixlen)
+
+    def _network(self, start, prefixlen):
+        return type(self.network)((start, prefixlen))
+
+    def _discard(self, prefixlen, start):
+        blocks = self._free[prefixlen]
+        i = bisect.bisect_left(blocks, start)
+        if i < len(blocks) and blocks[i] == start:
+            del blocks[i]
+            return True
+        return False
+
+    def _check(self, prefixlen):
+        if not self.network.prefixlen <= prefixlen <= self._bits:
+            raise ValueError("/%s does not fit in network %s" % (prefixlen, self.network))
+
+    def _find(self, prefixlen, best):
+        self._check(prefixlen)
+        found = None
+        for k in range(prefixlen, self.network.prefixlen - 1, -1):
+            blocks = self._free[k]
+            if not blocks:
+                continue
+            if best:
+                return k, blocks[0]
+            if found is None or blocks[0] < found[1]:
+                found = k, blocks[0]
+        return found
+
+    def __len__(self):
+        return sum(len(blocks) for blocks in self._free.values())
+
+    @property
+    def free_addresses(self):
+        """
+        Number of unused addresses in the network
+        :return:
+        """
+        return sum(len(blocks) * self._size(k) for k, blocks in self._free.items())
+
+    def blocks(self):
+        """
+        Free blocks in address order
+        :return: list of networks
+        """
+        starts = sorted((start, k) for k, blocks in self._free.items() for start in blocks)
+        return [self._network(start, k) for start, k in starts]
+
+    def first_fit(self, prefixlen):
+        """
+        Lowest free prefix of the given length, without taking it
+        :param prefixlen:
+        :return: network or None
+        """
+        found = self._find(prefixlen, False)
+        return None if found is None else self._network(found[1], prefixlen)
+
+    def best_fit(self, prefixlen):
+        """
+        Free prefix of the given length carved from the smallest free block
+        that holds it, without taking it. Keeps large blocks whole for later.
+        :param prefixlen:
+        :return: network or None
+        """
+        found = self._find(prefixlen, True)
+        return None if found is None else self._network(found[1], prefixlen)
+
+    def take(self, prefixlen, best=False):
+        """
+        Take a free prefix of the given length out of the map
+        :param prefixlen:
+        :param best: best fit instead of first fit
+        :return: network or None when no block is large enough
+        """
+        found = self._find(prefixlen, best)
+        if found is None:
+            return None
+        k, start = found
+        self._discard(k, start)
+        # the rest of the block is one buddy per level below it
+        for level in range(prefixlen, k, -1):
+            bisect.insort(self._free[level], start + self._size(level))
+        return self._network(start, prefixlen)
+
+    def reserve(self, prefix):
+        """
+        Mark a prefix as used, e.g. one another client created meanwhile
+        :param prefix:
+        :return: whether any of it was free
+        """
+        prefix = ipaddress.ip_network(prefix, strict=False)
+        if prefix.version != self.network.version or not prefix.overlaps(self.network):
+            return False
+        if self.network.subnet_of(prefix):
+            prefix = self.network
+        start, prefixlen = int(prefix.network_address), prefix.prefixlen
+        for k in range(prefixlen, self.network.prefixlen - 1, -1):
+            block = start & ~(self._size(k) - 1)
+            if self._discard(k, block):
+                if k < prefixlen:
+                    for rest in self._network(block, k).address_exclude(prefix):
+                        bisect.insort(self._free[rest.prefixlen], int(rest.network_address))
+                return True
+        # not inside one free block, drop the free blocks inside it instead
+        end = start + self._size(prefixlen)
+        removed = False
+        for k in range(prefixlen + 1, self._bits + 1):
+            blocks = self._free[k]
+            lo, hi = bisect.bisect_left(blocks, start), bisect.bisect_left(blocks, end)
+            removed = removed or hi > lo
+            del blocks[lo:hi]
+        return removed
+
+    def release(self, prefix):
+        """
+        Return a prefix taken from the map, merging it with its free buddies
+        :param prefix:
+        :return:
+        """
+        prefix = ipaddress.ip_network(prefix, strict=False)
+        if not prefix.subnet_of(self.network):
+            raise ValueError("%s is not in network %s" % (prefix, self.network))
+        start, k = int(prefix.network_address), prefix.prefixlen
+        while k > self.network.prefixlen and self._discard(k, start ^ self._size(k)):
+            start &= ~self._size(k)
+            k -= 1
+        bisect.insort(self._free[k], start)
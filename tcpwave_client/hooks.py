@@ -0,0 +1,293 @@
+import logging
+import math
+import threading
+import time
+
+import requests
+from urllib3.connection import HTTPConnection
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.connectionpool import HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('connect', 'server', 'download', 'decode')
+
+_local = threading.local()
+
+
+def reset_connect_time():
+    _local.connect = 0.0
+
+
+def connect_time():
+    """
+    Seconds spent in DNS lookup, tcp connect and TLS handshake by the current
+    thread since the last reset_connect_time()
+    :return:
+    """
+    return getattr(_local, 'connect', 0.0)
+
+
+class _TimedConnectMixin(object):
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super(_TimedConnectMixin, self).connect()
+        finally:
+            _local.connect = connect_time() + time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTPAdapter whose connections record the time spent opening them, so the
+    connect phase can be told apart from server time. Only new connections
+    pay for the measurement.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
+
+
+class RequestInfo(object):
+    """
+    What a hook gets to see of one request. timings holds seconds per phase:
+    connect (DNS, tcp and TLS for a new connection, 0 on a reused one),
+    server (sending the request until the response headers arrived),
+    download (reading the response body), decode (json decoding) and total.
+    """
+    __slots__ = ('method', 'rel_url', 'url', 'status', 'request_bytes', 'response_bytes', 'timings', 'error',
+                 'start')
+
+    def __init__(self, method, rel_url, url, request_bytes=0):
+        self.method = method
+        self.rel_url = rel_url
+        self.url = url
+        self.status = None
+        self.request_bytes = request_bytes
+        self.response_bytes = 0
+        self.timings = {}
+        self.error = None
+        self.start = time.perf_counter()
+
+    def __repr__(self):
+        return "RequestInfo(%s %s status=%s total=%.6f)" % (self.method, self.rel_url, self.status,
+                                                            self.timings.get('total', 0.0))
+
+
+class RequestHook(object):
+    """
+    Base class for request hooks registered with Connector.add_hook.
+    Override any of the methods; exceptions raised by hooks are logged and
+    never reach the caller.
+    """
+    def before_request(self, info):
+        pass
+
+    def after_response(self, info):
+        """
+        Called once an accepted response was decoded
+        """
+        pass
+
+    def on_error(self, info, error):
+        """
+        Called instead of after_response when the request failed or the
+        response status was not accepted (info.status is set in that case)
+        """
+        pass
+
+
+def emit(hooks, event, *args):
+    for hook in hooks:
+        try:
+            getattr(hook, event)(*args)
+        except Exception:
+            logger.exception("request hook %r failed in %s", hook, event)
+
+
+class LatencyHistogram(object):
+    """
+    Log-bucketed histogram. Quantiles are accurate to the relative precision
+    whatever the number of samples, memory grows with the value range only.
+    """
+    def __init__(self, precision=0.02, min_value=1e-6):
+        self.precision = precision
+        self.min_value = min_value
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._log_base = math.log1p(2 * precision)
+        self._buckets = {}
+
+    def record(self, value):
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        index = int(math.log(max(value, self.min_value) / self.min_value) / self._log_base)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        if q >= 1:
+            return self.max
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                # midpoint of the bucket, within precision of every value in it
+                value = self.min_value * math.exp(self._log_base * (index + 0.5))
+                return min(value, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+class _EndpointStats(object):
+
+    def __init__(self, precision):
+        self.latency = LatencyHistogram(precision)
+        self.phases = dict((phase, 0.0) for phase in PHASES)
+        self.errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.statuses = {}
+
+
+class HistogramCollector(RequestHook):
+    """
+    In-memory latency statistics per (method, rel_url): p50/p95/p99 of the
+    total time, mean time per phase, error count, bytes and status codes.
+    """
+    def __init__(self, precision=0.02):
+        """
+        :param precision: relative error of the reported quantiles
+        """
+        self.precision = precision
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _record(self, info, failed):
+        key = (info.method, info.rel_url)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _EndpointStats(self.precision)
+            stats.latency.record(info.timings.get('total', 0.0))
+            for phase in PHASES:
+                stats.phases[phase] += info.timings.get(phase, 0.0)
+            if failed:
+                stats.errors += 1
+            stats.request_bytes += info.request_bytes
+            stats.response_bytes += info.response_bytes
+            status = str(info.status) if info.status is not None else 'error'
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def after_response(self, info):
+        self._record(info, False)
+
+    def on_error(self, info, error):
+        self._record(info, True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def summary(self):
+        """
+        Statistics per endpoint
+        :return: dict of "METHOD rel_url" -> dict
+        """
+        res = {}
+        with self._lock:
+            for (method, rel_url), stats in sorted(self._stats.items()):
+                latency = stats.latency
+                res["%s %s" % (method, rel_url)] = {
+                    'count': latency.count,
+                    'errors': stats.errors,
+                    'mean': latency.mean,
+                    'p50': latency.quantile(0.50),
+                    'p95': latency.quantile(0.95),
+                    'p99': latency.quantile(0.99),
+                    'max': latency.max,
+                    'phases': dict((phase, total / latency.count) for phase, total in stats.phases.items()),
+                    'request_bytes': stats.request_bytes,
+                    'response_bytes': stats.response_bytes,
+                    'statuses': dict(stats.statuses)
+                }
+        return res
+
+    def prometheus(self, prefix='tims_client'):
+        """
+        Statistics in the Prometheus text exposition format
+        :param prefix: metric name prefix
+        :return:
+        """
+        return prometheus_text(self, prefix)
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in sorted(labels.items()))
+
+
+def prometheus_text(collector, prefix='tims_client'):
+    """
+    Render a HistogramCollector in the Prometheus text exposition format, to
+    be served from a /metrics endpoint or written for the node exporter's
+    textfile collector.
+    :param collector:
+    :param prefix: metric name prefix
+    :return:
+    """
+    summary = collector.summary()
+    lines = ['# HELP %s_request_seconds Latency of IPAM rest calls' % prefix,
+             '# TYPE %s_request_seconds summary' % prefix]
+    for name, stats in summary.items():
+        method, rel_url = name.split(' ', 1)
+        for q in ('0.5', '0.95', '0.99'):
+            value = stats['p' + str(int(float(q) * 100))]
+            lines.append('%s_request_seconds%s %r' % (prefix, _labels(method=method, endpoint=rel_url, quantile=q),
+                                                      value))
+        labels = _labels(method=method, endpoint=rel_url)
+        lines.append('%s_request_seconds_sum%s %r' % (prefix, labels, stats['mean'] * stats['count']))
+        lines.append('%s_request_seconds_count%s %d' % (prefix, labels, stats['count']))
+    for metric, key, kind, text in (('request_errors_total', 'errors', 'counter', 'Failed IPAM rest calls'),
+                                    ('request_bytes_total', 'request_bytes', 'counter', 'Bytes sent to IPAM'),
+                                    ('response_bytes_total', 'response_bytes', 'counter', 'Bytes received from IPAM')):
+        lines.append('# HELP %s_%s %s' % (prefix, metric, text))
+        lines.append('# TYPE %s_%s %s' % (prefix, metric, kind))
+        for name, stats in summary.items():
+            method, rel_url = name.split(' ', 1)
+            lines.append('%s_%s%s %d' % (prefix, metric, _labels(method=method, endpoint=rel_url), stats[key]))
+    lines.append('# HELP %s_phase_seconds_mean Mean seconds per request phase' % prefix)
+    lines.append('# TYPE %s_phase_seconds_mean gauge' % prefix)
+    for name, stats in summary.items():
+        method, rel_url = name.split(' ', 1)
+        for phase, value in sorted(stats['phases'].items()):
+            lines.append('%s_phase_seconds_mean%s %r' % (prefix, _labels(method=method, endpoint=rel_url,
+                                                                         phase=phase), value))
+    return '\n'.join(lines) + '\n'
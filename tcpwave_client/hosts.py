@@ -0,0 +1,314 @@
+import threading
+import time
+
+from tcpwave_client import payloads
+from tcpwave_client.exceptions import APICallFailedException
+from tcpwave_client.exceptions import CircuitOpenException
+from tcpwave_client.exceptions import DeadlineExceededException
+from tcpwave_client.exceptions import IPAMException
+from tcpwave_client.retry import NOT_PROCESSED
+from tcpwave_client.retry import RetryPolicy
+from tcpwave_client.throttle import OVERLOAD_STATUSES
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+_classifier = RetryPolicy(retry_statuses=OVERLOAD_STATUSES)
+
+
+def parse_hosts(hosts, port=7443):
+    """
+    Normalize a hosts list. Entries are host names or dicts with host and
+    optional role (PRIMARY or REPLICA), weight and port. When no entry has
+    a role the first host is the primary.
+    :param hosts:
+    :param port: default port
+    :return: list of dicts with host, role, weight and port
+    """
+    res = []
+    for entry in hosts:
+        if not isinstance(entry, dict):
+            entry = {'host': entry}
+        role = entry.get('role')
+        if role not in (None, PRIMARY, REPLICA):
+            raise IPAMException("Unknown role %s of host %s" % (role, entry['host']))
+        weight = float(entry.get('weight', 1))
+        if weight <= 0:
+            raise IPAMException("Weight of host %s must be positive" % entry['host'])
+        res.append({'host': entry['host'], 'role': role, 'weight': weight, 'port': entry.get('port', port)})
+    if not res:
+        raise IPAMException("No hosts given")
+    if len(set(entry['host'] for entry in res)) != len(res):
+        raise IPAMException("Hosts must be unique")
+    if all(entry['role'] is None for entry in res):
+        res[0]['role'] = PRIMARY
+    for entry in res:
+        entry['role'] = entry['role'] or REPLICA
+    return res
+
+
+class _Health(object):
+    __slots__ = ('latency', 'in_flight', 'failures', 'down_until', 'requests', 'errors')
+
+    def __init__(self):
+        self.latency = None
+        self.in_flight = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+
+class HostSet(object):
+    """
+    Health of a group of TIMS appliances. Latency is tracked as an
+    exponentially weighted moving average; max_failures consecutive
+    failures take a host out of rotation for down_time seconds, after which
+    it gets traffic again (or sooner, when an active probe succeeds).
+    """
+    def __init__(self, hosts, port=7443, max_failures=3, down_time=30.0, smoothing=0.3, read_from_primary=True,
+                 timer=time.monotonic):
+        """
+        :param hosts: see parse_hosts
+        :param port: default port
+        :param max_failures: consecutive failures marking a host down
+        :param down_time: seconds a host stays down before it is tried again
+        :param smoothing: weight of the newest latency sample in the moving average
+        :param read_from_primary: whether reads may go to primaries as well as replicas
+        :param timer:
+        """
+        self.hosts = parse_hosts(hosts, port)
+        self.max_failures = max_failures
+        self.down_time = down_time
+        self.smoothing = smoothing
+        self.read_from_primary = read_from_primary
+        self.timer = timer
+        self._health = dict((entry['host'], _Health()) for entry in self.hosts)
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self):
+        return next(entry for entry in self.hosts if entry['role'] == PRIMARY)
+
+    def is_up(self, host):
+        return self._health[host].down_until <= self.timer()
+
+    def _score(self, entry):
+        health = self._health[entry['host']]
+        # hosts without samples score 0 so they get measured first
+        latency = health.latency or 0.0
+        return latency * (health.in_flight + 1) / entry['weight']
+
+    def read_order(self):
+        """
+        Hosts to try for a read, best first: hosts that are up by load-weighted
+        latency, then hosts that are down by the time they come back
+        :return: list of host entries
+        """
+        now = self.timer()
+        candidates = [entry for entry in self.hosts if self.read_from_primary or entry['role'] == REPLICA]
+        if not candidates:
+            candidates = list(self.hosts)
+        with self._lock:
+            up = sorted((entry for entry in candidates if self._health[entry['host']].down_until <= now),
+                        key=lambda entry: (self._score(entry), -entry['weight']))
+            down = sorted((entry for entry in candidates if self._health[entry['host']].down_until > now),
+                          key=lambda entry: self._health[entry['host']].down_until)
+        return up + down
+
+    def write_order(self):
+        """
+        Primaries to try for a write, primaries that are up first
+        :return: list of host entries
+        """
+        now = self.timer()
+        primaries = [entry for entry in self.hosts if entry['role'] == PRIMARY]
+        with self._lock:
+            return sorted(primaries, key=lambda entry: (self._health[entry['host']].down_until > now,
+                                                        -entry['weight']))
+
+    def begin(self, host):
+        with self._lock:
+            health = self._health[host]
+            health.in_flight += 1
+            health.requests += 1
+
+    def end(self, host, latency=None, failed=False):
+        """
+        Record the outcome of a request
+        :param host:
+        :param latency: seconds, for requests that got an answer
+        :param failed: whether the host failed to answer properly
+        :return:
+        """
+        with self._lock:
+            health = self._health[host]
+            health.in_flight -= 1
+            self._record(health, latency, failed)
+
+    def record_probe(self, host, latency=None, failed=False):
+        with self._lock:
+            self._record(self._health[host], latency, failed)
+
+    def _record(self, health, latency, failed):
+        if failed:
+            health.errors += 1
+            health.failures += 1
+            if health.failures >= self.max_failures:
+                health.down_until = self.timer() + self.down_time
+            return
+        health.failures = 0
+        health.down_until = 0.0
+        if latency is not None:
+            if health.latency is None:
+                health.latency = latency
+            else:
+                health.latency += self.smoothing * (latency - health.latency)
+
+    def stats(self):
+        """
+        Role, weight, state and load of every host for monitoring
+        :return: dict of host -> dict
+        """
+        now = self.timer()
+        with self._lock:
+            return dict((entry['host'], {
+                'role': entry['role'],
+                'weight': entry['weight'],
+                'up': self._health[entry['host']].down_until <= now,
+                'latency': self._health[entry['host']].latency,
+                'in_flight': self._health[entry['host']].in_flight,
+                'consecutive_failures': self._health[entry['host']].failures,
+                'requests': self._health[entry['host']].requests,
+                'errors': self._health[entry['host']].errors
+            }) for entry in self.hosts)
+
+
+def _failure_kind(error):
+    """
+    None when the error is an answer of a healthy host, else NOT_PROCESSED or AMBIGUOUS
+    """
+    if isinstance(error, CircuitOpenException):
+        return NOT_PROCESSED
+    if isinstance(error, APICallFailedException) and error.status_code not in OVERLOAD_STATUSES:
+        return None
+    return _classifier.classify(error)
+
+
+class MultiHostConnector(object):
+    """
+    Connector over several TIMS appliances with the same interface as
+    Connector. get_object goes to the best host of the HostSet and fails
+    over to the next one when a host does not answer; create_object and
+    delete_object go to the primary and only fail over to another primary
+    when the failed request was certainly not processed.
+    """
+    def __init__(self, pool, host_set, cert, key, verify=False, probe_interval=None):
+        """
+        :param pool: ConnectorPool providing the connector of every host
+        :param host_set: HostSet
+        :param cert:
+        :param key:
+        :param verify:
+        :param probe_interval: seconds between active health probes of every host, None disables probing
+        """
+        self.pool = pool
+        self.host_set = host_set
+        self.cert = cert
+        self.key = key
+        self.verify = verify
+        self.host = host_set.primary['host']
+        self.closed = False
+        self._connectors = {}
+        self._stop = threading.Event()
+        self._prober = None
+        if probe_interval:
+            self._prober = threading.Thread(target=self._probe_loop, args=(probe_interval,),
+                                            name='tims-host-prober')
+            self._prober.daemon = True
+            self._prober.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Stop probing. The per-host connectors belong to the pool and stay open.
+        :return:
+        """
+        self.closed = True
+        self._stop.set()
+
+    @property
+    def in_flight(self):
+        return sum(conn.in_flight for conn in list(self._connectors.values()))
+
+    @property
+    def last_used(self):
+        return max([conn.last_used for conn in list(self._connectors.values())] or [time.monotonic()])
+
+    def connector(self, entry):
+        conn = self._connectors.get(entry['host'])
+        if conn is None or conn.closed:
+            conn = self._connectors[entry['host']] = self.pool.get(entry['host'], self.cert, self.key, self.verify,
+                                                                   entry['port'])
+        return conn
+
+    def _call(self, order, call, writes):
+        error = None
+        for entry in order:
+            host = entry['host']
+            self.host_set.begin(host)
+            start = time.perf_counter()
+            try:
+                rsp = call(self.connector(entry))
+            except DeadlineExceededException:
+                # the caller ran out of time, which says nothing about the host
+                self.host_set.end(host)
+                raise
+            except Exception as ex:
+                kind = _failure_kind(ex)
+                self.host_set.end(host, None if kind else time.perf_counter() - start, failed=kind is not None)
+                if kind is None or (writes and kind != NOT_PROCESSED):
+                    raise
+                error = ex
+                continue
+            self.host_set.end(host, time.perf_counter() - start)
+            return rsp
+        raise error
+
+    def get_object(self, payload, raw=False):
+        return self._call(self.host_set.read_order(), lambda conn: conn.get_object(payload=payload, raw=raw), False)
+
+    def create_object(self, payload, idempotent=None, write_check=None):
+        return self._call(self.host_set.write_order(),
+                          lambda conn: conn.create_object(payload, idempotent=idempotent, write_check=write_check),
+                          True)
+
+    def delete_object(self, payload, idempotent=None, write_check=None):
+        return self._call(self.host_set.write_order(),
+                          lambda conn: conn.delete_object(payload, idempotent=idempotent, write_check=write_check),
+                          True)
+
+    def probe(self):
+        """
+        Send one cheap read to every host and record the outcome
+        :return:
+        """
+        payload = payloads.network_paged({}, page_size=1)
+        for entry in self.host_set.hosts:
+            start = time.perf_counter()
+            try:
+                self.connector(entry).get_object(payload=payload)
+            except Exception as ex:
+                failed = _failure_kind(ex) is not None
+                self.host_set.record_probe(entry['host'], None if failed else time.perf_counter() - start, failed)
+            else:
+                self.host_set.record_probe(entry['host'], time.perf_counter() - start)
+
+    def _probe_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.probe()
@@ -0,0 +1,360 @@
+import hashlib
+import ipaddress
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from tcpwave_client import payloads
+from tcpwave_client.deadlines import deadline
+from tcpwave_client.deadlines import submit
+from tcpwave_client.deadlines import time_left
+from tcpwave_client.exceptions import DeadlineExceededException
+from tcpwave_client.paging import fetch_page
+from tcpwave_client.prefix_index import record_prefix
+from tcpwave_client.serializer import get_default_serializer
+
+NETWORKS = 'networks'
+SUBNETS = 'subnets'
+
+_NETWORK_LISTING = 'network'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    listing TEXT PRIMARY KEY,
+    page_size INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    listing TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (listing, start)
+);
+CREATE TABLE IF NOT EXISTS networks (
+    organization_name TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    name TEXT,
+    first TEXT NOT NULL,
+    last TEXT NOT NULL,
+    listing TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (organization_name, prefix)
+);
+CREATE INDEX IF NOT EXISTS networks_range ON networks (first, last);
+CREATE INDEX IF NOT EXISTS networks_org ON networks (organization_name, first);
+CREATE INDEX IF NOT EXISTS networks_name ON networks (name);
+CREATE INDEX IF NOT EXISTS networks_listing ON networks (listing, page);
+CREATE TABLE IF NOT EXISTS subnets (
+    organization_name TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    network TEXT NOT NULL,
+    name TEXT,
+    first TEXT NOT NULL,
+    last TEXT NOT NULL,
+    listing TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (organization_name, prefix)
+);
+CREATE INDEX IF NOT EXISTS subnets_range ON subnets (first, last);
+CREATE INDEX IF NOT EXISTS subnets_org ON subnets (organization_name, first);
+CREATE INDEX IF NOT EXISTS subnets_network ON subnets (organization_name, network);
+CREATE INDEX IF NOT EXISTS subnets_name ON subnets (name);
+CREATE INDEX IF NOT EXISTS subnets_listing ON subnets (listing, page);
+"""
+
+_UPSERT = {
+    NETWORKS: "INSERT INTO networks (organization_name, prefix, name, first, last, listing, page, data) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+              "ON CONFLICT (organization_name, prefix) DO UPDATE SET name = excluded.name, "
+              "listing = excluded.listing, page = excluded.page, data = excluded.data "
+              "WHERE data != excluded.data OR page != excluded.page OR listing != excluded.listing",
+    SUBNETS: "INSERT INTO subnets (organization_name, prefix, network, name, first, last, listing, page, data) "
+             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+             "ON CONFLICT (organization_name, prefix) DO UPDATE SET network = excluded.network, "
+             "name = excluded.name, listing = excluded.listing, page = excluded.page, data = excluded.data "
+             "WHERE data != excluded.data OR page != excluded.page OR listing != excluded.listing"
+}
+
+
+def _key(version, value):
+    # fixed width hex keeps IPv4 before IPv6 and orders addresses numerically as text
+    return '%d%032x' % (version, value)
+
+
+def _range(prefix):
+    return (_key(prefix.version, int(prefix.network_address)),
+            _key(prefix.version, int(prefix.broadcast_address)))
+
+
+def _fingerprint(raw):
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def _subnet_listing(organization_name, network):
+    return '%s|%s|%s' % (SUBNETS, organization_name, network)
+
+
+class SyncResult(object):
+    """
+    What a sync fetched and changed
+    """
+    def __init__(self):
+        self.listings = 0
+        self.pages = 0
+        self.pages_changed = 0
+        self.written = 0
+        self.deleted = 0
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return ("SyncResult(listings=%d, pages=%d, changed=%d, written=%d, deleted=%d, elapsed=%.3f)" %
+                (self.listings, self.pages, self.pages_changed, self.written, self.deleted, self.elapsed))
+
+
+class _Listing(object):
+    __slots__ = ('name', 'table', 'payload', 'network', 'known', 'known_total', 'total', 'pages', 'pending')
+
+    def __init__(self, name, table, payload, network, known, known_total):
+        self.name = name
+        self.table = table
+        self.payload = payload
+        self.network = network
+        self.known = known
+        self.known_total = known_total
+        self.total = None
+        self.pages = {}
+        self.pending = 0
+
+
+class InventoryMirror(object):
+    """
+    Local SQLite copy of the networks and subnets of an appliance, filled
+    from /network/paged and /subnet/paged.
+
+    A sync still reads every page, since the API cannot tell what changed,
+    but it keeps a fingerprint of every page it applied. Pages that come
+    back byte for byte identical are neither decoded nor written, changed
+    pages are decoded and only rows whose content differs are written, and
+    rows that disappeared from a listing are deleted. A sync where nothing
+    changed thus costs the requests and a hash per page.
+
+    Reads (networks, subnets) are indexed SQL queries by organization,
+    name and prefix and do not touch the appliance. Use one database per
+    appliance.
+    """
+    def __init__(self, client, path=':memory:', page_size=None, concurrency=8):
+        """
+        :param client: TimsClient
+        :param path: SQLite database file, ':memory:' for a private in-memory mirror
+        :param page_size: page size of the listings, defaults to the client page size
+        :param concurrency: maximum number of pages in flight during a sync
+        """
+        self.client = client
+        self.path = path
+        self.page_size = page_size or client.page_size
+        self.concurrency = max(concurrency or 1, 1)
+        self.serializer = get_default_serializer()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _known(self, listing):
+        row = self._db.execute("SELECT page_size, total FROM listings WHERE listing = ?", (listing,)).fetchone()
+        if row is None or row[0] != self.page_size:
+            return {}, None
+        pages = dict(self._db.execute("SELECT start, fingerprint FROM pages WHERE listing = ?", (listing,)))
+        return pages, row[1]
+
+    def _listing(self, name, table, payload, network=None):
+        with self._lock:
+            known, known_total = self._known(name)
+        return _Listing(name, table, payload, network, known, known_total)
+
+    def _fetch(self, listing, start):
+        raw = fetch_page(self.client.connector, listing.payload, start, self.client.page_retries, raw=True)
+        fingerprint = _fingerprint(raw)
+        if listing.known.get(start) == fingerprint and (start or listing.known_total is not None):
+            return listing, start, fingerprint, None
+        return listing, start, fingerprint, self.serializer.loads(raw)
+
+    def sync(self, timeout=None):
+        """
+        Bring the mirror up to date: the network listing first, then the
+        subnet listing of every network, concurrently
+        :param timeout: seconds allowed for the whole sync
+        :return: SyncResult
+        """
+        result = SyncResult()
+        start = time.monotonic()
+        with deadline(timeout), ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            network_listing = self._listing(_NETWORK_LISTING, NETWORKS, payloads.network_paged({}, self.page_size))
+            self._run(executor, [network_listing], result)
+            with self._lock:
+                networks = self._db.execute("SELECT organization_name, prefix FROM networks").fetchall()
+            listings = [self._listing(_subnet_listing(org, prefix), SUBNETS,
+                                      payloads.subnet_paged({'organization_name': org, 'network_address': prefix},
+                                                            self.page_size), (org, prefix))
+                        for org, prefix in networks]
+            self._run(executor, listings, result)
+            self._drop_stale_listings(set(listing.name for listing in listings), result)
+        result.elapsed = time.monotonic() - start
+        return result
+
+    def _run(self, executor, listings, result):
+        """
+        Fetch the first page of every listing, then its other pages, and
+        apply each listing as soon as all of its pages arrived
+        """
+        futures = set(submit(executor, self._fetch, listing, 0) for listing in listings)
+        for listing in listings:
+            listing.pending = 1
+        try:
+            while futures:
+                done, futures = wait(futures, time_left(), return_when=FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceededException("Deadline exceeded during sync")
+                for future in done:
+                    listing, page_start, fingerprint, rsp = future.result()
+                    listing.pages[page_start] = (fingerprint, rsp)
+                    listing.pending -= 1
+                    result.pages += 1
+                    if page_start == 0:
+                        listing.total = listing.known_total if rsp is None else rsp.get('recordsTotal') or 0
+                        for start in range(self.page_size, listing.total, self.page_size):
+                            futures.add(submit(executor, self._fetch, listing, start))
+                            listing.pending += 1
+                    if not listing.pending:
+                        self._apply(listing, result)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _row(self, listing, start, record):
+        prefix = record_prefix(record)
+        first, last = _range(prefix)
+        data = self.serializer.dumps(record).decode('utf-8')
+        if listing.table == NETWORKS:
+            return (record.get('organization_name'), str(prefix), record.get('name'), first, last, listing.name,
+                    start, data)
+        org, network = listing.network
+        return (record.get('organization_name') or org, str(prefix), network, record.get('name'), first, last,
+                listing.name, start, data)
+
+    def _apply(self, listing, result):
+        table = listing.table
+        unchanged = [start for start, (_, rsp) in listing.pages.items() if rsp is None]
+        changed = dict((start, rsp) for start, (_, rsp) in listing.pages.items() if rsp is not None)
+        result.listings += 1
+        result.pages_changed += len(changed)
+        with self._lock, self._db:
+            if changed or len(listing.pages) != len(listing.known):
+                rows = [self._row(listing, start, record) for start, rsp in changed.items()
+                        for record in rsp.get('data') or []]
+                seen = set((row[0], row[1]) for row in rows)
+                stale = [(org, prefix) for org, prefix, page in self._db.execute(
+                    "SELECT organization_name, prefix, page FROM %s WHERE listing = ?" % table, (listing.name,))
+                    if page not in unchanged and (org, prefix) not in seen]
+                result.written += self._db.executemany(_UPSERT[table], rows).rowcount if rows else 0
+                if stale:
+                    self._db.executemany("DELETE FROM %s WHERE organization_name = ? AND prefix = ?" % table, stale)
+                    result.deleted += len(stale)
+                self._db.execute("DELETE FROM pages WHERE listing = ?", (listing.name,))
+                self._db.executemany("INSERT INTO pages (listing, start, fingerprint) VALUES (?, ?, ?)",
+                                     [(listing.name, start, fingerprint)
+                                      for start, (fingerprint, _) in listing.pages.items()])
+            self._db.execute("INSERT OR REPLACE INTO listings (listing, page_size, total, synced_at) "
+                             "VALUES (?, ?, ?, ?)", (listing.name, self.page_size, listing.total, time.time()))
+
+    def _drop_stale_listings(self, current, result):
+        """
+        Forget the subnets of networks that are gone
+        """
+        with self._lock, self._db:
+            names = [name for (name,) in self._db.execute("SELECT listing FROM listings WHERE listing LIKE ?",
+                                                          (SUBNETS + '|%',))
+                     if name not in current]
+            for name in names:
+                result.deleted += self._db.execute("DELETE FROM subnets WHERE listing = ?", (name,)).rowcount
+                self._db.execute("DELETE FROM pages WHERE listing = ?", (name,))
+                self._db.execute("DELETE FROM listings WHERE listing = ?", (name,))
+
+    def _query(self, table, organization_name, name, within, containing, extra=()):
+        clauses = []
+        args = []
+        if organization_name is not None:
+            clauses.append("organization_name = ?")
+            args.append(organization_name)
+        if name is not None:
+            clauses.append("name = ?")
+            args.append(name)
+        if within is not None:
+            first, last = _range(ipaddress.ip_network(within, strict=False))
+            clauses.append("first BETWEEN ? AND ? AND last <= ?")
+            args.extend((first, last, last))
+        if containing is not None:
+            first, last = _range(ipaddress.ip_network(containing, strict=False))
+            clauses.append("first <= ? AND last >= ?")
+            args.extend((first, last))
+        for clause, value in extra:
+            clauses.append(clause)
+            args.append(value)
+        sql = "SELECT data FROM %s" % table
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY first, last DESC"
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [self.serializer.loads(data) for (data,) in rows]
+
+    def networks(self, organization_name=None, name=None, within=None, containing=None):
+        """
+        Mirrored networks matching all given filters, ordered by address
+        :param organization_name:
+        :param name: exact name
+        :param within: prefix the networks must lie in
+        :param containing: address or prefix the networks must contain
+        :return: list of network records
+        """
+        return self._query(NETWORKS, organization_name, name, within, containing)
+
+    def subnets(self, organization_name=None, name=None, within=None, containing=None, network=None):
+        """
+        Mirrored subnets matching all given filters, ordered by address
+        :param organization_name:
+        :param name: exact name
+        :param within: prefix the subnets must lie in
+        :param containing: address or prefix the subnets must contain
+        :param network: prefix of the network the subnets were listed under
+        :return: list of subnet records
+        """
+        extra = ()
+        if network is not None:
+            extra = (("network = ?", str(ipaddress.ip_network(network, strict=False))),)
+        return self._query(SUBNETS, organization_name, name, within, containing, extra)
+
+    def stats(self):
+        """
+        Number of mirrored records and time of the last sync
+        :return:
+        """
+        with self._lock:
+            networks = self._db.execute("SELECT COUNT(*) FROM networks").fetchone()[0]
+            subnets = self._db.execute("SELECT COUNT(*) FROM subnets").fetchone()[0]
+            synced_at = self._db.execute("SELECT MAX(synced_at) FROM listings").fetchone()[0]
+        return {'networks': networks, 'subnets': subnets, 'synced_at': synced_at}
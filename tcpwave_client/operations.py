@@ -0,0 +1,200 @@
+import ipaddress
+
+from tcpwave_client import payloads
+from tcpwave_client.bulk import chunks
+from tcpwave_client.bulk import prepare
+from tcpwave_client.exceptions import APICallFailedException
+from tcpwave_client.exceptions import IPAMException
+from tcpwave_client.throttle import OVERLOAD_STATUSES
+
+# response of a write that was confirmed by its write_check instead of the appliance
+SUCCESS = '{"msg": "Successful"}'
+
+
+def merge(obj, fields):
+    """
+    Input of an operation given as a dict, keyword arguments, or both
+    :param obj:
+    :param fields:
+    :return:
+    """
+    if not fields:
+        return obj or {}
+    merged = dict(obj or {})
+    merged.update(fields)
+    return merged
+
+
+def missing(ex):
+    """
+    Whether a failed lookup means the object does not exist rather than the appliance being unavailable
+    :param ex: APICallFailedException
+    :return:
+    """
+    return ex.status_code is not None and 400 <= ex.status_code < 500
+
+
+def rejected(ex):
+    """
+    Whether a failed write was definitely rejected by the appliance, e.g.
+    because the object overlaps one created meanwhile. Throttled, overloaded
+    and failed requests may not have been processed and are not rejections.
+    :param ex:
+    :return:
+    """
+    if not isinstance(ex, APICallFailedException) or ex.status_code is None:
+        return False
+    return 400 <= ex.status_code < 500 and ex.status_code not in OVERLOAD_STATUSES
+
+
+def created(record, name):
+    """
+    Result of the write_check of an add call
+    :param record: detail record looked up after the call, None when not found
+    :param name: name the object was created with
+    :return: the record when it is the created object, None otherwise
+    """
+    if isinstance(record, dict) and record.get('name') == name:
+        return record
+    return None
+
+
+def create_network_request(network):
+    """
+    /network/add payload and the lookup confirming it was applied
+    :param network:
+    :return: (payload, lookup payload, name)
+    """
+    payload = payloads.network_add(network)
+    return payload, payloads.network_details_by_ip(network), payload['body']['name']
+
+
+def delete_network_lookups(network):
+    """
+    Lookups confirming a /network/delete was applied, they all fail once it was
+    :param network:
+    :return: list of payloads
+    """
+    return [payloads.network_details_by_ip({'organization_name': network['organization_name'],
+                                            'network_address': network['address']})]
+
+
+def create_subnet_request(subnet):
+    """
+    /subnet/add payload and the lookup confirming it was applied
+    :param subnet:
+    :return: (payload, lookup payload, name)
+    """
+    payload = payloads.subnet_add(subnet)
+    lookup = payloads.subnet_data({'organization_name': subnet['organization_name'],
+                                   'subnet_address': subnet['network_address']})
+    return payload, lookup, payload['body']['name']
+
+
+def delete_subnet_lookups(subnet):
+    """
+    Lookups confirming a /subnet/delete was applied, they all fail once it was
+    :param subnet:
+    :return: list of payloads
+    """
+    return [payloads.subnet_data({'organization_name': subnet['organization_name'], 'subnet_address': address})
+            for address in subnet['address_list']]
+
+
+def create_ip_request(ip_obj):
+    """
+    /object/add payload and the lookup telling whether it was applied, see not_added
+    :param ip_obj:
+    :return: (payload, lookup payload, address)
+    """
+    payload = payloads.object_add(ip_obj)
+    lookup = payloads.next_free_ip({'organization_name': ip_obj['organization_name'],
+                                    'subnet_address': ip_obj['subnet_address']})
+    return payload, lookup, payload['body']['address']
+
+
+def not_added(rsp, address):
+    """
+    Result of the write_check of an /object/add call. The API cannot look up
+    ip objects, so a create can never be confirmed; only the address still
+    being the next free one of its subnet proves the call was not applied.
+    :param rsp: raw /object/getNextFreeIP response looked up after the call
+    :param address: address of the ip object
+    :return: None, the call may be sent again
+    :raises IPAMException: when it cannot tell, the ambiguous failure is reported instead
+    """
+    if next_free_address(rsp).strip().strip('"') == address:
+        return None
+    raise IPAMException("Cannot tell whether the ip object %s was created" % address)
+
+
+def next_free_address(rsp):
+    """
+    Decode the raw /object/getNextFreeIP response
+    :param rsp:
+    :return:
+    """
+    return rsp.decode("utf-8")
+
+
+def prepare_ips(ip_objs, defaults):
+    """
+    Validate ip objects and build their /object/add payloads, see TimsClient.create_ips
+    :param ip_objs: iterable of dicts as accepted by create_ip
+    :param defaults: fields shared by all objects
+    :return: (number of objects, list of (index, payload), validation errors by index)
+    """
+    items = [merge(defaults, ip_obj) for ip_obj in ip_objs]
+    prepared, errors = prepare(items, payloads.object_add, ('ip_address', 'subnet_address'))
+    return len(items), prepared, errors
+
+
+def added_addresses(prepared):
+    """
+    Addresses written by prepared /object/add payloads
+    :param prepared: list of (index, payload)
+    :return:
+    """
+    return [payload['body']['address'] for _, payload in prepared]
+
+
+def release_chunks(addresses, organization_name, chunk_size):
+    """
+    Validate addresses and group them into /object/reclaimObjects payloads
+    :param addresses: list of ip addresses
+    :param organization_name:
+    :param chunk_size: number of addresses per payload
+    :return: (list of (chunk index, payload), item positions per chunk, validation errors by position)
+    """
+    errors = {}
+    valid = []
+    for i, address in enumerate(addresses):
+        try:
+            valid.append((i, str(ipaddress.ip_address(address))))
+        except ValueError as ex:
+            errors[i] = ex
+    prepared = []
+    chunk_positions = []
+    for chunk in chunks(valid, chunk_size):
+        prepared.append((len(prepared), release_payload([address for _, address in chunk], organization_name)))
+        chunk_positions.append([i for i, _ in chunk])
+    return prepared, chunk_positions, errors
+
+
+def release_payload(addresses, organization_name):
+    """
+    /object/reclaimObjects payload releasing the given addresses
+    :param addresses: list of normalized ip addresses
+    :param organization_name:
+    :return:
+    """
+    return payloads.reclaim_objects({'organization_name': organization_name, 'address_array': addresses})
+
+
+def released_addresses(prepared):
+    """
+    Addresses named by prepared /object/reclaimObjects payloads
+    :param prepared: list of (chunk index, payload)
+    :return:
+    """
+    return [address for _, payload in prepared for address in payload['body']['addressArray']]
@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from requests.exceptions import RequestException
+
+from tcpwave_client.deadlines import bounded
+from tcpwave_client.deadlines import check_deadline
+from tcpwave_client.deadlines import deadline
+from tcpwave_client.deadlines import submit
+from tcpwave_client.exceptions import DeadlineExceededException
+from tcpwave_client.exceptions import IPAMException
+
+
+def page_payload(payload, start):
+    """
+    Copy of a paged payload pointing at the given offset. The copy is shallow
+    except for params so pages can be fetched concurrently.
+    :param payload:
+    :param start:
+    :return:
+    """
+    page = dict(payload)
+    page['params'] = dict(payload['params'], start=start)
+    return page
+
+
+def fetch_page(conn, payload, start, retries=2, raw=False):
+    """
+    Fetch one page, retrying it on failure without touching the other pages.
+    No retry is made once the current deadline passed.
+    :param conn:
+    :param payload:
+    :param start:
+    :param retries: number of additional attempts for the page
+    :param raw: return the undecoded response body
+    :return:
+    """
+    attempt = 0
+    while True:
+        try:
+            if raw:
+                return conn.get_object(payload=page_payload(payload, start), raw=True)
+            return conn.get_object(payload=page_payload(payload, start))
+        except DeadlineExceededException:
+            raise
+        except (IPAMException, RequestException):
+            if attempt >= retries:
+                raise
+            check_deadline()
+            attempt += 1
+
+
+def _result(future):
+    try:
+        return future.result(bounded(None))
+    except FutureTimeoutError:
+        check_deadline()
+        raise
+
+
+def fetch_all_pages(conn, payload, concurrency=4, retries=2, timeout=None):
+    """
+    Fetch every record of a paged endpoint. The first page is read to learn
+    recordsTotal, remaining pages are fetched over a bounded worker pool and
+    concatenated in their original order.
+    :param conn: connector used for every page
+    :param payload: paged payload, params['length'] is the page size
+    :param concurrency: maximum number of pages in flight
+    :param retries: number of additional attempts per page
+    :param timeout: seconds allowed for the whole listing, see deadlines.deadline
+    :return:
+    """
+    with deadline(timeout):
+        return _fetch_all_pages(conn, payload, concurrency, retries)
+
+
+def _fetch_all_pages(conn, payload, concurrency, retries):
+    page_size = payload["params"]["length"]
+    first_start = payload["params"].get("start") or 0
+    rsp = fetch_page(conn, payload, first_start, retries)
+    total = rsp.get("recordsTotal")
+    res = list()
+    res.extend(rsp.get("data"))
+    starts = range(first_start + page_size, total, page_size)
+    if not starts:
+        return res
+
+    if concurrency is None or concurrency <= 1:
+        for start in starts:
+            res.extend(fetch_page(conn, payload, start, retries).get("data"))
+        return res
+
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(starts)))
+    futures = [submit(executor, fetch_page, conn, payload, start, retries) for start in starts]
+    try:
+        for future in futures:
+            res.extend(_result(future).get("data"))
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+    return res
+
+
+def iter_records(conn, payload, start=0, retries=2, prefetch=True):
+    """
+    Yield records of a paged endpoint page by page. While the caller consumes
+    a page the next one is already being fetched in the background, and only
+    those two pages are held in memory. Closing the generator stops paging.
+    Consume it inside deadlines.deadline to bound the whole listing.
+    :param conn: connector used for every page
+    :param payload: paged payload, params['length'] is the page size
+    :param start: offset of the first record, use it to resume a listing
+    :param retries: number of additional attempts per page
+    :param prefetch: fetch the next page while the current one is consumed
+    :return:
+    """
+    page_size = payload["params"]["length"]
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    future = None
+    try:
+        rsp = fetch_page(conn, payload, start, retries)
+        while True:
+            data = rsp.get("data") or []
+            start += page_size
+            has_next = bool(data) and start < rsp.get("recordsTotal")
+            if has_next and executor is not None:
+                future = submit(executor, fetch_page, conn, payload, start, retries)
+            for record in data:
+                yield record
+            if not has_next:
+                return
+            if future is not None:
+                rsp, future = _result(future), None
+            else:
+                rsp = fetch_page(conn, payload, start, retries)
+    finally:
+        if future is not None:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,205 @@
+import re
+
+from tcpwave_client.addresses import normalize_prefix
+from tcpwave_client.cache import NETWORK
+from tcpwave_client.cache import SUBNET
+from tcpwave_client.endpoints import Endpoint
+from tcpwave_client.endpoints import computed
+from tcpwave_client.endpoints import constant
+from tcpwave_client.endpoints import optional
+from tcpwave_client.endpoints import register
+from tcpwave_client.endpoints import required
+
+
+def _ipv4_fields(value, fields=None):
+    """
+    Address, addr1..addr4 octets and prefix length of an IPv4 address or prefix
+    :param value: address or prefix, used when fields is None
+    :param fields: fields already computed by addresses.normalize_prefixes
+    :return:
+    """
+    address, octets, prefixlen = fields or normalize_prefix(value)
+    if octets is None:
+        raise ValueError("%s is not an IPv4 address" % address)
+    return address, octets, prefixlen
+
+
+def _octets(octets):
+    return {"addr1": octets[0], "addr2": octets[1], "addr3": octets[2], "addr4": octets[3]}
+
+
+_OCTETS = tuple(computed(key) for key in ("addr1", "addr2", "addr3", "addr4"))
+
+
+def _network_add(network_obj, network_address=None):
+    network_ip, ips, mask_len = _ipv4_fields(network_obj['network_address'], network_address)
+    res = _octets(ips)
+    res.update({"address": network_ip, "mask_length": mask_len})
+    return res
+
+
+NETWORK_ADD = register(Endpoint(
+    'network_add', "POST", "/network/add", compute=_network_add, invalidates=('network_address',),
+    fields=(computed("address"),) + _OCTETS + (
+        computed("mask_length"),
+        optional("organization_id", ""),
+        optional("organization_name", ""),
+        required("name"),
+        optional("description", ""),
+        optional("createRevZone", "no"),
+        optional("dmzVisible", "no"),
+        optional("dnssec_enable", "no"),
+        optional("nsec_option", "NSEC3"),
+        optional("monitoringService", "no"),
+        optional("enable_discovery", "no"),
+        optional("discovery_template", ""),
+        optional("region", ""),
+        optional("percentageFull", 100),
+        optional("email_check", 1),
+        optional("snmp_check", 0),
+        optional("log_check", 0),
+        optional("rrs", []),
+        optional("zoneTemplateId", ""),
+        optional("zoneTemplateName", ""),
+        optional("extensions", []),
+    )))
+
+
+def _network_details_by_ip(network_obj):
+    ip_address = str(network_obj["network_address"])
+    _, ip_bits, _ = _ipv4_fields(ip_address)
+    res = _octets(ip_bits)
+    res["address"] = ip_address
+    return res
+
+
+NETWORK_DETAILS_BY_IP = register(Endpoint(
+    'network_details_by_ip', "GET", "/network/detailsByIP", compute=_network_details_by_ip,
+    cache=NETWORK, cache_fields=('organization_name', 'network_address'),
+    fields=(required("organizationName", "organization_name"),) + _OCTETS + (computed("address"),)))
+
+
+def _paged(obj, page_size=100):
+    return {"length": page_size}
+
+
+NETWORK_PAGED = register(Endpoint(
+    'network_paged', "GET", "/network/paged", compute=_paged, paged=True,
+    fields=(constant("start", 0), computed("length"), constant("sort", "name"), constant("order", "asc"))))
+
+NETWORK_DELETE = register(Endpoint(
+    'network_delete', "POST", "/network/delete", delete=True, invalidates=('address',),
+    compute=lambda network_obj: {"address": str(network_obj['address'])},
+    fields=(computed("address"), required("organization_name"), optional("id", ""))))
+
+
+def _subnet_add(subnet_obj, network_address=None):
+    network_ip, ips, mask_len = _ipv4_fields(subnet_obj['network_address'], network_address)
+    res = _octets(ips)
+    res.update({"network_address": network_ip, "network_mask": mask_len, "mask_length": mask_len})
+    return res
+
+
+SUBNET_ADD = register(Endpoint(
+    'subnet_add', "POST", "/subnet/add", compute=_subnet_add, invalidates=('network_address',),
+    fields=(computed("network_address"),) + _OCTETS + (
+        computed("network_mask"),
+        computed("mask_length"),
+        optional("organization_id", ""),
+        optional("organization_name", ""),
+        required("name"),
+        optional("description", ""),
+        optional("createRevZone", "no"),
+        optional("dmzVisible", "no"),
+        optional("dnssec_enable", "no"),
+        optional("nsec_option", "NSEC3"),
+        optional("monitoringService", "no"),
+        optional("enable_discovery", "no"),
+        optional("discovery_template", None),
+        optional("network_id", None),
+        required("primary_domain"),
+        required("routerAddress", "router_address"),
+        optional("primary_dhcp_server", None),
+        optional("template_id", None),
+        optional("cloudProviderId", None),
+        optional("zoneTemplateName", None),
+        optional("extensions", []),
+    )))
+
+SUBNET_DATA = register(Endpoint(
+    'subnet_data', "GET", "/subnet/getSubnetData",
+    compute=lambda subnet_obj: {"subnet_address": normalize_prefix(subnet_obj['subnet_address'])[0]},
+    cache=SUBNET, cache_fields=('organization_name', 'subnet_address'),
+    fields=(computed("subnet_address"), required("org_name", "organization_name"))))
+
+
+def _subnet_paged(subnet_obj, page_size=100):
+    return {"network_address": normalize_prefix(subnet_obj['network_address'])[0], "length": page_size}
+
+
+SUBNET_PAGED = register(Endpoint(
+    'subnet_paged', "GET", "/subnet/paged", compute=_subnet_paged, paged=True,
+    fields=(computed("network_address"), required("org_name", "organization_name"), constant("start", 0),
+            computed("length"), constant("sort", "fullAddress"), constant("order", "asc"))))
+
+SUBNET_DELETE = register(Endpoint(
+    'subnet_delete', "POST", "/subnet/delete", delete=True, batch="addressList", invalidates=('address_list',),
+    fields=(required("addressList", "address_list"), required("organizationName", "organization_name"),
+            constant("isDeleterrsChecked", 1))))
+
+NEXT_FREE_IP = register(Endpoint(
+    'next_free_ip', "GET", "/object/getNextFreeIP",
+    compute=lambda subnet_obj: {"subnet_addr": normalize_prefix(subnet_obj['subnet_address'])[0]},
+    fields=(required("org_name", "organization_name"), computed("subnet_addr"))))
+
+
+def _address_array(ip_obj):
+    if 'address_array' in ip_obj:
+        return [str(address) for address in ip_obj['address_array']]
+    return [str(ip_obj["ip_address"])]
+
+
+# either a single 'ip_address' or a whole 'address_array'
+RECLAIM_OBJECTS = register(Endpoint(
+    'reclaim_objects', "POST", "/object/reclaimObjects", delete=True, batch="addressArray",
+    compute=lambda ip_obj: {"addressArray": _address_array(ip_obj)}, invalidates=('ip_address', 'address_array'),
+    fields=(required("organization_name"), constant("isDeleterrsChecked", 0), computed("addressArray"))))
+
+
+def _object_add(ip_obj, ip_address=None, subnet_address=None):
+    address, ip_bits, _ = _ipv4_fields(ip_obj["ip_address"], ip_address)
+    subnet_ip, _, _ = subnet_address or normalize_prefix(ip_obj["subnet_address"])
+    res = _octets(ip_bits)
+    res.update({"name": re.sub(r'\s+', '-', ip_obj['name']), "address": address,
+                "alloc_type": int(ip_obj.get('alloc_type') or '1'), "subnet_address": subnet_ip})
+    return res
+
+
+OBJECT_ADD = register(Endpoint(
+    'object_add', "POST", "/object/add", compute=_object_add, invalidates=('ip_address',),
+    fields=(required("organization_name"), computed("name"), computed("address")) + _OCTETS + (
+        optional("class_code", 'Others'),
+        required("domain_name"),
+        computed("alloc_type"),
+        optional("mac", None),
+        computed("subnet_address"),
+        optional("update_ns_a", True),
+        optional("update_ns_ptr", True),
+        optional("dyn_update_rrs_a", True),
+        optional("dyn_update_rrs_ptr", True),
+        optional("dyn_update_rrs_cname", True),
+        optional("dyn_update_rrs_mx", True),
+    )))
+
+# payload builders, kept under the names callers already use
+network_add = NETWORK_ADD.build
+network_details_by_ip = NETWORK_DETAILS_BY_IP.build
+network_paged = NETWORK_PAGED.build
+network_delete = NETWORK_DELETE.build
+subnet_add = SUBNET_ADD.build
+subnet_data = SUBNET_DATA.build
+subnet_paged = SUBNET_PAGED.build
+subnet_delete = SUBNET_DELETE.build
+next_free_ip = NEXT_FREE_IP.build
+reclaim_objects = RECLAIM_OBJECTS.build
+object_add = OBJECT_ADD.build
@@ -0,0 +1,194 @@
+import atexit
+import threading
+import time
+
+from tcpwave_client.connector import Connector
+from tcpwave_client.hosts import HostSet
+from tcpwave_client.hosts import MultiHostConnector
+from tcpwave_client.hosts import parse_hosts
+
+
+class ConnectorPool(object):
+    """
+    Registry of long-lived connectors keyed by (host, cert, key, verify, port),
+    and of MultiHostConnectors keyed by their hosts and credentials.
+    Connectors handed out by the pool keep their session and keep-alive
+    connections warm across calls, so the TLS handshake with IPAM is paid
+    once per connector instead of once per operation.
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=10, max_retries=3, idle_timeout=300, hooks=(),
+                 retry=None, limiter=None, concurrency=None, breaker=None, connect_timeout=10.0, read_timeout=120.0,
+                 single_flight=None, serializer=None):
+        """
+        :param pool_connections: number of connection pools cached by every connector
+        :param pool_maxsize: maximum number of keep-alive connections per connector
+        :param max_retries:
+        :param idle_timeout: seconds after which an unused connector is closed, None disables eviction
+        :param hooks: RequestHook instances registered with every connector of the pool
+        :param retry: RetryPolicy used by every connector of the pool
+        :param limiter: RateLimiter shared by every connector of the pool
+        :param concurrency: AdaptiveConcurrency shared by every connector of the pool
+        :param breaker: CircuitBreaker shared by every connector of the pool
+        :param connect_timeout: connect timeout of every connector of the pool
+        :param read_timeout: read timeout of every connector of the pool
+        :param single_flight: SingleFlight shared by every connector of the pool
+        :param serializer: json serializer or backend name used by every connector of the pool
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.idle_timeout = idle_timeout
+        self.hooks = tuple(hooks)
+        self.retry = retry
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.breaker = breaker
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.single_flight = single_flight
+        self.serializer = serializer
+        self._connectors = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return len(self._connectors)
+
+    def get(self, host, cert, key, verify=False, port=7443):
+        """
+        Return the connector registered for the given host and credentials,
+        creating it on first use.
+        :param host:
+        :param cert:
+        :param key:
+        :param verify:
+        :param port:
+        :return:
+        """
+        conn_key = (host, cert, key, verify, port)
+        with self._lock:
+            self._evict_idle()
+            conn = self._connectors.get(conn_key)
+            if conn is None or conn.closed:
+                conn = Connector(cert=cert, key=key, verify=verify, host=host, port=port,
+                                 pool_connections=self.pool_connections,
+                                 pool_maxsize=self.pool_maxsize,
+                                 max_retries=self.max_retries, hooks=self.hooks, retry=self.retry,
+                                 limiter=self.limiter, concurrency=self.concurrency,
+                                 breaker=self.breaker, connect_timeout=self.connect_timeout,
+                                 read_timeout=self.read_timeout, single_flight=self.single_flight,
+                                 serializer=self.serializer)
+                self._connectors[conn_key] = conn
+        return conn
+
+    def get_multi(self, hosts, cert, key, verify=False, port=7443, probe_interval=None, **host_set_args):
+        """
+        Return the MultiHostConnector registered for the given hosts and
+        credentials, so host health is shared by every client using them.
+        :param hosts: list of host names or dicts with host, role, weight and port, see parse_hosts
+        :param cert:
+        :param key:
+        :param verify:
+        :param port: default port
+        :param probe_interval: seconds between active health probes, None disables probing
+        :param host_set_args: passed to HostSet (max_failures, down_time, read_from_primary)
+        :return:
+        """
+        entries = parse_hosts(hosts, port)
+        conn_key = (tuple((entry['host'], entry['role'], entry['weight'], entry['port']) for entry in entries),
+                    cert, key, verify)
+        with self._lock:
+            self._evict_idle()
+            conn = self._connectors.get(conn_key)
+            if conn is None or conn.closed:
+                conn = MultiHostConnector(self, HostSet(entries, port, **host_set_args), cert, key, verify,
+                                          probe_interval=probe_interval)
+                self._connectors[conn_key] = conn
+        return conn
+
+    def get_for_provider(self, provider):
+        """
+        Return the connector for a provider dict as used by NetworkManager
+        :param provider:
+        :return:
+        """
+        if provider.get('hosts'):
+            return self.get_multi(provider['hosts'], provider.get('cert'), provider.get('key'),
+                                  provider.get('verify', False), provider.get('port', 7443),
+                                  provider.get('probe_interval'))
+        return self.get(provider['host'], provider.get('cert'), provider.get('key'),
+                        provider.get('verify', False), provider.get('port', 7443))
+
+    def add_hook(self, hook):
+        """
+        Register a RequestHook with the current and all future connectors
+        :param hook:
+        :return:
+        """
+        with self._lock:
+            self.hooks = self.hooks + (hook,)
+            for conn in self._connectors.values():
+                conn.add_hook(hook)
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self.hooks = tuple(h for h in self.hooks if h is not hook)
+            for conn in self._connectors.values():
+                conn.remove_hook(hook)
+
+    def evict_idle(self):
+        """
+        Close connectors that have not been used for idle_timeout seconds.
+        :return:
+        """
+        with self._lock:
+            self._evict_idle()
+
+    def _evict_idle(self):
+        if self.idle_timeout is None or not self._connectors:
+            return
+        now = time.monotonic()
+        for conn_key, conn in list(self._connectors.items()):
+            if conn.in_flight == 0 and now - conn.last_used > self.idle_timeout:
+                del self._connectors[conn_key]
+                conn.close()
+
+    def close(self):
+        """
+        Close every registered connector.
+        :return:
+        """
+        with self._lock:
+            connectors = list(self._connectors.values())
+            self._connectors.clear()
+        for conn in connectors:
+            conn.close()
+
+
+_default_pool = ConnectorPool()
+atexit.register(lambda: _default_pool.close())
+
+
+def get_default_pool():
+    """
+    Return the process-wide pool used by NetworkManager
+    :return:
+    """
+    return _default_pool
+
+
+def set_default_pool(pool):
+    """
+    Replace the process-wide pool, closing the previous one.
+    :param pool:
+    :return:
+    """
+    global _default_pool
+    old_pool, _default_pool = _default_pool, pool
+    if old_pool is not pool:
+        old_pool.close()
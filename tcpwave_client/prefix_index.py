@@ -0,0 +1,220 @@
+import ipaddress
+
+
+class _Node(object):
+    __slots__ = ('zero', 'one', 'network', 'value')
+
+    def __init__(self):
+        self.zero = None
+        self.one = None
+        self.network = None
+        self.value = None
+
+
+def record_prefix(record):
+    """
+    Prefix of a network or subnet record as returned by /network/paged or /subnet/paged
+    :param record:
+    :return:
+    """
+    if record.get('fullAddress'):
+        return ipaddress.ip_network(record['fullAddress'], strict=False)
+    address = record.get('address') or record.get('network_address')
+    mask = record.get('mask_length') or record.get('maskLength') or record.get('network_mask')
+    if mask is None:
+        return ipaddress.ip_network(address, strict=False)
+    return ipaddress.ip_network("%s/%s" % (address, mask), strict=False)
+
+
+class PrefixIndex(object):
+    """
+    Binary radix trie over IPv4 and IPv6 prefixes. Each prefix maps to one
+    value (typically the record it came from). Lookups walk at most
+    prefix-length nodes, so longest-prefix match, containment and overlap
+    queries do not depend on the number of indexed prefixes.
+    """
+    def __init__(self):
+        self._roots = {4: _Node(), 6: _Node()}
+        self._size = 0
+
+    @classmethod
+    def from_records(cls, records, key=record_prefix):
+        """
+        Build an index from listing results such as list_all_subnets()
+        :param records: iterable of records
+        :param key: callable returning the prefix of a record
+        :return:
+        """
+        index = cls()
+        for record in records:
+            index.insert(key(record), record)
+        return index
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, prefix):
+        node = self._find(ipaddress.ip_network(prefix, strict=False))
+        return node is not None and node.network is not None
+
+    def __iter__(self):
+        for version in (4, 6):
+            for item in self._walk(self._roots[version]):
+                yield item
+
+    @staticmethod
+    def _bits(network):
+        return int(network.network_address), network.max_prefixlen
+
+    def _find(self, network, create=False):
+        node = self._roots[network.version]
+        value, width = self._bits(network)
+        for i in range(network.prefixlen):
+            if (value >> (width - 1 - i)) & 1:
+                child = node.one
+                if child is None:
+                    if not create:
+                        return None
+                    child = node.one = _Node()
+            else:
+                child = node.zero
+                if child is None:
+                    if not create:
+                        return None
+                    child = node.zero = _Node()
+            node = child
+        return node
+
+    def _walk(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.network is not None:
+                yield node.network, node.value
+            if node.one is not None:
+                stack.append(node.one)
+            if node.zero is not None:
+                stack.append(node.zero)
+
+    def insert(self, prefix, value=None):
+        """
+        Add or replace a prefix
+        :param prefix:
+        :param value:
+        :return:
+        """
+        network = ipaddress.ip_network(prefix, strict=False)
+        node = self._find(network, create=True)
+        if node.network is None:
+            self._size += 1
+        node.network = network
+        node.value = value
+
+    def get(self, prefix, default=None):
+        """
+        Value stored for exactly this prefix
+        :param prefix:
+        :param default:
+        :return:
+        """
+        node = self._find(ipaddress.ip_network(prefix, strict=False))
+        if node is None or node.network is None:
+            return default
+        return node.value
+
+    def delete(self, prefix):
+        """
+        Remove a prefix, pruning nodes that no longer lead anywhere
+        :param prefix:
+        :return: True when the prefix was indexed
+        """
+        network = ipaddress.ip_network(prefix, strict=False)
+        node = self._roots[network.version]
+        value, width = self._bits(network)
+        path = []
+        for i in range(network.prefixlen):
+            bit = (value >> (width - 1 - i)) & 1
+            path.append((node, bit))
+            node = node.one if bit else node.zero
+            if node is None:
+                return False
+        if node.network is None:
+            return False
+        node.network = None
+        node.value = None
+        self._size -= 1
+        for parent, bit in reversed(path):
+            if node.network is not None or node.zero is not None or node.one is not None:
+                break
+            if bit:
+                parent.one = None
+            else:
+                parent.zero = None
+            node = parent
+        return True
+
+    def longest_match(self, address):
+        """
+        Most specific indexed prefix containing the address (or prefix)
+        :param address:
+        :return: (network, value) or None
+        """
+        network = ipaddress.ip_network(address, strict=False)
+        node = self._roots[network.version]
+        value, width = self._bits(network)
+        best = None
+        i = 0
+        while node is not None:
+            if node.network is not None:
+                best = node
+            if i == network.prefixlen:
+                break
+            node = node.one if (value >> (width - 1 - i)) & 1 else node.zero
+            i += 1
+        if best is None:
+            return None
+        return best.network, best.value
+
+    def supernets(self, prefix):
+        """
+        Indexed prefixes containing the given prefix, least specific first
+        :param prefix:
+        :return: list of (network, value)
+        """
+        network = ipaddress.ip_network(prefix, strict=False)
+        node = self._roots[network.version]
+        value, width = self._bits(network)
+        res = []
+        i = 0
+        while node is not None:
+            if node.network is not None:
+                res.append((node.network, node.value))
+            if i == network.prefixlen:
+                break
+            node = node.one if (value >> (width - 1 - i)) & 1 else node.zero
+            i += 1
+        return res
+
+    def subnets(self, prefix):
+        """
+        Indexed prefixes contained in the given prefix, including the prefix itself
+        :param prefix:
+        :return: list of (network, value)
+        """
+        node = self._find(ipaddress.ip_network(prefix, strict=False))
+        if node is None:
+            return []
+        return list(self._walk(node))
+
+    def overlaps(self, prefix):
+        """
+        Indexed prefixes overlapping the given prefix, i.e. its supernets and subnets
+        :param prefix:
+        :return: list of (network, value)
+        """
+        network = ipaddress.ip_network(prefix, strict=False)
+        res = self.supernets(network)
+        if res and res[-1][0] == network:
+            res.pop()
+        res.extend(self.subnets(network))
+        return res
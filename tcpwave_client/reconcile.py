@@ -0,0 +1,409 @@
+import collections
+import ipaddress
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from tcpwave_client.deadlines import deadline
+from tcpwave_client.deadlines import submit
+from tcpwave_client.deadlines import time_left
+from tcpwave_client.exceptions import DeadlineExceededException
+from tcpwave_client.exceptions import IPAMException
+from tcpwave_client.prefix_index import PrefixIndex
+from tcpwave_client.prefix_index import record_prefix
+
+CREATE_NETWORK = 'create_network'
+CREATE_SUBNET = 'create_subnet'
+CREATE_IP = 'create_ip'
+RELEASE_IP = 'release_ip'
+DELETE_SUBNET = 'delete_subnet'
+DELETE_NETWORK = 'delete_network'
+
+PRESENT = 'present'
+ABSENT = 'absent'
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+_SYMBOLS = {CREATE_NETWORK: '+', CREATE_SUBNET: '+', CREATE_IP: '+',
+            RELEASE_IP: '-', DELETE_SUBNET: '-', DELETE_NETWORK: '-'}
+
+_CHILDREN = ('subnets', 'ips', 'state')
+
+
+class Step(object):
+    """
+    One client call of a plan. depends holds the keys of the steps that
+    must succeed first.
+    """
+    __slots__ = ('action', 'organization_name', 'address', 'fields', 'depends', 'status', 'result', 'error')
+
+    def __init__(self, action, organization_name, address, fields):
+        self.action = action
+        self.organization_name = organization_name
+        self.address = address
+        self.fields = fields
+        self.depends = set()
+        self.status = PENDING
+        self.result = None
+        self.error = None
+
+    @property
+    def key(self):
+        return self.action, self.organization_name, self.address
+
+    def __repr__(self):
+        kind = self.action.split('_', 1)[1]
+        name = self.fields.get('name')
+        return "%s %s %s %s%s" % (_SYMBOLS[self.action], kind, self.organization_name, self.address,
+                                  ' "%s"' % name if name and _SYMBOLS[self.action] == '+' else '')
+
+
+class Plan(object):
+    """
+    Steps turning the current state into the desired one, in an order
+    that respects their dependencies, plus the drift that cannot be
+    corrected through the API (objects that exist with other attributes).
+    """
+    def __init__(self):
+        self.steps = collections.OrderedDict()
+        self.drift = []
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(self.steps.values())
+
+    def __str__(self):
+        lines = [repr(step) for step in self.ordered()]
+        lines.extend("~ %s" % drift for drift in self.drift)
+        return '\n'.join(lines) or 'no changes'
+
+    def add(self, step):
+        return self.steps.setdefault(step.key, step)
+
+    def ordered(self):
+        """
+        Steps in dependency order
+        :return:
+        """
+        res = []
+        done = set()
+        pending = list(self.steps.values())
+        while pending:
+            ready = [step for step in pending if not (step.depends - done)]
+            if not ready:
+                raise IPAMException("Plan has a dependency cycle")
+            res.extend(ready)
+            done.update(step.key for step in ready)
+            pending = [step for step in pending if step.key not in done]
+        return res
+
+    def by_status(self, status):
+        return [step for step in self.steps.values() if step.status == status]
+
+    @property
+    def failed(self):
+        return self.by_status(FAILED)
+
+    @property
+    def skipped(self):
+        return self.by_status(SKIPPED)
+
+    def summary(self):
+        """
+        Number of steps per action and per status
+        :return:
+        """
+        return {'actions': dict(collections.Counter(step.action for step in self.steps.values())),
+                'statuses': dict(collections.Counter(step.status for step in self.steps.values())),
+                'drift': len(self.drift)}
+
+
+def _fields(obj, **inherited):
+    fields = dict(inherited)
+    fields.update((key, value) for key, value in obj.items() if key not in _CHILDREN)
+    return fields
+
+
+def _prefix(address):
+    return ipaddress.ip_network(address, strict=False)
+
+
+class Reconciler(object):
+    """
+    Declarative reconciliation of networks, subnets and IP objects.
+    plan() diffs the desired state against the current one, fetched with
+    one network listing and concurrent subnet listings, and returns the
+    minimal Plan. apply() runs it as a DAG: networks before their subnets,
+    subnets before their IP objects, deletes in reverse, creates after
+    deletes of overlapping prefixes. Independent branches run concurrently
+    and a failed step skips everything that depends on it.
+
+    The desired state is a list of networks, each with optional 'subnets',
+    each with optional 'ips', using the field names of the client methods.
+    organization_name is inherited by children and subnet_address by IP
+    objects; 'state': 'absent' asks for an object to be removed.
+
+    The API has no listing of IP objects: pass current_ips, a callable
+    (organization_name, subnet prefix) returning the addresses in use, to
+    diff them. Without it IP objects of existing subnets are planned as
+    creates and absent ones as releases.
+    """
+    def __init__(self, client, concurrency=8, prune=False, current_ips=None):
+        """
+        :param client: TimsClient
+        :param concurrency: maximum number of steps or listings in flight
+        :param prune: also delete subnets (and IP objects, with current_ips) of managed networks and
+                      networks of managed organizations that are not in the desired state
+        :param current_ips: callable (organization_name, subnet) -> iterable of addresses in use
+        """
+        self.client = client
+        self.concurrency = max(concurrency or 1, 1)
+        self.prune = prune
+        self.current_ips = current_ips
+
+    def _current_subnets(self, executor, networks):
+        futures = dict((submit(executor, self.client.list_all_subnets,
+                               {'organization_name': org, 'network_address': str(prefix)}), (org, prefix))
+                       for org, prefix in networks)
+        res = {}
+        for future, key in futures.items():
+            res[key] = dict(((key[0], record_prefix(record)), record) for record in future.result())
+        return res
+
+    def plan(self, desired, timeout=None):
+        """
+        Diff the desired state against the appliance
+        :param desired: list of network dicts
+        :param timeout: seconds allowed for reading the current state
+        :return: Plan
+        """
+        wanted = self._normalize(desired)
+        with deadline(timeout), ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            current = dict(((record.get('organization_name'), record_prefix(record)), record)
+                           for record in self.client.list_all_networks())
+            orgs = set(org for org, _ in wanted)
+            listed = [key for key in current
+                      if key in wanted or (self.prune and key[0] in orgs)]
+            subnets = self._current_subnets(executor, listed)
+        plan = Plan()
+        for key, (state, fields, wanted_subnets) in wanted.items():
+            exists = key in current
+            if state == ABSENT:
+                if exists:
+                    self._delete_network(plan, key, subnets.get(key, {}))
+                continue
+            if not exists:
+                step = plan.add(Step(CREATE_NETWORK, key[0], str(key[1]), fields))
+                self._plan_subnets(plan, key, wanted_subnets, {}, step)
+                continue
+            self._check_drift(plan, 'network', key, fields, current[key])
+            self._plan_subnets(plan, key, wanted_subnets, subnets.get(key, {}), None)
+        if self.prune:
+            for key in listed:
+                if key not in wanted:
+                    self._delete_network(plan, key, subnets.get(key, {}))
+        self._order(plan)
+        return plan
+
+    def _normalize(self, desired):
+        wanted = collections.OrderedDict()
+        for network in desired:
+            org = network.get('organization_name')
+            prefix = _prefix(network['network_address'])
+            network_fields = _fields(network, network_address=str(prefix))
+            subnets = collections.OrderedDict()
+            for subnet in network.get('subnets') or []:
+                subnet_org = subnet.get('organization_name', org)
+                subnet_prefix = _prefix(subnet['network_address'])
+                if not subnet_prefix.subnet_of(prefix):
+                    raise IPAMException("Subnet %s is not in network %s" % (subnet_prefix, prefix))
+                ips = collections.OrderedDict()
+                for ip in subnet.get('ips') or []:
+                    address = ipaddress.ip_address(ip['ip_address'])
+                    if address not in subnet_prefix:
+                        raise IPAMException("Address %s is not in subnet %s" % (address, subnet_prefix))
+                    ips[(subnet_org, address)] = (ip.get('state', PRESENT),
+                                                  _fields(ip, organization_name=subnet_org,
+                                                          subnet_address=str(subnet_prefix.network_address),
+                                                          ip_address=str(address)))
+                subnets[(subnet_org, subnet_prefix)] = (subnet.get('state', PRESENT),
+                                                        _fields(subnet, organization_name=subnet_org,
+                                                                network_address=str(subnet_prefix)), ips)
+            wanted[(org, prefix)] = (network.get('state', PRESENT), network_fields, subnets)
+        return wanted
+
+    def _plan_subnets(self, plan, network_key, wanted, current, parent):
+        for key, (state, fields, ips) in wanted.items():
+            exists = key in current
+            if state == ABSENT:
+                if exists:
+                    self._delete_subnet(plan, key)
+                continue
+            if not exists:
+                step = plan.add(Step(CREATE_SUBNET, key[0], str(key[1]), fields))
+                if parent is not None:
+                    step.depends.add(parent.key)
+                self._plan_ips(plan, key, ips, set(), step)
+                continue
+            self._check_drift(plan, 'subnet', key, fields, current[key])
+            in_use = None
+            if self.current_ips is not None:
+                in_use = set(ipaddress.ip_address(address) for address in self.current_ips(key[0], str(key[1])))
+            self._plan_ips(plan, key, ips, in_use, None)
+        if self.prune:
+            for key in current:
+                if key not in wanted:
+                    self._delete_subnet(plan, key)
+
+    def _plan_ips(self, plan, subnet_key, wanted, in_use, parent):
+        for (org, address), (state, fields) in wanted.items():
+            known = in_use is not None
+            if state == ABSENT:
+                if not known or address in in_use:
+                    plan.add(Step(RELEASE_IP, org, str(address),
+                                  {'organization_name': org, 'ip_address': str(address)}))
+                continue
+            if known and address in in_use:
+                continue
+            step = plan.add(Step(CREATE_IP, org, str(address), fields))
+            if parent is not None:
+                step.depends.add(parent.key)
+        if self.prune and in_use:
+            declared = set(address for _, address in wanted)
+            for address in sorted(in_use - declared):
+                fields = {'organization_name': subnet_key[0], 'ip_address': str(address)}
+                plan.add(Step(RELEASE_IP, subnet_key[0], str(address), fields))
+
+    def _delete_subnet(self, plan, key):
+        org, prefix = key
+        fields = {'organization_name': org, 'address_list': [str(prefix.network_address)]}
+        return plan.add(Step(DELETE_SUBNET, org, str(prefix), fields))
+
+    def _delete_network(self, plan, key, subnets):
+        org, prefix = key
+        fields = {'organization_name': org, 'address': str(prefix.network_address)}
+        step = plan.add(Step(DELETE_NETWORK, org, str(prefix), fields))
+        for subnet_key in subnets:
+            step.depends.add(self._delete_subnet(plan, subnet_key).key)
+
+    @staticmethod
+    def _check_drift(plan, kind, key, fields, record):
+        name = fields.get('name')
+        if name is not None and record.get('name') != name:
+            plan.drift.append("%s %s %s name %r, desired %r (not changed, the API has no update)" %
+                              (kind, key[0], key[1], record.get('name'), name))
+
+    @staticmethod
+    def _order(plan):
+        """
+        Creates wait for deletes of overlapping prefixes, e.g. when a subnet is resized,
+        and subnet deletes wait for the releases planned inside them
+        """
+        after = {CREATE_NETWORK: DELETE_NETWORK, CREATE_SUBNET: DELETE_SUBNET, CREATE_IP: RELEASE_IP,
+                 DELETE_SUBNET: RELEASE_IP}
+        prefixes = dict((step.key, _prefix(step.address)) for step in plan)
+        # deletes and releases indexed per action and organization, so overlaps are looked up, not scanned
+        indexes = {}
+        for step in plan:
+            if step.action in (DELETE_NETWORK, DELETE_SUBNET, RELEASE_IP):
+                index = indexes.setdefault((step.action, step.organization_name), PrefixIndex())
+                prefix = prefixes[step.key]
+                keys = index.get(prefix)
+                if keys is None:
+                    index.insert(prefix, [step.key])
+                else:
+                    keys.append(step.key)
+        for step in plan:
+            index = indexes.get((after.get(step.action), step.organization_name))
+            if index is None:
+                continue
+            for _, keys in index.overlaps(prefixes[step.key]):
+                step.depends.update(keys)
+
+    def _run(self, step):
+        call = getattr(self.client, step.action)
+        return call(**step.fields)
+
+    def apply(self, plan, timeout=None):
+        """
+        Run the plan, independent steps concurrently
+        :param plan: Plan
+        :param timeout: seconds allowed for the whole run, steps not started by then are skipped
+        :return: the plan, with status, result and error set on every step
+        """
+        dependents = collections.defaultdict(list)
+        waiting = {}
+        for step in plan:
+            depends = set(key for key in step.depends if key in plan.steps)
+            waiting[step.key] = len(depends)
+            for key in depends:
+                dependents[key].append(step)
+        with deadline(timeout), ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = dict((submit(executor, self._run, step), step) for step in plan if not waiting[step.key])
+            while futures:
+                done, _ = wait(list(futures), time_left(), return_when=FIRST_COMPLETED)
+                if not done:
+                    # deadline passed: nothing new is started, the steps already running are waited for
+                    expired = DeadlineExceededException("Deadline exceeded")
+                    for future, step in list(futures.items()):
+                        if future.cancel():
+                            del futures[future]
+                            self._skip(step, dependents, expired)
+                    wait(list(futures))
+                    for future, step in futures.items():
+                        if self._record(step, future, dependents):
+                            for dependent in dependents[step.key]:
+                                self._skip(dependent, dependents, expired)
+                    break
+                for future in done:
+                    step = futures.pop(future)
+                    if not self._record(step, future, dependents):
+                        continue
+                    for dependent in dependents[step.key]:
+                        waiting[dependent.key] -= 1
+                        if not waiting[dependent.key] and dependent.status == PENDING:
+                            futures[submit(executor, self._run, dependent)] = dependent
+        return plan
+
+    def _record(self, step, future, dependents):
+        """
+        Set the outcome of a finished step, skipping its dependents when it failed
+        :return: whether the step succeeded
+        """
+        try:
+            step.result = future.result()
+        except Exception as ex:
+            step.status = FAILED
+            step.error = ex
+            for dependent in dependents[step.key]:
+                self._skip(dependent, dependents, ex)
+            return False
+        step.status = DONE
+        return True
+
+    def _skip(self, step, dependents, error):
+        if step.status != PENDING:
+            return
+        step.status = SKIPPED
+        step.error = error
+        for dependent in dependents[step.key]:
+            self._skip(dependent, dependents, error)
+
+    def reconcile(self, desired, dry_run=False, timeout=None):
+        """
+        Plan and, unless dry_run, apply
+        :param desired: list of network dicts
+        :param dry_run: only compute the plan
+        :param timeout: seconds allowed for planning and applying together
+        :return: Plan
+        """
+        with deadline(timeout):
+            plan = self.plan(desired)
+            if not dry_run:
+                self.apply(plan)
+        return plan
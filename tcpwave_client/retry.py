@@ -0,0 +1,229 @@
+import asyncio
+import email.utils
+import random
+import time
+
+from requests import exceptions as requests_exceptions
+from urllib3 import exceptions as urllib3_exceptions
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from tcpwave_client.exceptions import APICallFailedException
+
+# the request never reached the server or was refused before being processed,
+# retrying cannot apply a write twice
+NOT_PROCESSED = 'not_processed'
+# the request may have been processed, only idempotent calls or checked writes are retried
+AMBIGUOUS = 'ambiguous'
+
+_SAFE_CONNECT_REASONS = (urllib3_exceptions.NewConnectionError, urllib3_exceptions.ConnectTimeoutError,
+                         urllib3_exceptions.SSLError)
+
+
+def _classify_requests_error(ex):
+    if isinstance(ex, (requests_exceptions.ConnectTimeout, requests_exceptions.SSLError)):
+        return NOT_PROCESSED
+    if isinstance(ex, requests_exceptions.ConnectionError):
+        reason = getattr(ex.args[0], 'reason', None) if ex.args else None
+        if isinstance(reason, _SAFE_CONNECT_REASONS):
+            return NOT_PROCESSED
+        return AMBIGUOUS
+    if isinstance(ex, (requests_exceptions.Timeout, requests_exceptions.ChunkedEncodingError)):
+        return AMBIGUOUS
+    return None
+
+
+def _classify_aiohttp_error(ex):
+    connection_timeout = getattr(aiohttp, 'ConnectionTimeoutError', ())
+    if isinstance(ex, aiohttp.ClientConnectorError) or (connection_timeout and isinstance(ex, connection_timeout)):
+        return NOT_PROCESSED
+    if isinstance(ex, (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError, aiohttp.ClientPayloadError,
+                       asyncio.TimeoutError)):
+        return AMBIGUOUS
+    return None
+
+
+def parse_retry_after(value, now=None):
+    """
+    Seconds to wait according to a Retry-After header, given in seconds or as an http date
+    :param value:
+    :param now: current unix time, for testing
+    :return: seconds or None when the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when is None:
+        return None
+    return max(when.timestamp() - (time.time() if now is None else now), 0.0)
+
+
+class RetryPolicy(object):
+    """
+    When and how long to wait before retrying a failed IPAM call.
+    Delays grow exponentially from backoff_base up to backoff_max with full
+    jitter, so many workers hitting an overloaded appliance spread out
+    instead of retrying in lockstep. Retry-After sent with 429/503 is
+    honoured, and no retry is started that would end after the deadline.
+
+    Calls are only retried when doing so cannot apply a write twice:
+    failures where the request was not processed (connect errors, 429 and
+    503) are retried for every call, failures where it may have been
+    (read timeouts, dropped connections, 502/504) only for idempotent calls
+    or when the caller supplied a write_check telling whether the write
+    already happened.
+    """
+    def __init__(self, max_attempts=4, backoff_base=0.1, backoff_max=10.0, jitter=True,
+                 retry_statuses=(429, 502, 503, 504), not_processed_statuses=(429, 503),
+                 respect_retry_after=True, max_retry_after=60.0, deadline=None, rand=random.random):
+        """
+        :param max_attempts: attempts including the first one
+        :param backoff_base: delay before the first retry
+        :param backoff_max: cap of the delay between attempts
+        :param jitter: pick delays uniformly between 0 and the exponential delay
+        :param retry_statuses: response statuses worth retrying
+        :param not_processed_statuses: statuses telling that the server did not process the request
+        :param respect_retry_after: wait at least as long as a Retry-After header asks for
+        :param max_retry_after: give up instead of waiting longer than this for Retry-After
+        :param deadline: seconds after the first attempt after which no retry is started
+        :param rand: random source returning floats in [0, 1)
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.not_processed_statuses = frozenset(not_processed_statuses)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+        self.deadline = deadline
+        self.rand = rand
+
+    def classify(self, error):
+        """
+        NOT_PROCESSED, AMBIGUOUS or None when the error is not worth retrying
+        :param error:
+        :return:
+        """
+        if isinstance(error, APICallFailedException):
+            if error.status_code not in self.retry_statuses:
+                return None
+            return NOT_PROCESSED if error.status_code in self.not_processed_statuses else AMBIGUOUS
+        if isinstance(error, requests_exceptions.RequestException):
+            return _classify_requests_error(error)
+        if aiohttp is not None and isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+            return _classify_aiohttp_error(error)
+        return None
+
+    def backoff(self, attempt):
+        """
+        Delay before retry number attempt (starting at 1)
+        :param attempt:
+        :return:
+        """
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay *= self.rand()
+        return delay
+
+    def next_delay(self, error, attempt, started, deadline=None):
+        """
+        Seconds to wait before the next attempt, or None to give up
+        :param error: error of the last attempt
+        :param attempt: number of attempts made so far
+        :param started: time.monotonic() of the first attempt
+        :param deadline: time.monotonic() after which nothing may run, combined with the policy deadline
+        :return:
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if self.respect_retry_after and isinstance(error, APICallFailedException):
+            retry_after = parse_retry_after(error.headers.get('Retry-After'))
+            if retry_after is not None:
+                if retry_after > self.max_retry_after:
+                    return None
+                delay = max(delay, retry_after)
+        if self.deadline is not None:
+            deadline = min(deadline, started + self.deadline) if deadline is not None else started + self.deadline
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def allows(self, kind, idempotent, write_check):
+        return kind == NOT_PROCESSED or (kind == AMBIGUOUS and (idempotent or write_check is not None))
+
+
+def _after_check(error, write_check):
+    try:
+        return write_check()
+    except Exception:
+        # the outcome of the write is unknown, report the original failure
+        raise error
+
+
+def call_with_retry(policy, attempt, idempotent=True, write_check=None, sleep=time.sleep, deadline=None):
+    """
+    Run attempt() until it succeeds or the policy gives up
+    :param policy: RetryPolicy
+    :param attempt: callable making one request
+    :param idempotent: whether repeating the call is harmless
+    :param write_check: callable returning the call result when an ambiguous write already happened, else None
+    :param sleep:
+    :param deadline: absolute time.monotonic() deadline
+    :return:
+    """
+    started = time.monotonic()
+    attempts = 0
+    while True:
+        try:
+            return attempt()
+        except Exception as ex:
+            attempts += 1
+            kind = policy.classify(ex)
+            if not policy.allows(kind, idempotent, write_check):
+                raise
+            if kind == AMBIGUOUS and not idempotent:
+                res = _after_check(ex, write_check)
+                if res is not None:
+                    return res
+            delay = policy.next_delay(ex, attempts, started, deadline)
+            if delay is None:
+                raise
+            sleep(delay)
+
+
+async def call_with_retry_async(policy, attempt, idempotent=True, write_check=None, deadline=None):
+    """
+    asyncio counterpart of call_with_retry, attempt and write_check are coroutine functions
+    """
+    started = time.monotonic()
+    attempts = 0
+    while True:
+        try:
+            return await attempt()
+        except Exception as ex:
+            attempts += 1
+            kind = policy.classify(ex)
+            if not policy.allows(kind, idempotent, write_check):
+                raise
+            if kind == AMBIGUOUS and not idempotent:
+                try:
+                    res = await write_check()
+                except Exception:
+                    raise ex
+                if res is not None:
+                    return res
+            delay = policy.next_delay(ex, attempts, started, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
@@ -0,0 +1,124 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+from tcpwave_client.exceptions import IPAMException
+
+
+class JsonSerializer(object):
+    """
+    Standard library json. Request bodies are encoded compactly to utf-8
+    bytes, responses are decoded straight from bytes.
+    """
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonSerializer(JsonSerializer):
+    """
+    orjson, several times faster than json for large listings. Values
+    orjson refuses (e.g. integers beyond 64 bit) fall back to json.
+    """
+    name = 'orjson'
+
+    def dumps(self, obj):
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return super(OrjsonSerializer, self).dumps(obj)
+
+    def loads(self, data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return super(OrjsonSerializer, self).loads(data)
+
+
+class UjsonSerializer(JsonSerializer):
+    """
+    ujson, used when orjson is not installed
+    """
+    name = 'ujson'
+
+    def dumps(self, obj):
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+    def loads(self, data):
+        try:
+            return ujson.loads(data)
+        except ValueError:
+            return super(UjsonSerializer, self).loads(data)
+
+
+# fastest first
+_BACKENDS = (('orjson', orjson, OrjsonSerializer), ('ujson', ujson, UjsonSerializer), ('json', json, JsonSerializer))
+
+
+def get_serializer(name=None):
+    """
+    Serializer for the given backend
+    :param name: 'orjson', 'ujson', 'json' or None for the fastest one installed
+    :return:
+    """
+    for backend, module, cls in _BACKENDS:
+        if name is None and module is not None or name == backend:
+            if module is None:
+                raise IPAMException("%s is not installed" % backend)
+            return cls()
+    raise IPAMException("Unknown serializer %s" % name)
+
+
+_default_serializer = get_serializer()
+
+
+def get_default_serializer():
+    """
+    Return the serializer used by connectors created without one
+    :return:
+    """
+    return _default_serializer
+
+
+def as_serializer(serializer):
+    """
+    Serializer for a connector argument: a serializer, a backend name, or None for the default
+    :param serializer:
+    :return:
+    """
+    if serializer is None:
+        return _default_serializer
+    if isinstance(serializer, str):
+        return get_serializer(serializer)
+    return serializer
+
+
+def set_default_serializer(serializer):
+    """
+    Replace the default serializer, connectors created afterwards use it
+    :param serializer: serializer, backend name, or None for the fastest one installed
+    :return:
+    """
+    global _default_serializer
+    _default_serializer = get_serializer() if serializer is None else as_serializer(serializer)
+
+
+def loads(data):
+    """
+    Decode json text or bytes with the default serializer
+    :param data:
+    :return:
+    """
+    return _default_serializer.loads(data)
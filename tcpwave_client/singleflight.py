@@ -0,0 +1,146 @@
+import asyncio
+import threading
+
+from tcpwave_client.deadlines import bounded
+from tcpwave_client.deadlines import current_deadline
+from tcpwave_client.exceptions import DeadlineExceededException
+
+
+def request_key(identity, url, params):
+    """
+    Key of a GET: credentials, url (host, port and rel_url) and params in any order
+    :param identity: hashable telling apart callers that may see different data
+    :param url:
+    :param params:
+    :return:
+    """
+    return identity, url, tuple(sorted((params or {}).items()))
+
+
+class _Call(object):
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _expired_elsewhere(error):
+    """
+    Whether the shared call ran out of the leader's time while the caller still has some
+    """
+    if not isinstance(error, DeadlineExceededException):
+        return False
+    current = current_deadline()
+    return current is None or not current.expired
+
+
+class SingleFlight(object):
+    """
+    Coalesces identical concurrent reads: while a call for a key is in
+    flight, callers asking for the same key wait for it and share its
+    result (or exception) instead of sending their own request. Nothing is
+    kept once the call finished, it is not a cache. Results are shared
+    between callers and must not be modified.
+
+    One instance serves threads (do) and asyncio tasks (do_async) and can
+    be shared by several connectors, e.g. through ConnectorPool.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+
+    def forget(self):
+        """
+        Let callers arriving from now on start new calls instead of joining
+        the ones in flight, e.g. after a write that in-flight reads may miss
+        :return:
+        """
+        with self._lock:
+            self._calls.clear()
+            self._async_calls.clear()
+
+    def do(self, key, func):
+        """
+        Return func(), or the outcome of the call for key already in flight
+        :param key: hashable identifying the request
+        :param func: callable making the request
+        :return:
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.calls += 1
+                else:
+                    self.shared += 1
+            if leader:
+                return self._lead(key, call, func)
+            if not call.event.wait(bounded(None)):
+                raise DeadlineExceededException("Deadline exceeded waiting for a shared request")
+            if call.error is None:
+                return call.result
+            if not _expired_elsewhere(call.error):
+                raise call.error
+
+    def _lead(self, key, call, func):
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.event.set()
+
+    async def do_async(self, key, func):
+        """
+        asyncio counterpart of do, func is a coroutine function. The shared
+        call runs in its own task, so cancelling one caller does not cancel
+        it for the others.
+        :param key:
+        :param func:
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                task = self._async_calls.get((loop, key))
+                if task is None or task.done():
+                    task = self._async_calls[(loop, key)] = asyncio.ensure_future(func())
+                    task.add_done_callback(lambda done, loop_key=(loop, key): self._done(loop_key, done))
+                    self.calls += 1
+                else:
+                    self.shared += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), bounded(None))
+            except asyncio.TimeoutError:
+                if task.done():
+                    raise
+                raise DeadlineExceededException("Deadline exceeded waiting for a shared request")
+            except DeadlineExceededException as ex:
+                if not _expired_elsewhere(ex):
+                    raise
+
+    def _done(self, loop_key, task):
+        with self._lock:
+            if self._async_calls.get(loop_key) is task:
+                del self._async_calls[loop_key]
+
+    def stats(self):
+        """
+        Calls made and callers that joined a call in flight instead
+        :return:
+        """
+        with self._lock:
+            return {'calls': self.calls, 'shared': self.shared,
+                    'in_flight': len(self._calls) + len(self._async_calls)}
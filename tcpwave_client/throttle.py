@@ -0,0 +1,288 @@
+import asyncio
+import threading
+import time
+
+READ = 'read'
+WRITE = 'write'
+
+# responses telling that the appliance is overloaded rather than rejecting the request
+OVERLOAD_STATUSES = frozenset((429, 502, 503, 504))
+
+
+def request_class(method):
+    """
+    READ for GET requests, WRITE for everything else
+    :param method:
+    :return:
+    """
+    return READ if method == 'GET' else WRITE
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket refilled at rate tokens per second up to burst.
+    Callers reserve tokens up front and sleep for the debt, so waiting
+    threads and asyncio tasks are served in arrival order and share one lock.
+    """
+    def __init__(self, rate, burst=None, timer=time.monotonic):
+        """
+        :param rate: tokens added per second
+        :param burst: bucket size, defaults to one second worth of tokens
+        :param timer:
+        """
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.timer = timer
+        self._tokens = self.burst
+        self._updated = timer()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens if available without waiting
+        :param tokens:
+        :return: True when the tokens were taken
+        """
+        with self._lock:
+            self._refill(self.timer())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def reserve(self, tokens=1, max_wait=None):
+        """
+        Take tokens, going into debt when the bucket is empty
+        :param tokens:
+        :param max_wait: do not reserve when the wait would be longer
+        :return: seconds to wait before using the tokens, None when max_wait would be exceeded
+        """
+        with self._lock:
+            self._refill(self.timer())
+            wait = max(tokens - self._tokens, 0.0) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= tokens
+            return wait
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Wait until tokens are available and take them
+        :param tokens:
+        :param timeout: maximum seconds to wait
+        :return: True, or False when timeout would be exceeded (no tokens are taken then)
+        """
+        wait = self.reserve(tokens, timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def acquire_async(self, tokens=1, timeout=None):
+        """
+        asyncio counterpart of acquire
+        """
+        wait = self.reserve(tokens, timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+
+class RateLimiter(object):
+    """
+    Token buckets per (host, request class). Share one limiter between all
+    connectors talking to an appliance (e.g. through ConnectorPool) to cap the
+    request rate of the whole process; reads and writes are limited separately.
+    """
+    def __init__(self, read_rate=None, write_rate=None, read_burst=None, write_burst=None, timer=time.monotonic):
+        """
+        :param read_rate: GET requests per second and host, None for no limit
+        :param write_rate: POST/PUT/DELETE requests per second and host, None for no limit
+        :param read_burst: read bucket size
+        :param write_burst: write bucket size
+        :param timer:
+        """
+        self.limits = {READ: (read_rate, read_burst), WRITE: (write_rate, write_burst)}
+        self.timer = timer
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host, kind):
+        """
+        Bucket of a host and request class, None when the class is not limited
+        :param host:
+        :param kind: READ or WRITE
+        :return:
+        """
+        key = (host, kind)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits[kind]
+            if rate is None:
+                return None
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(rate, burst, self.timer)
+        return bucket
+
+    def acquire(self, host, method, timeout=None):
+        """
+        Wait for a token of the host and request class
+        :param host:
+        :param method: http method
+        :param timeout: maximum seconds to wait
+        :return: True, or False when timeout would be exceeded
+        """
+        bucket = self.bucket(host, request_class(method))
+        if bucket is not None:
+            return bucket.acquire(timeout=timeout)
+        return True
+
+    async def acquire_async(self, host, method, timeout=None):
+        bucket = self.bucket(host, request_class(method))
+        if bucket is not None:
+            return await bucket.acquire_async(timeout=timeout)
+        return True
+
+
+class _AIMDLimit(object):
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.limit = float(controller.initial)
+        self.in_flight = 0
+        self.baseline = None
+        self.since_decrease = 0
+        self.condition = threading.Condition(threading.Lock())
+        self.async_waiters = []
+
+    def try_acquire(self):
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def on_sample(self, latency, overloaded):
+        controller = self.controller
+        if latency is not None and not overloaded:
+            self.baseline = latency if self.baseline is None else min(latency, self.baseline * controller.drift)
+        threshold = controller.latency_target
+        if threshold is None and self.baseline is not None:
+            threshold = self.baseline * controller.tolerance
+        slow = latency is not None and threshold is not None and latency > threshold
+        self.since_decrease += 1
+        if overloaded or slow:
+            # decrease at most once per window of limit completions, so one burst
+            # of failures does not collapse the limit to its minimum
+            if self.since_decrease >= self.limit:
+                self.limit = max(controller.min_limit, self.limit * controller.decrease)
+                self.since_decrease = 0
+        else:
+            self.limit = min(controller.max_limit, self.limit + controller.increase / self.limit)
+
+    def wake(self):
+        self.condition.notify_all()
+        waiters, self.async_waiters = self.async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveConcurrency(object):
+    """
+    AIMD limit on requests in flight per host. Every response that is fast
+    and not an overload signal raises the limit by about one per window of
+    limit requests; timeouts, connection errors, 429/502/503/504 or latency
+    above tolerance times the best observed latency cut it by the decrease
+    factor. The limit settles just below the point where the appliance
+    starts queueing, which gives the highest throughput it can sustain.
+    """
+    def __init__(self, initial=8, min_limit=1, max_limit=64, increase=1.0, decrease=0.5, tolerance=2.0,
+                 latency_target=None, drift=1.001):
+        """
+        :param initial: starting limit
+        :param min_limit:
+        :param max_limit:
+        :param increase: additive increase per window
+        :param decrease: multiplicative decrease factor
+        :param tolerance: latency above tolerance times the baseline counts as overload
+        :param latency_target: fixed latency threshold in seconds instead of the measured baseline
+        :param drift: factor by which the baseline may grow per sample, lets it follow a slower server
+        """
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.latency_target = latency_target
+        self.drift = drift
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def _get(self, host):
+        limit = self._limits.get(host)
+        if limit is None:
+            with self._lock:
+                limit = self._limits.setdefault(host, _AIMDLimit(self))
+        return limit
+
+    def acquire(self, host, timeout=None):
+        """
+        Wait for a free slot of the host
+        :param host:
+        :param timeout:
+        :return: True, or False on timeout
+        """
+        limit = self._get(host)
+        with limit.condition:
+            return limit.condition.wait_for(limit.try_acquire, timeout)
+
+    async def acquire_async(self, host):
+        limit = self._get(host)
+        while True:
+            with limit.condition:
+                if limit.try_acquire():
+                    return True
+                future = asyncio.get_running_loop().create_future()
+                limit.async_waiters.append((asyncio.get_running_loop(), future))
+            await future
+
+    def release(self, host, latency=None, overloaded=False):
+        """
+        Free the slot and feed the outcome of the request into the limit
+        :param host:
+        :param latency: seconds the request took, None when it failed without a response
+        :param overloaded: whether the outcome signals an overloaded appliance
+        :return:
+        """
+        limit = self._get(host)
+        with limit.condition:
+            limit.in_flight -= 1
+            limit.on_sample(latency, overloaded)
+            limit.wake()
+
+    def limit(self, host):
+        return int(self._get(host).limit)
+
+    def stats(self):
+        """
+        Current limit, requests in flight and baseline latency per host
+        :return:
+        """
+        with self._lock:
+            limits = list(self._limits.items())
+        return dict((host, {'limit': int(limit.limit), 'in_flight': limit.in_flight, 'baseline': limit.baseline})
+                    for host, limit in limits)
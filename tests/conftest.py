@@ -0,0 +1,53 @@
+import pytest
+
+from tcpwave_client import ConnectorPool
+from tcpwave_client import TimsClient
+from tcpwave_client.fake_server import FakeTimsServer
+from tcpwave_client.fake_server import generate_certificates
+
+
+@pytest.fixture(scope="session")
+def tims_certs(tmp_path_factory):
+    """
+    Certificates shared by every fake server of the run, generated once
+    :return:
+    """
+    return generate_certificates(str(tmp_path_factory.mktemp('fake-tims')))
+
+
+@pytest.fixture
+def make_server(tims_certs):
+    """
+    Factory starting fake servers with the shared certificates, stopped after the test
+    :return:
+    """
+    servers = []
+
+    def make(**kwargs):
+        server = FakeTimsServer(certs=tims_certs, **kwargs).start()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def server(make_server):
+    """
+    Empty fake server, modules seeding it override this fixture
+    :return:
+    """
+    return make_server()
+
+
+@pytest.fixture
+def pool():
+    with ConnectorPool() as pool:
+        yield pool
+
+
+@pytest.fixture
+def client(server, pool):
+    return TimsClient.from_provider(server.provider, pool=pool)
@@ -0,0 +1,77 @@
+import ipaddress
+
+import pytest
+
+from tcpwave_client import IPAMException
+from tcpwave_client import addresses
+from tcpwave_client import payloads
+from tcpwave_client.addresses import normalize_prefixes
+from tcpwave_client.bulk import prepare
+
+VALUES = ['10.0.0.0/8', '10.1.2.3/16', '10.1.2.3', '0.0.0.0/0', '255.255.255.255/32', '10.1.2.3/09',
+          '10.0.0.0/255.255.0.0', '2001:db8::1/64', ipaddress.ip_network('192.168.0.0/24'),
+          '10.0.0.256/24', '10.0.0.01', '10.0.0.0/33', '1.2.3', ' 10.0.0.1', '', None, '2001:db8::/129']
+
+
+@pytest.fixture(params=['numpy', 'ints'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        if addresses.numpy is None:
+            pytest.skip('numpy is not installed')
+        monkeypatch.setattr(addresses, 'NUMPY_MIN_ROWS', 1)
+    else:
+        monkeypatch.setattr(addresses, 'numpy', None)
+    return request.param
+
+
+def expected(value, strict):
+    try:
+        network = ipaddress.ip_network(value, strict=strict)
+    except (ValueError, TypeError):
+        return None
+    address = str(network.network_address)
+    return (address, tuple(address.split('.')) if network.version == 4 else None, network.prefixlen,
+            int(network.network_address))
+
+
+@pytest.mark.parametrize('strict', [False, True])
+def test_same_as_ipaddress(backend, strict):
+    """
+    Every row is normalized exactly like ipaddress.ip_network, invalid rows are all reported
+    :return:
+    """
+    res = normalize_prefixes(VALUES * 10, strict=strict)
+    for i, value in enumerate(VALUES * 10):
+        got = None if i in res.errors else res.fields(i) + (res.networks[i],)
+        assert got == expected(value, strict), value
+    assert res.prefix(0) == '10.0.0.0/8'
+    assert res.versions[7] == (None if strict else 6)
+
+
+def test_check_lists_all_invalid_rows():
+    res = normalize_prefixes(['10.0.0.0/24', '10.0.0.300', '10.0.1.0/24', 'bogus'])
+    assert sorted(res.errors) == [1, 3]
+    with pytest.raises(IPAMException) as info:
+        res.check()
+    assert str(info.value).startswith('2 invalid rows: row 1: ')
+    assert 'row 3: ' in str(info.value)
+    assert normalize_prefixes(['10.0.0.0/24']).check().addresses == ['10.0.0.0']
+
+
+def test_prepare_in_batch():
+    """
+    Payloads built from batch normalized fields are identical to those built one by one
+    :return:
+    """
+    defaults = {'organization_name': 'Tcpwave', 'domain_name': 'tcpwave.com'}
+    items = [dict(defaults, ip_address='10.1.%d.%d' % (i // 250, i % 250 + 1),
+                  subnet_address='10.1.%d.0/24' % (i // 250), name='host %d' % i) for i in range(1000)]
+    items[5]['ip_address'] = '10.1.0.256'
+    items[7]['ip_address'] = '2001:db8::7'
+    del items[9]['subnet_address']
+    prepared, errors = prepare(items, payloads.object_add, ('ip_address', 'subnet_address'))
+    assert sorted(errors) == [5, 7, 9]
+    assert isinstance(errors[9], KeyError)
+    one_by_one, _ = prepare(items, payloads.object_add)
+    assert prepared == one_by_one
+    assert prepared[0][1]['body']['subnet_address'] == '10.1.0.0'
@@ -0,0 +1,180 @@
+import ipaddress
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tcpwave_client import APICallFailedException
+from tcpwave_client import IPAMException
+from tcpwave_client import IPAllocator
+
+ORG = 'Tcpwave'
+SUBNET_PAGED = ('GET', '/subnet/paged')
+
+
+@pytest.fixture
+def server(server):
+    server.state.seed_subnets(ORG, '10.0.0.0/16', 24, 3)
+    server.state.add_subnet(ORG, '10.0.5.0/24', name='Taken', router_address='10.0.5.1')
+    return server
+
+
+class SubnetClient(object):
+    """
+    Keeps the used addresses of one subnet like IPAM would
+    """
+    def __init__(self, subnet, used=()):
+        self.subnet = ipaddress.ip_network(subnet)
+        self.used = set(ipaddress.ip_address(a) for a in used)
+        self.lock = threading.Lock()
+        self.next_free_calls = 0
+
+    def get_next_available_ip(self, subnet_address, organization_name):
+        with self.lock:
+            self.next_free_calls += 1
+            for address in self.subnet.hosts():
+                if address not in self.used:
+                    return str(address)
+
+    def create_ip(self, ip_obj):
+        address = ipaddress.ip_address(ip_obj['ip_address'])
+        with self.lock:
+            if address in self.used:
+                raise APICallFailedException("API call failed. Msg :: address already in use", status_code=400)
+            self.used.add(address)
+        return {'address': str(address)}
+
+
+def test_allocations_are_unique_and_skip_taken_addresses():
+    """
+    Concurrent allocations never hand out the same address
+    :return:
+    """
+    client = SubnetClient('10.0.0.0/24', used=['10.0.0.3', '10.0.0.9'])
+    allocator = IPAllocator(client, '10.0.0.0/24', 'Tcpwave', batch_size=8, low_water=2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        addresses = [a for a, _ in executor.map(lambda i: allocator.allocate(name='host %d' % i), range(100))]
+    assert len(set(addresses)) == 100
+    assert '10.0.0.3' not in addresses and '10.0.0.9' not in addresses
+    assert allocator.allocated == 100
+    assert client.next_free_calls < 100
+
+
+def test_fragmented_subnet_asks_the_server_again():
+    """
+    A rejected guess drops the rest of the guessed run instead of failing through it
+    :return:
+    """
+    used = ['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4'] + ['10.0.0.%d' % i for i in range(6, 41)]
+    client = SubnetClient('10.0.0.0/24', used=used)
+    allocator = IPAllocator(client, '10.0.0.0/24', 'Tcpwave', batch_size=16, low_water=2, max_attempts=1,
+                            background=False)
+    addresses = [allocator.allocate(name='host %d' % i)[0] for i in range(5)]
+    assert addresses == ['10.0.0.5', '10.0.0.41', '10.0.0.42', '10.0.0.43', '10.0.0.44']
+    assert allocator.conflicts == 1
+    assert client.next_free_calls <= 3
+
+
+def test_exhausted_subnet_raises():
+    """
+    An allocation raises once the server has no free address left
+    :return:
+    """
+    client = SubnetClient('10.0.0.0/30')
+    allocator = IPAllocator(client, '10.0.0.0/30', 'Tcpwave', background=False)
+    assert sorted(allocator.allocate()[0] for _ in range(2)) == ['10.0.0.1', '10.0.0.2']
+    client.get_next_available_ip = lambda **kwargs: '10.0.0.2'
+    with pytest.raises(IPAMException, match='No free address'):
+        allocator.allocate()
+
+
+def test_failed_background_refill_is_raised():
+    """
+    An allocation finding the pool empty raises the error of the failed background refill
+    :return:
+    """
+    client = SubnetClient('10.0.0.0/24')
+    allocator = IPAllocator(client, '10.0.0.0/24', 'Tcpwave', batch_size=1, low_water=0)
+    allocator.refill()
+
+    def fail(**kwargs):
+        raise IPAMException("appliance unreachable")
+    client.get_next_available_ip = fail
+    assert allocator.allocate(name='first')[0] == '10.0.0.1'
+    while allocator._refilling:
+        time.sleep(0.01)
+    with pytest.raises(IPAMException, match='unreachable'):
+        allocator.allocate(name='second')
+
+
+def test_subnet_allocator_retries_on_conflict(server, client):
+    """
+    Subnets come from one listing, a block created meanwhile by someone else is skipped
+    :return:
+    """
+    allocator = client.subnet_allocator('10.0.0.0/16', ORG)
+    assert allocator.allocate(24, primary_domain='tcpwave.com')[0] == '10.0.3.0/24'
+    server.state.add_subnet(ORG, '10.0.4.0/24', name='Raced', router_address='10.0.4.1')
+    prefix, _ = allocator.allocate(24, primary_domain='tcpwave.com')
+    assert prefix == '10.0.6.0/24'
+    assert allocator.allocate(23, primary_domain='tcpwave.com')[0] == '10.0.8.0/23'
+    assert (allocator.allocated, allocator.conflicts, allocator.listings) == (3, 1, 1)
+    assert server.request_counts[SUBNET_PAGED] == 1
+    detail = client.get_subnet_detail(organization_name=ORG, subnet_address='10.0.6.0/24')
+    assert detail['routerAddress'] == '10.0.6.1'
+
+
+def test_subnet_allocator_bulk(server, client):
+    """
+    Bulk carving lists the network once and creates unique, non-overlapping subnets
+    :return:
+    """
+    allocator = client.subnet_allocator('10.0.0.0/16', ORG, best_fit=True)
+    allocator.refresh()
+    server.state.add_subnet(ORG, '10.0.3.0/24', name='Raced', router_address='10.0.3.1')
+    prefixlens = [26] * 8 + [24] * 10 + [22]
+    result = allocator.allocate_many(prefixlens, primary_domain='tcpwave.com')
+    assert (result.succeeded, result.failed) == (19, 0)
+    prefixes = [ipaddress.ip_network(result.results[i][0]) for i in range(len(prefixlens))]
+    assert [prefix.prefixlen for prefix in prefixes] == prefixlens
+    assert len(list(ipaddress.collapse_addresses(prefixes))) < len(prefixes)
+    for prefix in prefixes:
+        assert not any(prefix.overlaps(other) for other in prefixes if other != prefix)
+    assert server.request_counts[SUBNET_PAGED] == 1
+    assert allocator.conflicts >= 1
+    with pytest.raises(IPAMException):
+        allocator.allocate(16, primary_domain='tcpwave.com')
+
+
+def test_subnet_allocator_releases_throttled_block(server, client):
+    """
+    A create rejected with 429 may not have been processed, the block goes back to the map
+    :return:
+    """
+    allocator = client.subnet_allocator('10.0.0.0/16', ORG)
+    allocator.refresh()
+    server.fail_next(status=429)
+    with pytest.raises(APICallFailedException):
+        allocator.allocate(24, primary_domain='tcpwave.com')
+    assert allocator.conflicts == 0
+    assert allocator.free.first_fit(24) == ipaddress.ip_network('10.0.3.0/24')
+    assert allocator.allocate(24, primary_domain='tcpwave.com')[0] == '10.0.3.0/24'
+
+
+def test_ip_allocator_keeps_unprocessed_addresses(server, client):
+    """
+    Addresses whose create failed with 503 are neither counted as conflicts nor skipped
+    :return:
+    """
+    allocator = client.ip_allocator('10.0.1.0/24', ORG, background=False)
+    first = ipaddress.ip_address(client.get_next_available_ip(subnet_address='10.0.1.0/24',
+                                                              organization_name=ORG).strip('"'))
+    allocator.refill()
+    for _ in range(3):
+        server.fail_next(status=503)
+        with pytest.raises(APICallFailedException):
+            allocator.allocate(name='host', domain_name='tcpwave.com')
+    assert allocator.conflicts == 0
+    addresses = [allocator.allocate(name='host', domain_name='tcpwave.com')[0] for _ in range(3)]
+    assert addresses == [str(first + i) for i in range(3)]
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from tcpwave_client import APICallFailedException
+from tcpwave_client import AsyncNetworkManager
+from tcpwave_client import AsyncTimsClient
+
+pytest.importorskip('aiohttp')
+
+ORG = 'Tcpwave'
+SUBNET_DATA = ('GET', '/subnet/getSubnetData')
+
+
+@pytest.fixture
+def server(server):
+    server.state.seed_subnets(ORG, '10.0.0.0/16', 24, 3)
+    return server
+
+
+def test_async_network_manager_flow(server):
+    """
+    Every AsyncNetworkManager operation against the stand-in server
+    :return:
+    """
+    provider = server.provider
+
+    def payload(**fields):
+        return json.dumps(dict(fields, provider=provider))
+
+    async def run():
+        try:
+            network = await AsyncNetworkManager.create_network(payload(
+                organization_name=ORG, network_address='10.50.0.0/16', name='Async Network'))
+            assert network['name'] == 'Async Network'
+            detail = await AsyncNetworkManager.get_network_detail(payload(organization_name=ORG,
+                                                                          network_address='10.50.0.0/16'))
+            assert detail['name'] == 'Async Network'
+            networks = await AsyncNetworkManager.list_all_networks(payload(page_size=1))
+            assert sorted(record['address'] for record in networks) == ['10.0.0.0', '10.50.0.0']
+            iterated = [record async for record in AsyncNetworkManager.iter_networks(payload(page_size=1))]
+            assert iterated == networks
+
+            for i in range(3):
+                await AsyncNetworkManager.create_subnet(payload(
+                    organization_name=ORG, network_address='10.50.%d.0/24' % i, name='Async Subnet %d' % i,
+                    router_address='10.50.%d.1' % i, primary_domain='tcpwave.com'))
+            subnet = await AsyncNetworkManager.get_subnet_detail(payload(organization_name=ORG,
+                                                                         subnet_address='10.50.1.0'))
+            assert subnet['fullAddress'] == '10.50.1.0/24'
+            subnets = await AsyncNetworkManager.list_all_subnets(payload(
+                organization_name=ORG, network_address='10.50.0.0/16', page_size=2))
+            assert [record['fullAddress'] for record in subnets] == ['10.50.%d.0/24' % i for i in range(3)]
+            iterated = [record async for record in AsyncNetworkManager.iter_subnets(payload(
+                organization_name=ORG, network_address='10.50.0.0/16', page_size=2, start=1))]
+            assert iterated == subnets[1:]
+            called = await AsyncNetworkManager.call(payload(endpoint='subnet_data', organization_name=ORG,
+                                                            subnet_address='10.50.2.0'))
+            assert called['name'] == 'Async Subnet 2'
+
+            ip_obj = dict(organization_name=ORG, subnet_address='10.50.0.0/24', domain_name='tcpwave.com')
+            ip = (await AsyncNetworkManager.get_next_available_ip(payload(**ip_obj))).strip('"')
+            assert ip == '10.50.0.2'
+            await AsyncNetworkManager.create_ip(payload(ip_address=ip, name='async host', **ip_obj))
+            assert (await AsyncNetworkManager.get_next_available_ip(payload(**ip_obj))).strip('"') == '10.50.0.3'
+            await AsyncNetworkManager.release_ip(payload(organization_name=ORG, ip_address=ip))
+            with pytest.raises(APICallFailedException):
+                await AsyncNetworkManager.release_ip(payload(organization_name=ORG, ip_address=ip))
+
+            addresses = ['10.50.0.%d' % i for i in range(10, 16)]
+            created = await AsyncNetworkManager.create_ips(payload(
+                ip_objects=[{'ip_address': a, 'name': 'bulk %s' % a} for a in addresses] +
+                [{'ip_address': '10.50.0.300', 'name': 'invalid'}], concurrency=3, **ip_obj))
+            assert (created.succeeded, created.failed) == (6, 1)
+            # one chunk holds released and unknown addresses, only the unknown ones fail
+            address_list = addresses[:2] + ['10.50.0.77'] + addresses[2:]
+            released = await AsyncNetworkManager.release_ips(payload(
+                organization_name=ORG, address_list=address_list, chunk_size=len(address_list)))
+            assert released.failed_items(address_list) == ['10.50.0.77']
+            assert released.succeeded == 6
+
+            await AsyncNetworkManager.delete_subnet(payload(organization_name=ORG,
+                                                            address_list=['10.50.%d.0' % i for i in range(3)]))
+            await AsyncNetworkManager.delete_network(payload(organization_name=ORG, address='10.50.0.0/16'))
+            networks = await AsyncNetworkManager.list_all_networks(payload())
+            assert [record['address'] for record in networks] == ['10.0.0.0']
+        finally:
+            await AsyncNetworkManager.close()
+
+    asyncio.run(run())
+
+
+def test_requests_in_flight_are_limited(server):
+    """
+    max_concurrency bounds the requests in flight on one connector
+    :return:
+    """
+    server.latency = 0.1
+
+    async def run():
+        async with AsyncTimsClient.from_provider(server.provider, max_concurrency=2) as client:
+            start = time.monotonic()
+            records = await asyncio.gather(*[client.get_subnet_detail(organization_name=ORG,
+                                                                      subnet_address='10.0.%d.0' % (i % 3))
+                                             for i in range(6)])
+            return records, time.monotonic() - start
+
+    records, elapsed = asyncio.run(run())
+    assert [record['fullAddress'] for record in records] == ['10.0.%d.0/24' % (i % 3) for i in range(6)]
+    assert server.request_counts[SUBNET_DATA] == 6
+    # six requests two at a time take three round trips at least
+    assert elapsed >= 0.3
+
+
+def test_cancelled_call_frees_its_slot(server):
+    """
+    Cancelling a call mid-flight raises CancelledError and releases its request slot
+    :return:
+    """
+    server.latency = 0.5
+
+    async def run():
+        async with AsyncTimsClient.from_provider(server.provider, max_concurrency=1) as client:
+            task = asyncio.ensure_future(client.get_subnet_detail(organization_name=ORG, subnet_address='10.0.0.0'))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            server.latency = 0
+            # the only slot was held by the cancelled call, waiting for it would time out
+            return await asyncio.wait_for(client.get_subnet_detail(organization_name=ORG,
+                                                                   subnet_address='10.0.1.0'), 0.4)
+
+    assert asyncio.run(run())['fullAddress'] == '10.0.1.0/24'
+    assert server.request_counts[SUBNET_DATA] == 2
@@ -0,0 +1,80 @@
+import pytest
+
+from tcpwave_client import CircuitBreaker
+from tcpwave_client import CircuitOpenException
+from tcpwave_client import ConnectorPool
+from tcpwave_client import IPAMException
+from tcpwave_client import RetryPolicy
+from tcpwave_client import TimsClient
+from tcpwave_client.breaker import CLOSED
+from tcpwave_client.breaker import HALF_OPEN
+from tcpwave_client.breaker import OPEN
+from tcpwave_client.fake_server import FakeTimsServer
+
+
+class Clock(object):
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_states():
+    """
+    Opens after consecutive failures, probes after the recovery timeout
+    :return:
+    """
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10, timer=clock)
+    for status in (503, 200, 503, 503):
+        breaker.before('a')
+        breaker.record('a', status)
+    assert breaker.state('a') == OPEN
+    with pytest.raises(CircuitOpenException) as ex:
+        breaker.before('a')
+    assert isinstance(ex.value, IPAMException) and ex.value.retry_in == 10
+    breaker.before('b')
+
+    clock.now = 10
+    assert breaker.state('a') == HALF_OPEN
+    breaker.before('a')
+    with pytest.raises(CircuitOpenException):
+        breaker.before('a')
+    breaker.record_failure('a')
+    assert breaker.state('a') == OPEN
+    clock.now = 20
+    breaker.before('a')
+    breaker.record('a', 200)
+    assert breaker.state('a') == CLOSED
+    assert breaker.stats()['a']['times_opened'] == 2
+    assert breaker.stats()['a']['rejected'] == 2
+
+
+def test_client_fails_fast(tims_certs):
+    """
+    Calls to a failing host stop reaching it once the circuit is open
+    :return:
+    """
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=5, timer=clock)
+    retry = RetryPolicy(backoff_base=0)
+    with FakeTimsServer(certs=tims_certs) as server, ConnectorPool(breaker=breaker, retry=retry) as pool:
+        client = TimsClient.from_provider(server.provider, pool=pool)
+        client.create_network(organization_name='Tcpwave', network_address='10.1.0.0/16', name='Breaker')
+        server.fail_next(4)
+        with pytest.raises(CircuitOpenException):
+            client.get_network_detail(organization_name='Tcpwave', network_address='10.1.0.0/16')
+        assert server.request_counts[('GET', '/network/detailsByIP')] == 3
+        with pytest.raises(CircuitOpenException):
+            client.get_network_detail(organization_name='Tcpwave', network_address='10.1.0.0/16')
+        assert server.request_counts[('GET', '/network/detailsByIP')] == 3
+
+        # the failed probe opens the circuit again, its retry is rejected without a request
+        clock.now = 5
+        with pytest.raises(CircuitOpenException):
+            client.get_network_detail(organization_name='Tcpwave', network_address='10.1.0.0/16')
+        assert server.request_counts[('GET', '/network/detailsByIP')] == 4
+        assert breaker.state('127.0.0.1') == OPEN
+        clock.now = 10
+        assert client.get_network_detail(organization_name='Tcpwave', network_address='10.1.0.0/16')
+        assert breaker.state('127.0.0.1') == CLOSED
@@ -0,0 +1,94 @@
+from tcpwave_client import APICallFailedException
+from tcpwave_client import TimsClient
+from tcpwave_client import payloads
+from tcpwave_client.bulk import prepare
+from tcpwave_client.bulk import run_bulk
+
+
+def test_bulk_reports_every_item():
+    """
+    Invalid and failing items are reported without stopping the others
+    :return:
+    """
+    defaults = {'organization_name': 'Tcpwave', 'subnet_address': '153.168.0.0/16',
+                'domain_name': 'test.tcpwave.com'}
+    items = [dict(defaults, ip_address='153.168.0.%d' % i, name='obj %d' % i) for i in range(1, 21)]
+    items[3]['ip_address'] = '153.168.0.300'
+    prepared, errors = prepare(items, payloads.object_add)
+    assert list(errors) == [3]
+
+    def send(payload):
+        if payload['body']['address'] == '153.168.0.10':
+            raise APICallFailedException("API call failed. Msg :: exists")
+        return payload['body']['name']
+
+    result = run_bulk(send, prepared, len(items), concurrency=4, errors=errors)
+    assert result.succeeded == 18
+    assert sorted(result.errors) == [3, 9]
+    assert result.results[0] == 'obj-1'
+    assert result.requests == 19
+    assert result.ops_per_sec > 0
+
+
+class ReclaimConnector(object):
+    """
+    Records reclaimObjects calls and rejects chunks containing one of the given addresses
+    """
+    closed = False
+
+    def __init__(self, reject, status_code=None):
+        self.reject = set(reject)
+        self.status_code = status_code
+        self.arrays = []
+
+    def delete_object(self, payload):
+        address_array = payload['body']['addressArray']
+        self.arrays.append(address_array)
+        if self.reject.intersection(address_array):
+            raise APICallFailedException("API call failed. Msg :: object in use", status_code=self.status_code)
+        return '{"msg": "Successful"}'
+
+
+def test_release_ips_in_chunks():
+    """
+    Addresses are released in addressArray chunks and failures are traced per address
+    :return:
+    """
+    client = TimsClient('192.168.0.116', '/tmp/client.crt', '/tmp/client.key')
+    client._connector = ReclaimConnector(reject=['10.0.0.7'])
+    addresses = ['10.0.0.%d' % i for i in range(1, 11)] + ['10.0.0.256']
+    result = client.release_ips(addresses, 'Tcpwave', chunk_size=4, concurrency=2)
+    assert sorted(len(array) for array in client._connector.arrays) == [2, 4, 4]
+    assert result.requests == 3
+    assert result.failed_items(addresses) == ['10.0.0.5', '10.0.0.6', '10.0.0.7', '10.0.0.8', '10.0.0.256']
+    assert result.succeeded == 6
+
+
+def test_rejected_release_chunk_is_split():
+    """
+    A chunk rejected with 400 is split until only the addresses the appliance refuses fail
+    :return:
+    """
+    client = TimsClient('192.168.0.116', '/tmp/client.crt', '/tmp/client.key')
+    client._connector = ReclaimConnector(reject=['10.0.0.3', '10.0.0.12'], status_code=400)
+    addresses = ['10.0.0.%d' % i for i in range(1, 17)]
+    result = client.release_ips(addresses, 'Tcpwave', chunk_size=8, concurrency=2)
+    assert result.failed_items(addresses) == ['10.0.0.3', '10.0.0.12']
+    assert result.succeeded == 14
+    assert result.requests == len(client._connector.arrays) < 16
+    released = [address for array in client._connector.arrays if not client._connector.reject.intersection(array)
+                for address in array]
+    assert sorted(released, key=addresses.index) == [a for a in addresses if a not in ('10.0.0.3', '10.0.0.12')]
+
+
+def test_overloaded_release_chunk_is_not_split():
+    """
+    A chunk that failed with 503 may have been applied and is reported as a whole
+    :return:
+    """
+    client = TimsClient('192.168.0.116', '/tmp/client.crt', '/tmp/client.key')
+    client._connector = ReclaimConnector(reject=['10.0.0.3'], status_code=503)
+    addresses = ['10.0.0.%d' % i for i in range(1, 9)]
+    result = client.release_ips(addresses, 'Tcpwave', chunk_size=4)
+    assert result.failed_items(addresses) == addresses[:4]
+    assert len(client._connector.arrays) == 2
@@ -0,0 +1,90 @@
+from tcpwave_client import TTLCache
+from tcpwave_client import TimsClient
+from tcpwave_client.cache import NETWORK
+from tcpwave_client.cache import SUBNET
+from tcpwave_client.cache import cache_key
+
+
+class Clock(object):
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_and_lru_eviction():
+    """
+    Entries expire after ttl and least recently used entries are evicted
+    :return:
+    """
+    clock = Clock()
+    cache = TTLCache(maxsize=2, ttl=10, timer=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    clock.now = 11
+    assert cache.get('a') is None
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 2
+    assert cache.evictions == 1
+
+
+def test_invalidation_during_load_is_not_overwritten():
+    """
+    A load racing with a write does not store the record it read before the write
+    :return:
+    """
+    cache = TTLCache()
+    key = cache_key('ipam', SUBNET, 'Tcpwave', '10.0.3.0/24')
+
+    def load():
+        cache.invalidate('ipam', ['10.0.3.7'])
+        return {'stale': True}
+
+    assert cache.get_or_load(key, load) == {'stale': True}
+    assert cache.get(key) is None
+    assert cache.get_or_load(key, lambda: {'stale': False}) == {'stale': False}
+    assert cache.get(key) == {'stale': False}
+    generation = cache.generation('ipam')
+    cache.clear()
+    assert not cache.set(key, {'stale': True}, generation)
+
+
+class DetailConnector(object):
+    closed = False
+
+    def __init__(self):
+        self.gets = 0
+
+    def get_object(self, payload):
+        self.gets += 1
+        return {'rel_url': payload['rel_url'], 'call': self.gets}
+
+    def create_object(self, payload, idempotent=None, write_check=None):
+        return {'msg': 'Successful'}
+
+
+def test_client_reads_through_and_writes_invalidate():
+    """
+    Repeated detail lookups are served from the cache until a write touches the prefix
+    :return:
+    """
+    cache = TTLCache()
+    client = TimsClient('192.168.0.116', '/tmp/client.crt', '/tmp/client.key', cache=cache)
+    client._connector = DetailConnector()
+    subnet = {'organization_name': 'Tcpwave', 'subnet_address': '153.168.1.0/24'}
+    first = client.get_subnet_detail(subnet)
+    assert client.get_subnet_detail(subnet_address='153.168.1.7/24', organization_name='Tcpwave') is first
+    client.get_network_detail(organization_name='Tcpwave', network_address='153.168.0.0/16')
+    client.get_subnet_detail(organization_name='Tcpwave', subnet_address='10.0.0.0/24')
+    assert client._connector.gets == 3
+
+    client.create_ip(organization_name='Tcpwave', subnet_address='153.168.1.0/24', ip_address='153.168.1.20',
+                     name='host 1', domain_name='test.tcpwave.com')
+    assert cache_key(client.host, SUBNET, 'Tcpwave', '153.168.1.0/24') not in cache._data
+    assert cache_key(client.host, NETWORK, 'Tcpwave', '153.168.0.0/16') not in cache._data
+    assert cache_key(client.host, SUBNET, 'Tcpwave', '10.0.0.0/24') in cache._data
+    assert client.get_subnet_detail(subnet) is not first
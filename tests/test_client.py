@@ -0,0 +1,27 @@
+from tcpwave_client import TimsClient
+from tcpwave_client import payloads
+
+
+def test_client_from_provider():
+    """
+    Provider dict is resolved once into the client
+    :return:
+    """
+    client = TimsClient.from_provider({'cert': '/tmp/client.crt', 'key': '/tmp/client.key', 'host': '192.168.0.116'})
+    assert client.host == '192.168.0.116'
+    assert client.connector is client.connector
+    assert client.connector.host == '192.168.0.116'
+
+
+def test_object_add_payload():
+    """
+    Builds /object/add body from python values
+    :return:
+    """
+    payload = payloads.object_add({'organization_name': 'Tcpwave', 'subnet_address': '153.168.0.0/16',
+                                   'ip_address': '153.168.0.5', 'name': 'tst obj  1',
+                                   'domain_name': 'test.tcpwave.com'})
+    assert payload['rel_url'] == '/object/add'
+    assert payload['body']['name'] == 'tst-obj-1'
+    assert payload['body']['addr4'] == '5'
+    assert payload['body']['subnet_address'] == '153.168.0.0'
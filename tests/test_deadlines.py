@@ -0,0 +1,110 @@
+import time
+
+import pytest
+from requests.exceptions import RequestException
+
+from tcpwave_client import APICallFailedException
+from tcpwave_client import ConnectorPool
+from tcpwave_client import DeadlineExceededException
+from tcpwave_client import RetryPolicy
+from tcpwave_client import TimsClient
+from tcpwave_client import deadline
+from tcpwave_client.bulk import run_bulk
+from tcpwave_client.deadlines import check_deadline
+from tcpwave_client.deadlines import current_deadline
+
+
+@pytest.fixture
+def server(server):
+    server.state.seed_subnets('Tcpwave', '10.0.0.0/16', 24, 40)
+    return server
+
+
+def test_nested_deadlines():
+    """
+    An inner deadline never extends the outer one and None keeps the outer one
+    :return:
+    """
+    assert current_deadline() is None
+    with deadline(1) as outer:
+        with deadline(60) as inner:
+            assert inner is outer
+        with deadline(None) as same:
+            assert same is outer
+        with deadline(0.01) as short:
+            assert short is not outer
+            time.sleep(0.02)
+            with pytest.raises(DeadlineExceededException):
+                check_deadline()
+        assert check_deadline() > 0
+    assert current_deadline() is None
+
+
+def test_read_timeout(server):
+    """
+    A slow appliance fails the call after read_timeout instead of hanging
+    :return:
+    """
+    server.latency = 1.0
+    with ConnectorPool(max_retries=0, read_timeout=0.1) as pool:
+        client = TimsClient.from_provider(server.provider, pool=pool, page_retries=0)
+        start = time.monotonic()
+        with pytest.raises(RequestException):
+            client.list_all_networks(organization_name='Tcpwave')
+        assert time.monotonic() - start < 0.5
+
+
+def test_async_connector_default_timeouts(server):
+    """
+    AsyncConnector bounds connecting and reading like Connector, so a stalled appliance cannot hang it
+    :return:
+    """
+    pytest.importorskip('aiohttp')
+    from tcpwave_client import AsyncConnector
+    provider = server.provider
+    conn = AsyncConnector(cert=provider['cert'], key=provider['key'], host=provider['host'])
+    assert (conn.timeout.total, conn.timeout.connect, conn.timeout.sock_read) == (None, 10.0, 120.0)
+
+
+def test_listing_deadline_covers_pages_and_retries(server):
+    """
+    The timeout bounds the whole listing, pages fetched by the workers included,
+    and no retry is started after it
+    :return:
+    """
+    with ConnectorPool(retry=RetryPolicy(backoff_base=5.0, jitter=False)) as pool:
+        client = TimsClient.from_provider(server.provider, pool=pool, page_size=5, page_concurrency=2)
+        assert len(client.list_all_subnets(organization_name='Tcpwave', network_address='10.0.0.0/16',
+                                           timeout=5)) == 40
+
+        server.latency = 0.1
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceededException):
+            client.list_all_subnets(organization_name='Tcpwave', network_address='10.0.0.0/16', timeout=0.25)
+        assert time.monotonic() - start < 0.5
+
+        server.latency = 0.0
+        server.fail_next(10, status=503)
+        start = time.monotonic()
+        with pytest.raises(APICallFailedException) as info:
+            client.list_all_subnets(organization_name='Tcpwave', network_address='10.0.0.0/16', timeout=1)
+        assert info.value.status_code == 503
+        assert time.monotonic() - start < 1.5
+
+
+def test_bulk_deadline():
+    """
+    Items not sent by the deadline fail with DeadlineExceededException, the others keep their outcome
+    :return:
+    """
+    def send(payload):
+        time.sleep(0.1)
+        return payload
+
+    prepared = list(enumerate(range(10)))
+    start = time.monotonic()
+    result = run_bulk(send, prepared, len(prepared), concurrency=2, timeout=0.15)
+    assert time.monotonic() - start < 0.4
+    assert len(result.results) == 4
+    assert len(result.errors) == 6
+    assert all(isinstance(error, DeadlineExceededException) for error in result.errors.values())
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from tcpwave_client import ConnectorPool
+from tcpwave_client import IPAMException
+from tcpwave_client import NetworkManager
+from tcpwave_client import TTLCache
+from tcpwave_client import TimsClient
+from tcpwave_client import payloads
+from tcpwave_client.endpoints import ENDPOINTS
+from tcpwave_client.endpoints import JSON_HEADERS
+from tcpwave_client.endpoints import get_endpoint
+
+SUBNET_DATA = ('GET', '/subnet/getSubnetData')
+
+
+def test_registry():
+    """
+    Every payload builder comes from a registered endpoint and describes how it is called
+    :return:
+    """
+    assert sorted(ENDPOINTS) == ['network_add', 'network_delete', 'network_details_by_ip', 'network_paged',
+                                 'next_free_ip', 'object_add', 'reclaim_objects', 'subnet_add', 'subnet_data',
+                                 'subnet_delete', 'subnet_paged']
+    for name, endpoint in ENDPOINTS.items():
+        assert getattr(payloads, name) == endpoint.build
+        assert endpoint.idempotent == (endpoint.method == 'GET')
+    paged = [name for name, endpoint in sorted(ENDPOINTS.items()) if endpoint.paged]
+    assert paged == ['network_paged', 'subnet_paged']
+    assert get_endpoint('subnet_delete').batch == 'addressList'
+    with pytest.raises(IPAMException):
+        get_endpoint('network_update')
+
+
+def test_templates_are_copied():
+    """
+    Payloads are fresh dicts, mutable defaults are not shared, unset optional fields keep their defaults
+    :return:
+    """
+    network = {'organization_name': 'Tcpwave', 'network_address': '10.1.2.3/16', 'name': 'Net', 'region': '',
+               'percentageFull': 80}
+    first = payloads.network_add(network)
+    second = payloads.network_add(network)
+    assert first['body'] is not second['body']
+    assert first['body']['rrs'] is not second['body']['rrs']
+    first['body']['rrs'].append('x')
+    assert payloads.network_add(network)['body']['rrs'] == []
+    assert first['headers'] is JSON_HEADERS
+    body = second['body']
+    assert list(body)[:7] == ['address', 'addr1', 'addr2', 'addr3', 'addr4', 'mask_length', 'organization_id']
+    assert (body['address'], body['addr2'], body['mask_length']) == ('10.1.0.0', '1', 16)
+    assert (body['region'], body['percentageFull'], body['nsec_option']) == ('', 80, 'NSEC3')
+    assert get_endpoint('network_add').invalidated(network) == ['10.1.2.3/16']
+
+
+@pytest.fixture
+def server(server):
+    server.state.seed_subnets('Tcpwave', '10.0.0.0/16', 24, 30)
+    return server
+
+
+def test_client_call(server):
+    """
+    call() pages paged endpoints, caches cacheable lookups and invalidates on writes
+    :return:
+    """
+    with ConnectorPool() as pool:
+        client = TimsClient.from_provider(server.provider, pool=pool, page_size=7, cache=TTLCache())
+        assert len(client.call('subnet_paged', organization_name='Tcpwave', network_address='10.0.0.0/16')) == 30
+        lookup = {'organization_name': 'Tcpwave', 'subnet_address': '10.0.3.0/24'}
+        assert client.call('subnet_data', lookup)['fullAddress'] == '10.0.3.0/24'
+        client.call('subnet_data', lookup)
+        assert server.request_counts[SUBNET_DATA] == 1
+        client.call('object_add', organization_name='Tcpwave', ip_address='10.0.3.9', subnet_address='10.0.3.0',
+                    name='host', domain_name='tcpwave.com')
+        client.call('subnet_data', lookup)
+        assert server.request_counts[SUBNET_DATA] == 2
+        client.call('subnet_delete', organization_name='Tcpwave', address_list=['10.0.3.0'])
+        assert len(client.list_all_subnets(organization_name='Tcpwave', network_address='10.0.0.0/16')) == 29
+
+
+def test_network_manager_call(server):
+    payload = {'provider': server.provider, 'endpoint': 'network_paged', 'page_size': 1}
+    assert [network['name'] for network in NetworkManager.call(json.dumps(payload))] == ['10.0.0.0/16']
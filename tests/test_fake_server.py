@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from tcpwave_client import APICallFailedException
+from tcpwave_client import ConnectorPool
+from tcpwave_client import TimsClient
+from tcpwave_client.fake_server import FakeTimsServer
+
+
+@pytest.fixture(scope="module")
+def server(tims_certs):
+    with FakeTimsServer(max_page_size=50, certs=tims_certs) as server:
+        yield server
+
+
+def test_client_flow(server):
+    """
+    Network, subnet and ip flow against the stand-in server
+    :return:
+    """
+    with ConnectorPool() as pool:
+        client = TimsClient.from_provider(server.provider, pool=pool, page_size=50)
+        client.create_network({'organization_name': 'Tcpwave', 'network_address': '10.20.0.0/16',
+                               'name': 'Fake Network'})
+        for i in range(120):
+            client.create_subnet({'organization_name': 'Tcpwave', 'network_address': '10.20.%d.0/24' % i,
+                                  'name': 'Fake Subnet %d' % i, 'router_address': '10.20.%d.1' % i,
+                                  'primary_domain': 'tcpwave.com'})
+        subnets = client.list_all_subnets({'organization_name': 'Tcpwave', 'network_address': '10.20.0.0/16'})
+        assert len(subnets) == 120
+        ip = client.get_next_available_ip({'organization_name': 'Tcpwave', 'subnet_address': '10.20.3.0/24'})
+        client.create_ip({'organization_name': 'Tcpwave', 'subnet_address': '10.20.3.0/24', 'ip_address': ip,
+                          'name': 'fake-host', 'domain_name': 'tcpwave.com'})
+        assert client.get_next_available_ip({'organization_name': 'Tcpwave', 'subnet_address': '10.20.3.0/24'}) != ip
+        client.release_ip({'organization_name': 'Tcpwave', 'ip_address': ip})
+        with pytest.raises(APICallFailedException):
+            client.release_ip({'organization_name': 'Tcpwave', 'ip_address': ip})
+
+
+def test_async_client_flow(server):
+    """
+    Async client pages through the stand-in server
+    :return:
+    """
+    pytest.importorskip('aiohttp')
+    from tcpwave_client import AsyncTimsClient
+
+    async def run():
+        provider = server.provider
+        async with AsyncTimsClient(provider['host'], provider['cert'], provider['key'], verify=provider['verify'],
+                                   port=provider['port'], page_size=50) as client:
+            await client.create_network({'organization_name': 'Tcpwave', 'network_address': '10.30.0.0/16',
+                                         'name': 'Async Network'})
+            return await client.list_all_networks({'organization_name': 'Tcpwave'})
+
+    networks = asyncio.run(run())
+    assert '10.30.0.0' in [network['address'] for network in networks]
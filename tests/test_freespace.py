@@ -0,0 +1,40 @@
+import ipaddress
+
+import pytest
+
+from tcpwave_client import FreeSpace
+
+
+def test_first_fit_and_best_fit():
+    """
+    First fit takes the lowest free block, best fit the smallest one that holds the prefix
+    :return:
+    """
+    free = FreeSpace('10.0.0.0/16', ['10.0.0.0/24', '10.0.2.0/23', '10.0.5.0/24', '172.16.0.0/24'])
+    assert free.first_fit(24) == ipaddress.ip_network('10.0.1.0/24')
+    assert free.first_fit(22) == ipaddress.ip_network('10.0.8.0/22')
+    assert free.best_fit(25) == ipaddress.ip_network('10.0.1.0/25')
+    with pytest.raises(ValueError):
+        free.first_fit(15)
+    assert free.free_addresses == 65536 - 4 * 256
+    assert [str(block) for block in free.blocks()[:3]] == ['10.0.1.0/24', '10.0.4.0/24', '10.0.6.0/23']
+
+
+def test_take_reserve_release():
+    """
+    Taken blocks are split off, released ones merge back with their buddies
+    :return:
+    """
+    free = FreeSpace('10.0.0.0/16')
+    taken = [free.take(24) for _ in range(3)]
+    assert [str(block) for block in taken] == ['10.0.0.0/24', '10.0.1.0/24', '10.0.2.0/24']
+    assert free.reserve('10.0.4.0/22')
+    assert not free.reserve('10.0.5.0/24')
+    assert free.take(22) == ipaddress.ip_network('10.0.8.0/22')
+    assert free.take(24, best=True) == ipaddress.ip_network('10.0.3.0/24')
+    for block in taken + [ipaddress.ip_network('10.0.3.0/24'), ipaddress.ip_network('10.0.8.0/22')]:
+        free.release(block)
+    free.release('10.0.4.0/22')
+    assert free.blocks() == [ipaddress.ip_network('10.0.0.0/16')]
+    assert FreeSpace('10.0.0.0/16', ['10.0.0.0/8']).take(24) is None
+    assert len(FreeSpace('2001:db8::/32', ['2001:db8::/48'])) == 16
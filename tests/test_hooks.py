@@ -0,0 +1,73 @@
+import pytest
+
+from tcpwave_client import APICallFailedException
+from tcpwave_client import ConnectorPool
+from tcpwave_client import HistogramCollector
+from tcpwave_client import RequestHook
+from tcpwave_client import TimsClient
+from tcpwave_client.fake_server import FakeTimsServer
+from tcpwave_client.hooks import LatencyHistogram
+
+
+class Recorder(RequestHook):
+
+    def __init__(self):
+        self.events = []
+
+    def before_request(self, info):
+        self.events.append(('before', info.rel_url))
+
+    def after_response(self, info):
+        self.events.append(('after', info.rel_url, info.status, dict(info.timings)))
+
+    def on_error(self, info, error):
+        self.events.append(('error', info.rel_url, info.status))
+
+
+def test_latency_histogram_quantiles():
+    """
+    Quantiles stay within the configured relative precision
+    :return:
+    """
+    histogram = LatencyHistogram(precision=0.01)
+    for i in range(1, 1001):
+        histogram.record(i / 1000.0)
+    assert histogram.count == 1000
+    assert abs(histogram.quantile(0.5) - 0.5) <= 0.5 * 0.011
+    assert abs(histogram.quantile(0.99) - 0.99) <= 0.99 * 0.011
+    assert histogram.quantile(1.0) == histogram.max == 1.0
+
+
+def test_hooks_and_collector(tims_certs):
+    """
+    Hooks see every request with its timing breakdown, the collector reports per endpoint
+    :return:
+    """
+    recorder = Recorder()
+    collector = HistogramCollector()
+    with FakeTimsServer(certs=tims_certs) as server, ConnectorPool(hooks=(recorder,)) as pool:
+        pool.add_hook(collector)
+        client = TimsClient.from_provider(server.provider, pool=pool)
+        client.create_network(organization_name='Tcpwave', network_address='10.1.0.0/16', name='Hooks')
+        for _ in range(5):
+            client.get_network_detail(organization_name='Tcpwave', network_address='10.1.0.0/16')
+        with pytest.raises(APICallFailedException):
+            client.get_network_detail(organization_name='Tcpwave', network_address='10.9.0.0/16')
+
+    assert recorder.events[0] == ('before', '/network/add')
+    after = recorder.events[1]
+    assert after[:3] == ('after', '/network/add', 200)
+    assert set(after[3]) == {'connect', 'server', 'download', 'decode', 'total'}
+    assert after[3]['connect'] > 0
+    assert recorder.events[3][3]['connect'] == 0
+    assert recorder.events[-1] == ('error', '/network/detailsByIP', 400)
+
+    summary = collector.summary()
+    detail = summary['GET /network/detailsByIP']
+    assert detail['count'] == 6
+    assert detail['errors'] == 1
+    assert detail['statuses'] == {'200': 5, '400': 1}
+    assert 0 < detail['p50'] <= detail['p99'] <= detail['max'] * 1.03
+    text = collector.prometheus()
+    assert 'tims_client_request_seconds_count{endpoint="/network/detailsByIP",method="GET"} 6' in text
+    assert 'tims_client_request_errors_total{endpoint="/network/detailsByIP",method="GET"} 1' in text
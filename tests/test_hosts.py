@@ -0,0 +1,87 @@
+import pytest
+
+from tcpwave_client import APICallFailedException
+from tcpwave_client import ConnectorPool
+from tcpwave_client import TimsClient
+from tcpwave_client.fake_server import FakeTimsServer
+from tcpwave_client.hosts import HostSet
+from tcpwave_client.hosts import PRIMARY
+from tcpwave_client.hosts import REPLICA
+from tcpwave_client.hosts import parse_hosts
+
+
+class Clock(object):
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_hosts():
+    """
+    First host is the primary unless roles are given
+    :return:
+    """
+    assert [entry['role'] for entry in parse_hosts(['a', 'b'])] == [PRIMARY, REPLICA]
+    hosts = parse_hosts(['a', {'host': 'b', 'role': 'primary', 'weight': 2, 'port': 8443}])
+    assert hosts[0]['role'] == REPLICA
+    assert hosts[1] == {'host': 'b', 'role': PRIMARY, 'weight': 2.0, 'port': 8443}
+
+
+def test_host_selection():
+    """
+    Reads prefer fast, lightly loaded hosts; failing hosts are taken out of rotation
+    :return:
+    """
+    clock = Clock()
+    host_set = HostSet(['p', 'r1', {'host': 'r2', 'weight': 2}], max_failures=2, down_time=10, timer=clock)
+    for host, latency in (('p', 0.03), ('r1', 0.01), ('r2', 0.015)):
+        host_set.begin(host)
+        host_set.end(host, latency)
+    assert [entry['host'] for entry in host_set.read_order()] == ['r2', 'r1', 'p']
+    host_set.begin('r2')
+    host_set.begin('r2')
+    assert host_set.read_order()[0]['host'] == 'r1'
+    host_set.end('r2', failed=True)
+    host_set.end('r2', failed=True)
+    assert not host_set.is_up('r2')
+    assert [entry['host'] for entry in host_set.read_order()] == ['r1', 'p', 'r2']
+    assert [entry['host'] for entry in host_set.write_order()] == ['p']
+    clock.now = 10
+    assert host_set.is_up('r2')
+
+
+def test_failover(tims_certs):
+    """
+    Reads fail over to the replica, writes stay on the primary
+    :return:
+    """
+    with FakeTimsServer(certs=tims_certs) as primary, FakeTimsServer(host='localhost', certs=tims_certs) as replica:
+        for server in (primary, replica):
+            server.state.add_network('Tcpwave', '10.1.0.0/16', name='Replicated')
+        provider = dict(primary.provider, host=None, hosts=[
+            {'host': '127.0.0.1', 'port': primary.port, 'role': 'primary'},
+            {'host': 'localhost', 'port': replica.port, 'role': 'replica', 'weight': 1000}])
+        with ConnectorPool() as pool:
+            client = TimsClient.from_provider(provider, pool=pool)
+            assert client.host == '127.0.0.1'
+            detail = {'organization_name': 'Tcpwave', 'network_address': '10.1.0.0/16'}
+            for _ in range(4):
+                assert client.get_network_detail(detail)['name'] == 'Replicated'
+            assert replica.request_counts[('GET', '/network/detailsByIP')] >= 3
+
+            replica.fail_next(5)
+            for _ in range(3):
+                assert client.get_network_detail(detail)['name'] == 'Replicated'
+            assert not client.connector.host_set.is_up('localhost')
+            # the remaining injected failures are consumed by probes until one succeeds
+            for _ in range(3):
+                client.connector.probe()
+            assert client.connector.host_set.is_up('localhost')
+
+            client.create_network(organization_name='Tcpwave', network_address='10.2.0.0/16', name='Written')
+            assert ('POST', '/network/add') not in replica.request_counts
+            primary.fail_next(1, status=504)
+            with pytest.raises(APICallFailedException):
+                client.create_network(organization_name='Tcpwave', network_address='10.3.0.0/16', name='Lost')
+            assert client.connector is TimsClient.from_provider(provider, pool=pool).connector
@@ -0,0 +1,74 @@
+import pytest
+
+from tcpwave_client import TimsClient
+
+SUBNET_PAGED = ('GET', '/subnet/paged')
+
+
+@pytest.fixture
+def server(server):
+    for i in range(3):
+        server.state.seed_subnets('Tcpwave', '10.%d.0.0/16' % i, 24, 120)
+    server.state.add_network('Lab', '172.16.0.0/12', name='Lab Network')
+    return server
+
+
+@pytest.fixture
+def client(server, pool):
+    return TimsClient.from_provider(server.provider, pool=pool, page_size=50)
+
+
+def test_incremental_sync(server, client, tmp_path):
+    """
+    Unchanged pages are skipped, changes are applied row by row and the mirror survives a restart
+    :return:
+    """
+    path = str(tmp_path / 'inventory.db')
+    with client.mirror(path) as mirror:
+        result = mirror.sync()
+        assert (result.listings, result.pages, result.pages_changed) == (5, 11, 11)
+        assert result.written == 364
+        assert mirror.stats()['subnets'] == 360
+
+        client.create_subnet(organization_name='Tcpwave', network_address='10.1.200.0/24', name='Added',
+                             router_address='10.1.200.1', primary_domain='tcpwave.com')
+        client.delete_subnet(organization_name='Tcpwave', address_list=['10.2.0.0'])
+        result = mirror.sync()
+        # only the listings of 10.1.0.0/16 and 10.2.0.0/16 changed
+        assert result.pages_changed == 6
+        assert result.deleted == 1
+        assert mirror.subnets(name='Added')[0]['fullAddress'] == '10.1.200.0/24'
+        assert mirror.subnets(containing='10.2.0.9') == []
+
+    with client.mirror(path) as mirror:
+        client.delete_network(organization_name='Lab', address='172.16.0.0')
+        result = mirror.sync()
+        assert result.pages_changed == 1
+        assert result.deleted == 1
+        stats = mirror.stats()
+        assert (stats['networks'], stats['subnets']) == (3, 360)
+
+
+def test_queries(client):
+    with client.mirror() as mirror:
+        mirror.sync()
+        assert len(mirror.subnets(within='10.1.0.0/16')) == 120
+        assert len(mirror.subnets(organization_name='Tcpwave', network='10.0.0.0/16')) == 120
+        assert [subnet['fullAddress'] for subnet in mirror.subnets(within='10.0.1.0/24')] == ['10.0.1.0/24']
+        assert [network['name'] for network in mirror.networks(containing='172.20.1.1')] == ['Lab Network']
+        assert mirror.networks(organization_name='Lab', within='10.0.0.0/8') == []
+        addresses = [subnet['fullAddress'] for subnet in mirror.subnets(within='10.0.0.0/8')]
+        assert addresses[:2] == ['10.0.0.0/24', '10.0.1.0/24']
+
+
+def test_unchanged_sync_only_hashes(server, client):
+    """
+    A second sync fetches every page again but decodes and writes nothing
+    :return:
+    """
+    with client.mirror() as mirror:
+        mirror.sync()
+        requests = server.request_counts[SUBNET_PAGED]
+        result = mirror.sync()
+        assert server.request_counts[SUBNET_PAGED] == 2 * requests
+        assert (result.pages_changed, result.written, result.deleted) == (0, 0, 0)
@@ -1,9 +1,45 @@
 from tcpwave_client import NetworkManager
 from tcpwave_client import APICallFailedException
+from tcpwave_client.fake_server import ApiError
+from tcpwave_client.fake_server import FakeTimsServer
 import json
+import pytest
 
 
-def test_network_creation():
+@pytest.fixture(scope="module")
+def fake_tims(tims_certs):
+    """
+    Runs the tests against the bundled stand-in server
+    :return:
+    """
+    with FakeTimsServer(certs=tims_certs) as server:
+        yield server
+
+
+@pytest.fixture(scope="module")
+def provider(fake_tims):
+    """
+    Provider dict of the stand-in server
+    :return:
+    """
+    return fake_tims.provider
+
+
+@pytest.fixture
+def ip(fake_tims):
+    """
+    Free ip of the test subnet
+    :return:
+    """
+    try:
+        fake_tims.state.add_network('Tcpwave', '153.168.0.0/16', name='Test Network 3')
+        fake_tims.state.add_subnet('Tcpwave', '153.168.0.0/16', name='Test Subnet 1', router_address='153.168.0.1')
+    except ApiError:
+        pass
+    return fake_tims.state.next_free_ip('Tcpwave', '153.168.0.0')
+
+
+def test_network_creation(provider):
     """
     Create test network
     :return:
@@ -21,7 +57,7 @@ def test_network_creation():
         print(ex.msg)
 
 
-def test_network_delete():
+def test_network_delete(provider):
     """
     Deletes given network
     :return:
@@ -38,7 +74,7 @@ def test_network_delete():
         print(ex.msg)
 
 
-def test_networks_list():
+def test_networks_list(provider):
     """
     List all networks
     :return:
@@ -55,7 +91,7 @@ def test_networks_list():
         print(ex.msg)
 
 
-def test_network_detail():
+def test_network_detail(provider):
     """
     Fetch network details
     :return:
@@ -72,7 +108,7 @@ def test_network_detail():
         print(ex.msg)
 
 
-def test_subnet_create():
+def test_subnet_create(provider):
     """
     Creates test subnet
     :return:
@@ -92,7 +128,7 @@ def test_subnet_create():
         print(ex.msg)
 
 
-def test_subnet_delete():
+def test_subnet_delete(provider):
     """
     Deletes given subnet
     :return:
@@ -109,7 +145,7 @@ def test_subnet_delete():
         print(ex.msg)
 
 
-def test_subnet_list():
+def test_subnet_list(provider):
     """
     List all subnets
     :return:
@@ -128,7 +164,7 @@ def test_subnet_list():
         print(ex.msg)
 
 
-def test_subnet_detail():
+def test_subnet_detail(provider):
     """
     Fetch subnet details
     :return:
@@ -145,7 +181,7 @@ def test_subnet_detail():
         print(ex.msg)
 
 
-def test_next_available_ip():
+def test_next_available_ip(provider):
     """
     Fetches next available ip
     :return:
@@ -163,7 +199,7 @@ def test_next_available_ip():
         print(ex.msg)
 
 
-def test_ip_create(ip):
+def test_ip_create(provider, ip):
     """
     Creates IP Object
     :return:
@@ -184,7 +220,7 @@ def test_ip_create(ip):
         print(ex.msg)
 
 
-def test_ip_delete(ip):
+def test_ip_delete(provider, ip):
     """
     Releases the ip
     :return:
@@ -201,42 +237,42 @@ def test_ip_delete(ip):
         print(ex.msg)
 
 
-def test_complete_flow():
+def test_complete_flow(provider):
     print('Creating Network : 153.168.0.0/16')
-    test_network_creation()
+    test_network_creation(provider)
 
     print("Listing all networks")
-    test_networks_list()
+    test_networks_list(provider)
 
     print("Network Details for 153.168.0.0/16")
-    test_network_detail()
+    test_network_detail(provider)
 
     print("Creating Subnet : 153.168.0.0/16")
-    test_subnet_create()
+    test_subnet_create(provider)
 
     print("Listing all subnets")
-    test_subnet_list()
+    test_subnet_list(provider)
 
     print("Subnet Details for 153.168.0.0/16")
-    test_subnet_detail()
+    test_subnet_detail(provider)
 
     print("Getting next free ip")
-    ip = test_next_available_ip()
+    ip = test_next_available_ip(provider)
 
     print("creating available ip : ", ip)
-    test_ip_create(ip)
+    test_ip_create(provider, ip)
 
     print("Getting next free ip")
-    ip1 = test_next_available_ip()
+    ip1 = test_next_available_ip(provider)
 
     print("Deleting object ", ip)
-    test_ip_delete(ip)
+    test_ip_delete(provider, ip)
 
     print("Deleting subnet")
-    test_subnet_delete()
+    test_subnet_delete(provider)
 
     print("Deleting network")
-    test_network_delete()
+    test_network_delete(provider)
 
 
 if __name__ == "__main__":
@@ -246,10 +282,4 @@ if __name__ == "__main__":
         'host': '192.168.0.116'
     }
 
-    test_complete_flow()
-
-
-
-
-
-
+    test_complete_flow(provider)
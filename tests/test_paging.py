@@ -0,0 +1,69 @@
+import threading
+
+from tcpwave_client import APICallFailedException
+from tcpwave_client.paging import fetch_all_pages
+from tcpwave_client.paging import iter_records
+
+
+class PagedConnector(object):
+    """
+    Serves /paged style responses from a list of records
+    """
+    def __init__(self, records, fail_once=()):
+        self.records = records
+        self.fail_once = set(fail_once)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def get_object(self, payload):
+        start = payload['params']['start']
+        length = payload['params']['length']
+        with self.lock:
+            self.calls += 1
+            if start in self.fail_once:
+                self.fail_once.discard(start)
+                raise APICallFailedException("API call failed. Msg :: busy")
+        return {'recordsTotal': len(self.records), 'data': self.records[start:start + length]}
+
+
+def test_pages_keep_order():
+    """
+    Concurrently fetched pages are returned in order
+    :return:
+    """
+    records = [{'name': 'nw-%05d' % i} for i in range(1050)]
+    conn = PagedConnector(records)
+    payload = {'rel_url': '/network/paged', 'params': {'start': 0, 'length': 100}}
+    assert fetch_all_pages(conn, payload, concurrency=8) == records
+    assert conn.calls == 11
+    assert payload['params']['start'] == 0
+
+
+def test_failed_page_is_retried():
+    """
+    A failing page is retried on its own
+    :return:
+    """
+    records = [{'name': 'nw-%05d' % i} for i in range(300)]
+    conn = PagedConnector(records, fail_once=[200])
+    payload = {'rel_url': '/network/paged', 'params': {'start': 0, 'length': 100}}
+    assert fetch_all_pages(conn, payload, concurrency=4) == records
+    assert conn.calls == 4
+
+
+def test_iter_records_resumes_and_stops_early():
+    """
+    Generator resumes from an offset and stops paging when closed
+    :return:
+    """
+    records = [{'name': 'nw-%05d' % i} for i in range(1000)]
+    conn = PagedConnector(records)
+    payload = {'rel_url': '/network/paged', 'params': {'start': 0, 'length': 100}}
+    assert list(iter_records(conn, payload, start=950)) == records[950:]
+
+    conn.calls = 0
+    it = iter_records(conn, payload)
+    first = [next(it) for _ in range(150)]
+    it.close()
+    assert first == records[:150]
+    assert conn.calls <= 3
@@ -0,0 +1,29 @@
+from tcpwave_client import ConnectorPool
+
+
+def test_pool_reuses_connector():
+    """
+    Same host and credentials share one connector
+    :return:
+    """
+    with ConnectorPool() as pool:
+        conn = pool.get('192.168.0.116', '/tmp/client.crt', '/tmp/client.key')
+        assert pool.get('192.168.0.116', '/tmp/client.crt', '/tmp/client.key') is conn
+        assert pool.get('192.168.0.117', '/tmp/client.crt', '/tmp/client.key') is not conn
+        assert len(pool) == 2
+    assert conn.closed
+    assert len(pool) == 0
+
+
+def test_pool_evicts_idle_connectors():
+    """
+    Connectors idle for longer than idle_timeout are closed
+    :return:
+    """
+    pool = ConnectorPool(idle_timeout=0)
+    conn = pool.get('192.168.0.116', '/tmp/client.crt', '/tmp/client.key')
+    conn.last_used -= 1
+    pool.evict_idle()
+    assert conn.closed
+    assert pool.get('192.168.0.116', '/tmp/client.crt', '/tmp/client.key') is not conn
+    pool.close()
@@ -0,0 +1,55 @@
+import ipaddress
+
+from tcpwave_client import PrefixIndex
+
+
+def test_prefix_queries():
+    """
+    Longest-prefix match, containment and overlap over listed subnets
+    :return:
+    """
+    records = [
+        {'fullAddress': '10.4.0.0/16', 'name': 'nw'},
+        {'fullAddress': '10.4.7.0/24', 'name': 'sn-7'},
+        {'address': '10.4.8.0', 'mask_length': 22, 'name': 'sn-8'},
+        {'fullAddress': '10.9.0.0/24', 'name': 'other'},
+        {'fullAddress': '2001:db8::/48', 'name': 'v6'},
+    ]
+    index = PrefixIndex.from_records(records)
+    assert len(index) == 5
+    assert index.longest_match('10.4.7.19')[1]['name'] == 'sn-7'
+    assert index.longest_match('10.4.200.1')[1]['name'] == 'nw'
+    assert index.longest_match('10.5.0.1') is None
+    assert index.longest_match('2001:db8::1')[1]['name'] == 'v6'
+    assert [v['name'] for _, v in index.supernets('10.4.7.128/25')] == ['nw', 'sn-7']
+    assert [v['name'] for _, v in index.subnets('10.4.0.0/16')] == ['nw', 'sn-7', 'sn-8']
+    assert sorted(v['name'] for _, v in index.overlaps('10.4.0.0/14')) == ['nw', 'sn-7', 'sn-8']
+    assert index.overlaps('10.0.0.0/16') == []
+
+
+def test_insert_and_delete():
+    """
+    Lookups, covering and covered queries reflect inserts, replacements and removals
+    :return:
+    """
+    index = PrefixIndex()
+    index.insert('10.0.0.0/8', 'a')
+    index.insert('10.1.0.0/16', 'b')
+    index.insert('10.1.2.0/24', 'c')
+    index.insert('10.1.2.0/24', 'd')
+    assert len(index) == 3
+    assert index.get('10.1.2.0/24') == 'd'
+    assert index.get('10.1.3.0/24', 'missing') == 'missing'
+    assert index.delete('10.1.0.0/16')
+    assert not index.delete('10.1.0.0/16')
+    assert not index.delete('10.2.0.0/16')
+    assert '10.1.0.0/16' not in index and '10.1.2.0/24' in index
+    assert index.longest_match('10.1.2.3') == (ipaddress.ip_network('10.1.2.0/24'), 'd')
+    assert index.longest_match('10.1.3.3') == (ipaddress.ip_network('10.0.0.0/8'), 'a')
+    assert [value for _, value in index.supernets('10.1.2.128/25')] == ['a', 'd']
+    assert [value for _, value in index.subnets('10.1.0.0/16')] == ['d']
+    assert index.delete('10.1.2.0/24')
+    assert index.subnets('10.1.0.0/16') == []
+    assert index.longest_match('10.1.2.3') == (ipaddress.ip_network('10.0.0.0/8'), 'a')
+    assert list(index) == [(ipaddress.ip_network('10.0.0.0/8'), 'a')]
+    assert len(index) == 1
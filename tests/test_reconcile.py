@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from tcpwave_client import DeadlineExceededException
+from tcpwave_client.reconcile import CREATE_IP
+from tcpwave_client.reconcile import CREATE_NETWORK
+from tcpwave_client.reconcile import CREATE_SUBNET
+from tcpwave_client.reconcile import DELETE_NETWORK
+from tcpwave_client.reconcile import DELETE_SUBNET
+from tcpwave_client.reconcile import DONE
+from tcpwave_client.reconcile import RELEASE_IP
+from tcpwave_client.reconcile import SKIPPED
+from tcpwave_client.reconcile import Plan
+from tcpwave_client.reconcile import Reconciler
+from tcpwave_client.reconcile import Step
+
+ORG = 'Tcpwave'
+SUBNET_ADD = ('POST', '/subnet/add')
+
+
+def subnet(prefix, name, ips=(), **extra):
+    router = prefix.split('/')[0].rsplit('.', 1)[0] + '.1'
+    res = {'network_address': prefix, 'name': name, 'router_address': router, 'primary_domain': 'tcpwave.com',
+           'ips': [{'ip_address': address, 'name': 'host-%s' % address.replace('.', '-'),
+                    'domain_name': 'tcpwave.com'} for address in ips]}
+    res.update(extra)
+    return res
+
+
+@pytest.fixture
+def server(server):
+    server.state.seed_subnets(ORG, '10.0.0.0/16', 24, 4)
+    server.state.add_network(ORG, '10.9.0.0/16', name='Old')
+    return server
+
+
+def desired():
+    return [
+        {'organization_name': ORG, 'network_address': '10.1.0.0/16', 'name': 'New',
+         'subnets': [subnet('10.1.%d.0/24' % i, 'New %d' % i, ips=['10.1.%d.10' % i, '10.1.%d.11' % i])
+                     for i in range(3)]},
+        {'organization_name': ORG, 'network_address': '10.0.0.0/16', 'name': 'Renamed',
+         'subnets': [subnet('10.0.1.0/24', 'Seeded', state='absent'), subnet('10.0.7.0/24', 'Added')]},
+        {'organization_name': ORG, 'network_address': '10.9.0.0/16', 'state': 'absent'},
+    ]
+
+
+def test_plan_is_minimal_and_ordered(client):
+    """
+    Only missing objects are created, absent ones deleted, drift is reported and
+    every step comes after the steps it depends on
+    :return:
+    """
+    plan = client.reconciler().plan(desired())
+    actions = [step.action for step in plan]
+    assert actions.count(CREATE_NETWORK) == 1
+    assert actions.count(CREATE_SUBNET) == 4
+    assert actions.count(CREATE_IP) == 6
+    assert actions.count(DELETE_SUBNET) == 1
+    assert actions.count(DELETE_NETWORK) == 1
+    assert len(plan.drift) == 1 and "'Renamed'" in plan.drift[0]
+    position = dict((step.key, i) for i, step in enumerate(plan.ordered()))
+    for step in plan:
+        assert all(position[key] < position[step.key] for key in step.depends)
+    assert '+ subnet Tcpwave 10.1.0.0/24 "New 0"' in str(plan)
+
+
+def test_apply_and_converge(server, client):
+    """
+    A dry run changes nothing, applying converges and a second plan is empty
+    :return:
+    """
+    reconciler = client.reconciler(concurrency=4)
+    plan = reconciler.reconcile(desired(), dry_run=True)
+    assert server.request_counts.get(SUBNET_ADD, 0) == 0
+    reconciler.apply(plan)
+    assert plan.summary()['statuses'] == {DONE: len(plan)}
+    assert client.get_subnet_detail(organization_name=ORG, subnet_address='10.1.2.0')['name'] == 'New 2'
+    assert [record['fullAddress'] for record in
+            client.list_all_subnets(organization_name=ORG, network_address='10.0.0.0/16')] == \
+        ['10.0.0.0/24', '10.0.2.0/24', '10.0.3.0/24', '10.0.7.0/24']
+    assert reconciler.plan([dict(network, subnets=[dict(s, ips=[]) for s in network.get('subnets', [])])
+                            for network in desired()]).steps == {}
+
+
+def test_failure_skips_dependents(server, client):
+    """
+    A failed network create skips its subnets and their IP objects, other branches still run
+    :return:
+    """
+    reconciler = client.reconciler(concurrency=2)
+    plan = reconciler.plan(desired())
+    server.state.add_network(ORG, '10.1.0.0/16', name='Raced')
+    reconciler.apply(plan)
+    assert [step.action for step in plan.failed] == [CREATE_NETWORK]
+    assert len(plan.skipped) == 9
+    assert all(step.error is plan.failed[0].error for step in plan.skipped)
+    assert len(plan.by_status(DONE)) == len(plan) - 10
+
+
+def test_prune_and_current_ips(server, client):
+    """
+    With prune undeclared subnets go away, current_ips lets IP objects be diffed
+    :return:
+    """
+    client.create_ip(organization_name=ORG, ip_address='10.0.0.5', subnet_address='10.0.0.0', name='keep',
+                     domain_name='tcpwave.com')
+    spec = [{'organization_name': ORG, 'network_address': '10.0.0.0/16',
+             'subnets': [subnet('10.0.0.0/24', 'Seeded', ips=['10.0.0.5', '10.0.0.6'])]}]
+    reconciler = client.reconciler(prune=True, current_ips=lambda org, prefix: ['10.0.0.5', '10.0.0.9'])
+    plan = reconciler.plan(spec)
+    summary = plan.summary()['actions']
+    assert summary == {CREATE_IP: 1, RELEASE_IP: 1, DELETE_SUBNET: 3, DELETE_NETWORK: 1}
+    assert [step.address for step in plan if step.action == CREATE_IP] == ['10.0.0.6']
+
+
+class SlowClient(object):
+    def create_network(self, **fields):
+        time.sleep(0.5)
+        return {'address': fields['network_address']}
+
+    create_subnet = create_network
+
+
+def test_deadline_waits_for_running_steps():
+    """
+    Once the deadline passed running steps are waited for without spinning and the rest is skipped
+    :return:
+    """
+    plan = Plan()
+    network = plan.add(Step(CREATE_NETWORK, ORG, '10.8.0.0/16', {'network_address': '10.8.0.0/16'}))
+    subnet = plan.add(Step(CREATE_SUBNET, ORG, '10.8.1.0/24', {'network_address': '10.8.1.0/24'}))
+    subnet.depends.add(network.key)
+    start, cpu = time.monotonic(), time.process_time()
+    Reconciler(SlowClient()).apply(plan, timeout=0.1)
+    assert time.monotonic() - start >= 0.5
+    assert time.process_time() - cpu < 0.25
+    assert (network.status, subnet.status) == (DONE, SKIPPED)
+    assert isinstance(subnet.error, DeadlineExceededException)
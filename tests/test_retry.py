@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from tcpwave_client import APICallFailedException
+from tcpwave_client import ConnectorPool
+from tcpwave_client import RetryPolicy
+from tcpwave_client.retry import AMBIGUOUS
+from tcpwave_client.retry import NOT_PROCESSED
+from tcpwave_client.retry import parse_retry_after
+
+
+def test_policy_delays():
+    """
+    Exponential backoff capped by backoff_max, Retry-After and the deadline
+    :return:
+    """
+    policy = RetryPolicy(max_attempts=5, backoff_base=0.1, backoff_max=0.3, jitter=False)
+    assert [policy.backoff(attempt) for attempt in (1, 2, 3, 4)] == [0.1, 0.2, 0.3, 0.3]
+    assert RetryPolicy(backoff_base=1.0, rand=lambda: 0.5).backoff(2) == 1.0
+
+    busy = APICallFailedException("busy", status_code=429, headers={'Retry-After': '2'})
+    now = time.monotonic()
+    assert policy.classify(busy) == NOT_PROCESSED
+    assert policy.classify(APICallFailedException("gateway", status_code=504)) == AMBIGUOUS
+    assert policy.classify(APICallFailedException("bad request", status_code=400)) is None
+    assert policy.next_delay(busy, 1, now) == 2.0
+    assert policy.next_delay(busy, 5, now) is None
+    assert policy.next_delay(busy, 1, now, deadline=now + 1) is None
+    assert RetryPolicy(max_retry_after=1).next_delay(busy, 1, now) is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:10 GMT', now=1445412480) == 10.0
+    assert parse_retry_after('soon') is None
+
+
+@pytest.fixture
+def pool():
+    with ConnectorPool(retry=RetryPolicy(backoff_base=0.01)) as pool:
+        yield pool
+
+
+def test_retries_unavailable_server(server, client):
+    """
+    Reads and writes are retried on 503/429, which the server did not process
+    :return:
+    """
+    server.fail_next(2, status=503)
+    server.fail_next(1, status=429, retry_after=0)
+    client.create_network(organization_name='Tcpwave', network_address='10.1.0.0/16', name='Retry')
+    assert server.request_counts[('POST', '/network/add')] == 4
+    server.fail_next(3)
+    assert client.get_network_detail(organization_name='Tcpwave', network_address='10.1.0.0/16')['name'] == 'Retry'
+    server.fail_next(4)
+    with pytest.raises(APICallFailedException):
+        client.get_network_detail(organization_name='Tcpwave', network_address='10.1.0.0/16')
+
+
+def test_ambiguous_writes(server, client):
+    """
+    A write that may have been applied is only repeated after checking it did not happen
+    :return:
+    """
+    server.fail_next(1, status=504, after_processing=True)
+    record = client.create_network(organization_name='Tcpwave', network_address='10.2.0.0/16', name='Checked')
+    assert record['name'] == 'Checked'
+    assert server.request_counts[('POST', '/network/add')] == 1
+
+    server.fail_next(1, status=504)
+    client.create_subnet(organization_name='Tcpwave', network_address='10.2.1.0/24', name='Checked Subnet',
+                         router_address='10.2.1.1', primary_domain='tcpwave.com')
+    assert server.request_counts[('POST', '/subnet/add')] == 2
+
+    # ip objects cannot be looked up, /object/add is only repeated while the address is the next free one
+    ip_obj = {'organization_name': 'Tcpwave', 'subnet_address': '10.2.1.0/24', 'domain_name': 'tcpwave.com'}
+    server.fail_next(1, status=504)
+    client.create_ip(ip_obj, ip_address='10.2.1.2', name='host')
+    assert server.request_counts[('POST', '/object/add')] == 2
+    server.fail_next(1, status=504, after_processing=True)
+    with pytest.raises(APICallFailedException) as ex:
+        client.create_ip(ip_obj, ip_address='10.2.1.3', name='host')
+    assert ex.value.status_code == 504
+    server.fail_next(1, status=504)
+    with pytest.raises(APICallFailedException):
+        client.create_ip(ip_obj, ip_address='10.2.1.9', name='host')
+    assert server.request_counts[('POST', '/object/add')] == 4
+    assert server.state.next_free_ip('Tcpwave', '10.2.1.0/24') == '10.2.1.4'
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from tcpwave_client import ConnectorPool
+from tcpwave_client import IPAMException
+from tcpwave_client import TimsClient
+from tcpwave_client.fake_server import FakeTimsServer
+from tcpwave_client.serializer import get_serializer
+from tcpwave_client.serializer import orjson
+from tcpwave_client.serializer import ujson
+
+BACKENDS = ['json'] + [name for name, module in (('orjson', orjson), ('ujson', ujson)) if module is not None]
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_round_trip(name):
+    """
+    Every backend encodes to utf-8 bytes and decodes bytes and text alike
+    :return:
+    """
+    serializer = get_serializer(name)
+    body = {'name': 'Réseau', 'address': '10.0.0.0', 'mask_length': 16, 'big': 2 ** 70, 'tags': None}
+    data = serializer.dumps(body)
+    assert isinstance(data, bytes)
+    assert json.loads(data.decode('utf-8')) == body
+    assert serializer.loads(data) == body
+    assert serializer.loads(data.decode('utf-8')) == body
+
+
+def test_backend_selection():
+    """
+    The fastest installed backend is picked by default, unknown names are rejected
+    :return:
+    """
+    assert get_serializer().name == ('orjson' if orjson else 'ujson' if ujson else 'json')
+    assert get_serializer('json').name == 'json'
+    with pytest.raises(IPAMException):
+        get_serializer('yaml')
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_client_with_backend(name, tims_certs):
+    """
+    Writes, paged reads and raw reads work with every backend
+    :return:
+    """
+    with FakeTimsServer(max_page_size=20, certs=tims_certs) as server, ConnectorPool(serializer=name) as pool:
+        client = TimsClient.from_provider(server.provider, pool=pool, page_size=20)
+        client.create_network(organization_name='Tcpwave', network_address='10.1.0.0/16', name='Réseau')
+        server.state.seed_subnets('Tcpwave', '10.1.0.0/16', 24, 50)
+        assert len(client.list_all_subnets(organization_name='Tcpwave', network_address='10.1.0.0/16')) == 50
+        detail = client.get_network_detail(organization_name='Tcpwave', network_address='10.1.0.0')
+        assert detail['name'] == 'Réseau'
+        raw = client.get_network_detail(organization_name='Tcpwave', network_address='10.1.0.0', raw=True)
+        assert isinstance(raw, bytes)
+        assert json.loads(raw.decode('utf-8')) == detail
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tcpwave_client import AsyncTimsClient
+from tcpwave_client import ConnectorPool
+from tcpwave_client import SingleFlight
+from tcpwave_client import TimsClient
+
+SUBNET_DATA = ('GET', '/subnet/getSubnetData')
+
+
+@pytest.fixture
+def server(make_server):
+    server = make_server(latency=0.2)
+    server.state.seed_subnets('Tcpwave', '10.0.0.0/16', 24, 4)
+    return server
+
+
+def test_shared_outcome():
+    """
+    Callers joining a call in flight get its result or its exception, nothing is kept afterwards
+    :return:
+    """
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return {'name': 'Subnet'}
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(flight.do, 'key', load)
+        started.wait(1)
+        others = [executor.submit(flight.do, 'key', load) for _ in range(3)]
+        release.set()
+        results = [future.result() for future in [first] + others]
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {'calls': 1, 'shared': 3, 'in_flight': 0}
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 'again') == 'again'
+
+
+def test_concurrent_reads_share_one_request(server):
+    """
+    Identical detail lookups from many threads make one request, other keys are not affected
+    :return:
+    """
+    with ConnectorPool(single_flight=SingleFlight()) as pool:
+        client = TimsClient.from_provider(server.provider, pool=pool)
+
+        def lookup(address):
+            return client.get_subnet_detail(organization_name='Tcpwave', subnet_address=address)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            addresses = ['10.0.0.0'] * 6 + ['10.0.1.0'] * 2
+            records = list(executor.map(lookup, addresses))
+        assert [record['fullAddress'] for record in records] == ['10.0.0.0/24'] * 6 + ['10.0.1.0/24'] * 2
+        assert server.request_counts[SUBNET_DATA] == 2
+
+        lookup('10.0.0.0')
+        assert server.request_counts[SUBNET_DATA] == 3
+
+
+def test_async_reads_share_one_request(server):
+    async def run():
+        async with AsyncTimsClient.from_provider(server.provider, single_flight=SingleFlight()) as client:
+            return await asyncio.gather(*[client.get_subnet_detail(organization_name='Tcpwave',
+                                                                   subnet_address='10.0.2.0') for _ in range(5)])
+
+    records = asyncio.run(run())
+    assert [record['fullAddress'] for record in records] == ['10.0.2.0/24'] * 5
+    assert server.request_counts[SUBNET_DATA] == 1
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+from tcpwave_client import AdaptiveConcurrency
+from tcpwave_client import ConnectorPool
+from tcpwave_client import RateLimiter
+from tcpwave_client import TimsClient
+from tcpwave_client.fake_server import FakeTimsServer
+from tcpwave_client.throttle import READ
+from tcpwave_client.throttle import WRITE
+from tcpwave_client.throttle import TokenBucket
+
+
+class Clock(object):
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket():
+    """
+    Burst is served at once, further tokens are reserved as debt
+    :return:
+    """
+    clock = Clock()
+    bucket = TokenBucket(rate=10, burst=2, timer=clock)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.reserve() == 0.1
+    assert bucket.reserve() == 0.2
+    assert bucket.reserve(max_wait=0.1) is None
+    clock.now = 1.0
+    assert bucket.reserve() == 0.0
+
+
+def test_rate_limiter_classes():
+    """
+    Reads and writes of every host have their own bucket, unlimited classes have none
+    :return:
+    """
+    limiter = RateLimiter(read_rate=100, write_rate=5)
+    assert limiter.bucket('a', READ) is limiter.bucket('a', READ)
+    assert limiter.bucket('a', READ) is not limiter.bucket('b', READ)
+    assert limiter.bucket('a', WRITE).rate == 5
+    assert RateLimiter(read_rate=1).bucket('a', WRITE) is None
+
+
+def test_aimd_limit():
+    """
+    Limit grows with fast responses and is cut once per window on overload
+    :return:
+    """
+    controller = AdaptiveConcurrency(initial=4, max_limit=8, latency_target=0.1)
+    for _ in range(40):
+        assert controller.acquire('a', timeout=0)
+        controller.release('a', 0.01)
+    assert controller.limit('a') == 8
+    for _ in range(3):
+        controller.acquire('a')
+        controller.release('a', None, overloaded=True)
+    assert controller.limit('a') == 4
+    for _ in range(4):
+        assert controller.acquire('a', timeout=0)
+    assert not controller.acquire('a', timeout=0.01)
+
+    async def waiter():
+        task = asyncio.ensure_future(controller.acquire_async('a'))
+        await asyncio.sleep(0.01)
+        assert not task.done()
+        controller.release('a', 0.01)
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(waiter())
+    assert controller.stats()['a']['in_flight'] == 4
+
+
+def test_rate_limited_client(tims_certs):
+    """
+    Reads through a shared pool are spaced by the read rate
+    :return:
+    """
+    limiter = RateLimiter(read_rate=50, read_burst=1)
+    concurrency = AdaptiveConcurrency()
+    with FakeTimsServer(certs=tims_certs) as server, ConnectorPool(limiter=limiter, concurrency=concurrency) as pool:
+        client = TimsClient.from_provider(server.provider, pool=pool)
+        client.create_network(organization_name='Tcpwave', network_address='10.1.0.0/16', name='Limited')
+        start = time.monotonic()
+        for _ in range(11):
+            client.get_network_detail(organization_name='Tcpwave', network_address='10.1.0.0/16')
+        assert time.monotonic() - start >= 0.19
+        assert pool.concurrency.stats()['127.0.0.1']['in_flight'] == 0